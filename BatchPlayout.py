@@ -0,0 +1,134 @@
+import numpy as np
+from CythonBackgammon import DiceRNG
+
+# Zufällige Playouts für viele Spiele gleichzeitig
+#
+# Die Spiele laufen im Gleichschritt: Jeder Halbzug wird für alle noch laufenden Spiele
+# mit einem Würfel pro Spiel auf einmal in NumPy berechnet. Die Regeln sind dieselben wie in
+# Game.play_random_fast: Je Zug zwei einzelne Würfel, für jeden wird ein zufälliges Feld mit
+# einem ziehbaren Stein gewählt (bzw. ein Stein von der Bar eingesetzt).
+#
+# Langsamer als Game.random_playouts (dieselben Regeln in einer C-Schleife, siehe
+# Benchmark.bench_random_playouts), MCTSValuePlayer nutzt deshalb random_playouts. Gebraucht wird
+# BatchPlayout für Bretter, die schon als Array vorliegen, und Engines ohne random_playouts.
+#
+# Bretter sind (N,26) int8-Arrays: 24 Felder (positiv Schwarz, negativ Weiß), Bar Schwarz, Bar Weiß.
+# Die Steine außerhalb des Spiels ergeben sich aus 15 minus den Steinen auf Brett und Bar.
+
+BLACK = 0
+WHITE = 1
+BAR = 24
+BOARD_SIZE = 26
+
+# Im gespiegelten Brett (jede Seite zieht von 0 nach 23) das erste Feld, ab dem der hinterste
+# Stein stehen muss damit abgetragen werden darf. Wie in der Engine ist das für Weiß ein Feld
+# weiter (Feld 6 statt 5 von unten)
+HOME_START = (19, 17)
+
+#Wandelt Spiele (CythonBackgammon.Game oder andere mit board_array) in ein (N,26) Brett-Array
+def boards_from_games(games):
+    return np.array([g.board_array()[:BOARD_SIZE] for g in games], dtype=np.int8)
+
+#Gibt (N,26) Kopien der Stellung des Spiels zurück
+def repeat_game(game, n):
+    return np.repeat(game.board_array()[None, :BOARD_SIZE].astype(np.int8), n, axis=0)
+
+#Seite als 0/1 aus 'black'/'white' oder Zahlen, auch als Vektor
+def to_sides(side, n):
+    if isinstance(side, str):
+        side = BLACK if side == 'black' else WHITE
+    sides = np.broadcast_to(np.asarray(side), (n,))
+    if sides.dtype.kind in 'US':
+        sides = np.where(sides == 'black', BLACK, WHITE)
+    return sides.astype(np.int8)
+
+#Sicht auf das Brett aus Sicht der Seite: eigene Steine positiv, Zugrichtung immer aufwärts
+def own_frame(points, side):
+    if side == BLACK:
+        return points.copy()
+    return -points[:, ::-1]
+
+def from_frame(frame, side):
+    if side == BLACK:
+        return frame
+    return -frame[:, ::-1]
+
+#Führt für die Spiele (Zeilen von boards) der Seite einen Halbzug mit den Würfeln dice aus
+def half_move(boards, side, dice, rng):
+    n = len(boards)
+    rows = np.arange(n)
+    frame = own_frame(boards[:, :24], side)
+    bar = boards[:, BAR + side]
+    on_bar = bar > 0
+    #Steine auf der Bar einsetzen, Ziel ist im gespiegelten Brett immer Feld dice-1
+    entry = dice - 1
+    enter = on_bar & (frame[rows, entry] > -2)
+    #Steine auf dem Brett: Welche Felder können mit dem Würfel ziehen?
+    own = frame > 0
+    has_own = own.any(axis=1)
+    lowest = own.argmax(axis=1)
+    can_offboard = ~on_bar & (~has_own | (lowest >= HOME_START[side]))
+    dst = np.arange(24)[None, :] + dice[:, None]
+    inside = dst < 24
+    target = frame[rows[:, None], np.minimum(dst, 23)]
+    valid = own & ~on_bar[:, None] & np.where(inside, target > -2, can_offboard[:, None])
+    #Gleichverteilt eines der gültigen Felder wählen
+    keys = rng.uniform(n * 24).reshape(n, 24)
+    keys[~valid] = -1.
+    src = keys.argmax(axis=1)
+    move = valid[rows, src]
+    #Ausführen: Quelle
+    frame[rows[move], src[move]] -= 1
+    boards[enter, BAR + side] -= 1
+    #Ziel auf dem Brett (Ablegen braucht nichts, der Stein ist einfach weg)
+    land = np.where(enter, entry, src + dice)
+    landed = enter | (move & (land < 24))
+    land_rows = rows[landed]
+    land = land[landed]
+    blot = frame[land_rows, land] == -1
+    #Geschlagene Steine auf die Bar des Gegners
+    frame[land_rows[blot], land[blot]] = 0
+    boards[land_rows[blot], BAR + 1 - side] += 1
+    frame[land_rows, land] += 1
+    boards[:, :24] = from_frame(frame, side)
+
+#Gibt für jedes Brett zurück ob die Seite alle Steine abgetragen hat
+def has_won(boards, side):
+    sign = 1 if side == BLACK else -1
+    return ~((boards[:, :24] * sign) > 0).any(axis=1) & (boards[:, BAR + side] == 0)
+
+#Spielt alle Bretter zufällig zu Ende (die Bretter werden verändert)
+#start_side: Seite die zuerst zieht, eine für alle oder eine je Brett
+#rng: CythonBackgammon.DiceRNG, None = neuer zufälliger
+#Gibt den Gewinner je Spiel zurück (0 = Schwarz, 1 = Weiß)
+def play_random(boards, start_side, rng=None):
+    if rng is None:
+        rng = DiceRNG()
+    n = len(boards)
+    sides = to_sides(start_side, n).copy()
+    winners = np.full(n, -1, dtype=np.int8)
+    active = np.arange(n)
+    while len(active):
+        for side in (BLACK, WHITE):
+            idx = active[sides[active] == side]
+            if not len(idx):
+                continue
+            sub = boards[idx]
+            #Zwei einzelne Würfel, wie in play_random_fast
+            half_move(sub, side, rng.dice(len(idx)).astype(np.intp), rng)
+            half_move(sub, side, rng.dice(len(idx)).astype(np.intp), rng)
+            boards[idx] = sub
+            won = has_won(sub, side)
+            winners[idx[won]] = side
+        #Der andere Spieler ist dran
+        sides[active] = 1 - sides[active]
+        active = active[winners[active] < 0]
+    return winners
+
+#n zufällige Playouts aus der Stellung des Spiels, start_player beginnt
+#Ohne rng wird mit den Würfeln des Spiels gespielt
+#Gibt wie play_random den Gewinner-Vektor zurück
+def random_playouts(game, start_player, n, rng=None):
+    if rng is None:
+        rng = getattr(game, 'rng', None)
+    return play_random(repeat_game(game, n), start_player, rng)
@@ -0,0 +1,97 @@
+import functools
+import numpy as np
+from CythonBackgammon import solve_bearoff, bearoff_index
+
+# One-sided Bear-off-Datenbank
+#
+# Die Datei enthält für jede Stellung mit bis zu 15 Steinen auf den 6 Heimfeldern einer Seite
+# die erwartete Anzahl Würfe bis alle Steine abgetragen sind und die Verteilung dieser Anzahl.
+# Gelesen wird per np.memmap: Nachschlagen kopiert nichts und mehrere Prozesse teilen sich die
+# Seiten im Cache des Betriebssystems.
+# Abweichung von der Engine: Dort darf Schwarz erst abtragen, wenn kein Stein mehr 6 Augen vom Ziel
+# steht. Solche Stellungen werden hier wie alle anderen bewertet.
+#
+# Aufbau (Little Endian):
+#   8 Byte  MAGIC
+#   uint32  Anzahl Stellungen, uint32 Anzahl Würfe der Verteilung (max_rolls)
+#   float32 erwartete Würfe je Stellung
+#   uint16  Verteilung je Stellung und Wurfanzahl, Wahrscheinlichkeit * 65535
+
+MAGIC = b'TDGBEAR1'
+HEADER = np.dtype([('magic', 'S8'), ('positions', '<u4'), ('max_rolls', '<u4')])
+SCALE = 65535
+
+#Löst die Datenbank und schreibt sie nach path
+def generate(path, max_rolls=32):
+    expected, dist = solve_bearoff(max_rolls)
+    header = np.array([(MAGIC, len(expected), max_rolls)], dtype=HEADER)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(expected.astype('<f4').tobytes())
+        f.write(np.round(dist * SCALE).astype('<u2').tobytes())
+
+class BearoffDatabase:
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError("Keine Bear-off-Datenbank: " + str(path))
+        self.positions = int(header['positions'])
+        self.max_rolls = int(header['max_rolls'])
+        offset = HEADER.itemsize
+        self.expected = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(self.positions,))
+        offset += 4 * self.positions
+        self.dist = np.memmap(path, dtype='<u2', mode='r', offset=offset, shape=(self.positions, self.max_rolls))
+
+    #Erwartete Anzahl Würfe, counts: Steine auf den Feldern 1..6 Augen vom Ziel
+    def expected_rolls(self, counts):
+        return float(self.expected[bearoff_index(counts)])
+
+    #Wahrscheinlichkeit genau k Würfe zu brauchen, für k = 0..max_rolls-1
+    def distribution(self, counts):
+        return self.dist[bearoff_index(counts)] / SCALE
+
+    #Steine der Seite auf den Feldern 1..6 Augen vom Ziel oder None, falls nicht alle dort sind
+    def home_counts(self, game, player):
+        if player == game.players[0]:
+            if game.black_home + game.black_off != 15:
+                return None
+            points = game.points
+            return [points[23 - j] for j in range(6)]
+        if game.white_home + game.white_off != 15:
+            return None
+        points = game.points
+        return [-points[j] for j in range(6)]
+
+    #Gewinnwahrscheinlichkeit des Spielers, wenn der Gegner am Wurf ist (wie nach einem eigenen Zug)
+    #oder mit on_roll der Spieler selbst. None falls nicht beide Seiten nur noch abtragen
+    def probability(self, game, player, on_roll=False):
+        own = self.home_counts(game, player)
+        if own is None:
+            return None
+        opponent = self.home_counts(game, game.get_opponent(player))
+        if opponent is None:
+            return None
+        mine = self.distribution(own)
+        theirs = self.distribution(opponent)
+        if on_roll:
+            #Wir würfeln zuerst: Wir gewinnen mit k Würfen, wenn er mindestens k braucht
+            theirs_longer = np.concatenate(([1.], 1. - np.cumsum(theirs)[:-1]))
+        else:
+            #Der Gegner würfelt zuerst: Wir gewinnen mit k Würfen, wenn er mehr als k braucht
+            theirs_longer = 1. - np.cumsum(theirs)
+        return float(np.dot(mine, theirs_longer))
+
+    #Value-Funktion die in reinen Bear-off-Stellungen die Datenbank fragt und sonst valuefunction,
+    #z.B. ValuePlayer('black', db.wrap(single_to_go)) oder player.value = db.wrap(player.value).
+    #on_roll muss zur Stellung passen, die bewertet wird: False (Gegner am Wurf) für die Blätter von
+    #ValuePlayer und ModelPlayer (1-ply, Stellung nach dem eigenen Zug), True (Spieler am Wurf) für
+    #die Blätter von TwoPly, ThreePly und Expectiminimax.
+    #Die Datenbank liefert Gewinnwahrscheinlichkeiten, passt also am besten zu Value-Funktionen die
+    #ebenfalls welche liefern (Netze)
+    def wrap(self, valuefunction, on_roll=False):
+        @functools.wraps(valuefunction)
+        def value(game, player):
+            v = self.probability(game, player, on_roll)
+            return valuefunction(game, player) if v is None else v
+        return value
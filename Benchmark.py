@@ -0,0 +1,250 @@
+import copy
+import pickle
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import BatchPlayout
+from CythonBackgammon import Game, DiceRNG
+from Player import ValuePlayer, single_to_go
+
+# Benchmarks für die Zuggeneratoren
+
+#Sammelt Stellungen aus dem Mittelspiel, gespielt von zwei ValuePlayern
+#Gibt eine Liste von (Spielstatus, Spieler der am Zug ist) zurück
+def midgame_positions(games=20, first_turn=10, last_turn=40, seed=0):
+    players = [ValuePlayer('black', single_to_go), ValuePlayer('white', single_to_go)]
+    positions = []
+    for i in range(games):
+        game = Game(seed=seed + i)
+        player_num = game.rng.below(2)
+        while not game.get_winner():
+            if first_turn <= game.turns <= last_turn:
+                positions.append((game.get_state(), game.players[player_num]))
+            game.next_step(players[player_num], player_num)
+            player_num = (player_num + 1) % 2
+    return positions
+
+#Misst wie schnell die Engines für alle 6 Pasch-Würfe die Züge finden
+def bench_doubles(positions=None, engines=None, repeat=3):
+    if positions is None:
+        positions = midgame_positions()
+    if engines is None:
+        import FasterBackgammon
+        engines = [Game, FasterBackgammon.Game]
+    for engine in engines:
+        game = engine()
+        calls = 0
+        moves = 0
+        start = time.time()
+        for r in range(repeat):
+            for state, player in positions:
+                game.reset_to_state(state)
+                for dice in range(1, 7):
+                    moves += len(game.get_moves((dice, dice), player))
+                    calls += 1
+        end = time.time()
+        # Hübsch ausgeben
+        print(engine.__module__, ":", calls, "Pasch-Würfe aus", len(positions), "Stellungen in", end - start, "Sekunden")
+        print("   ", calls / (end - start), "Würfe/s |", moves / (end - start), "Züge/s |", moves / calls, "Züge je Wurf")
+
+#Vergleicht zufällige Spiele einzeln (play_random_fast), in der C-Schleife von
+#Game.random_playouts und gleichzeitig in NumPy (BatchPlayout)
+#Erwartung: random_playouts ist etwa 2.5x schneller als play_random_fast, BatchPlayout ist bei
+#jeder Anzahl langsamer als beide (bei 2000 Spielen etwa 3x langsamer als play_random_fast,
+#bei 16 Spielen etwa 30x)
+def bench_random_playouts(games=1000, seed=0):
+    start = time.time()
+    wins = {'black': 0, 'white': 0}
+    for i in range(games):
+        wins[Game(seed=seed + i).play_random_fast('black')] += 1
+    end = time.time()
+    print("play_random_fast :", games, "Spiele in", end - start, "Sekunden |", wins)
+    game = Game(seed=seed)
+    start = time.time()
+    black = game.random_playouts('black', games)
+    end = time.time()
+    print("random_playouts  :", games, "Spiele in", end - start, "Sekunden |", {'black': black, 'white': games - black})
+    start = time.time()
+    winners = BatchPlayout.play_random(BatchPlayout.repeat_game(Game(), games), 'black', DiceRNG(seed))
+    end = time.time()
+    print("BatchPlayout     :", games, "Spiele in", end - start, "Sekunden |",
+          {'black': int((winners == BatchPlayout.BLACK).sum()), 'white': int((winners == BatchPlayout.WHITE).sum())})
+
+#Misst wie gut die Nachfolgestellungen (ohne GIL erzeugt) mit der Anzahl Threads skalieren
+#Jeder Thread bekommt einen Teil der Stellungen und ein eigenes Spiel
+def bench_threads(positions=None, threads=(1, 2, 4), repeat=5):
+    if positions is None:
+        positions = midgame_positions()
+    rolls = [(a, b) for a in range(1, 7) for b in range(a, 7)]
+    def work(part):
+        game = Game()
+        n = 0
+        for state, player in part:
+            game.reset_to_state(state)
+            for r in range(repeat):
+                for roll in rolls:
+                    n += len(game.get_afterstates(roll, player)[1])
+        return n
+    for count in threads:
+        start = time.time()
+        with ThreadPoolExecutor(count) as executor:
+            nodes = sum(executor.map(work, [positions[i::count] for i in range(count)]))
+        end = time.time()
+        print(count, "Threads :", nodes, "Stellungen in", end - start, "Sekunden |", nodes / (end - start), "Stellungen/s")
+
+"""
+    Perft: Alle Stellungen bis zur Tiefe N über alle 21 Würfe aufzählen
+
+    Die Engines werden über kleine Adapter angesprochen, die zu einer Stellung (28er Zeile),
+    der Seite am Zug (0 Schwarz, 1 Weiß) und einem Wurf die Menge der Nachfolgestellungen
+    (als bytes der 28er Zeilen) liefern. So lassen sich Geschwindigkeit und Ergebnisse vergleichen.
+"""
+
+ALL_ROLLS = [(a, b) for a in range(1, 7) for b in range(a, 7)]
+
+def row_state(row):
+    return ([int(p) for p in row[:24]], int(row[24]), int(row[25]))
+
+class CythonEngine:
+
+    name = 'CythonBackgammon'
+
+    def __init__(self):
+        self.game = Game()
+
+    def afterstates(self, row, side, roll):
+        self.game.reset_to_state(row_state(row))
+        rows, _ = self.game.get_afterstates(roll, self.game.players[side])
+        return set(r.tobytes() for r in rows)
+
+class FasterEngine(CythonEngine):
+
+    name = 'FasterBackgammon'
+
+    def __init__(self):
+        import FasterBackgammon
+        self.game = FasterBackgammon.Game()
+
+#RepositoryBackgammon zieht immer aufwärts, für Weiß wird das Brett deshalb gespiegelt
+#Schwarz ist dort 'o' und Weiß 'x'
+class RepositoryEngine:
+
+    name = 'RepositoryBackgammon'
+    TOKENS = ['o', 'x']
+
+    def __init__(self):
+        import RepositoryBackgammon
+        self.module = RepositoryBackgammon
+
+    def game(self, row, side):
+        game = self.module.Game()
+        for i in range(24):
+            n = int(row[i])
+            if n != 0:
+                game.grid[i if side == 0 else 23 - i] = [self.TOKENS[0 if n > 0 else 1]] * abs(n)
+        for k, token in enumerate(self.TOKENS):
+            game.bar_pieces[token] = [token] * int(row[24 + k])
+            game.off_pieces[token] = [token] * int(row[26 + k])
+            game.num_pieces[token] = 15
+        game.refresh_features()
+        return game
+
+    def row(self, game, side):
+        row = np.zeros(28, dtype=np.int8)
+        for j, col in enumerate(game.grid):
+            if col:
+                row[j if side == 0 else 23 - j] = len(col) if col[0] == self.TOKENS[0] else -len(col)
+        for k, token in enumerate(self.TOKENS):
+            row[24 + k] = len(game.bar_pieces[token])
+            row[26 + k] = len(game.off_pieces[token])
+        return row
+
+    def afterstates(self, row, side, roll):
+        game = self.game(row, side)
+        token = self.TOKENS[side]
+        result = set()
+        for action in game.get_actions(roll, token, nodups=True):
+            eaten = game.take_action(action, token)
+            result.add(self.row(game, side).tobytes())
+            game.undo_action(action, token, eaten)
+        return result
+
+#Zählt die Stellungen je Tiefe mit der Referenz-Engine auf, doppelte Stellungen nur einmal
+#positions: Liste von (28er Zeile, Seite am Zug), gibt je Tiefe eine solche Liste zurück
+def perft_levels(positions, depth, engine=None):
+    if engine is None:
+        engine = CythonEngine()
+    levels = [positions]
+    for d in range(depth - 1):
+        seen = set()
+        for row, side in levels[-1]:
+            for roll in ALL_ROLLS:
+                for after in engine.afterstates(row, side, roll):
+                    seen.add((after, 1 - side))
+        levels.append([(np.frombuffer(after, dtype=np.int8), side) for after, side in sorted(seen)])
+    return levels
+
+#Stellungen aus midgame_positions als (28er Zeile, Seite) für perft
+def perft_seeds(count=5, seed=0):
+    game = Game()
+    seeds = []
+    for state, player in midgame_positions(games=count, seed=seed)[::25][:count]:
+        game.reset_to_state(state)
+        seeds.append((game.board_array(), game.players.index(player)))
+    return seeds
+
+#Perft-Benchmark mit Vergleich der Engines
+#Alle Engines berechnen dieselben (Stellung, Wurf)-Paare bis zur Tiefe depth, gemessen werden
+#Nachfolgestellungen je Sekunde und die Anzahl verschiedener Nachfolgestellungen je Wurf.
+#Stellungen, für die eine Engine andere Nachfolgestellungen als die erste liefert, werden gemeldet.
+#Gibt die Liste der Abweichungen als (Zeile, Seite, Wurf, Engine, Anzahl nur in Referenz, Anzahl nur in Engine) zurück
+def perft(depth=2, positions=None, engines=None, max_reports=10):
+    if positions is None:
+        positions = perft_seeds()
+    if engines is None:
+        engines = [CythonEngine(), FasterEngine(), RepositoryEngine()]
+    levels = perft_levels(positions, depth, engines[0])
+    queries = [(row, side, roll) for level in levels for row, side in level for roll in ALL_ROLLS]
+    print("Perft Tiefe", depth, ":", [len(level) for level in levels], "Stellungen,", len(queries), "Würfe")
+    results = []
+    for engine in engines:
+        start = time.time()
+        result = [engine.afterstates(row, side, roll) for row, side, roll in queries]
+        end = time.time()
+        nodes = sum(len(r) for r in result)
+        print("%-22s %8.3f s | %10.0f Stellungen/s | %6.2f Stellungen je Wurf" % (
+            engine.name, end - start, nodes / (end - start), nodes / len(queries)))
+        results.append(result)
+    #Differenzen zur Referenz
+    mismatches = []
+    for engine, result in zip(engines[1:], results[1:]):
+        for (row, side, roll), reference, other in zip(queries, results[0], result):
+            if reference != other:
+                mismatches.append((row, side, roll, engine.name, len(reference - other), len(other - reference)))
+        print(engine.name, "weicht bei", sum(1 for m in mismatches if m[3] == engine.name), "von", len(queries), "Würfen ab")
+    for row, side, roll, name, missing, extra in mismatches[:max_reports]:
+        print("  ", name, "Seite", side, "Wurf", roll, "-", missing, "fehlen,", extra, "zusätzlich:", row.tolist())
+    return mismatches
+
+#Prüft, dass Kopien eines DiceRNG (copy, deepcopy, pickle), auch innerhalb der reinen
+#Python-Engines, dieselben Würfel wie das Original weiterwürfeln
+def check_rng_copies(seed=0, skip=300, dice=600):
+    import FasterBackgammon
+    import RepositoryBackgammon
+    rng = DiceRNG(seed)
+    for i in range(skip):
+        rng.die()
+    copies = {'copy': copy.copy(rng), 'deepcopy': copy.deepcopy(rng), 'pickle': pickle.loads(pickle.dumps(rng))}
+    for engine in (FasterBackgammon, RepositoryBackgammon):
+        game = engine.Game(seed=seed)
+        for i in range(skip):
+            game.rng.die()
+        copies[engine.__name__] = copy.deepcopy(game).rng
+    expected = [rng.die() for i in range(dice)]
+    ok = True
+    for name, other in copies.items():
+        same = [other.die() for i in range(dice)] == expected
+        print("%-22s %s" % (name, "gleich" if same else "weicht ab"))
+        ok = ok and same
+    return ok
+
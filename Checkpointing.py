@@ -0,0 +1,202 @@
+import glob
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import numpy as np
+from CythonBackgammon import Game
+from NumpyModel import NumpyModel, write_checkpoint, update_checkpoint_state, dense_layers
+from Player import RandomPlayer, ModelPlayer
+
+# Checkpoints und Validierung ohne Trainingspause
+#
+# checkpoint(model, games) kopiert nur die Variablen in den Speicher. Ein Thread schreibt den
+# Checkpoint (im Format von tf.train.Saver, lesbar mit restore bzw. NumpyModel.from_checkpoint),
+# ein eigener Prozess spielt mit einem NumpyModel der Kopie die Testpartien gegen RandomPlayer.
+# Behalten werden die keep neusten Checkpoints und je milestone_interval Schritte (global_step)
+# der erste Checkpoint als Meilenstein, alle anderen werden gelöscht.
+#
+#   checkpointer = AsyncCheckpointer(model.checkpoint_path, keep=5, milestone_interval=100000)
+#   model.train(games=10000, validation_interval=1000, checkpointer=checkpointer)
+
+class AsyncCheckpointer:
+
+    #seed: Saat der Testpartien, damit die Ergebnisse verschiedener Stände vergleichbar sind
+    def __init__(self, checkpoint_path, keep=5, milestone_interval=None, seed=0):
+        self.checkpoint_path = checkpoint_path
+        self.keep = keep
+        self.milestone_interval = milestone_interval
+        self.seed = seed
+        self.writes = queue.Queue()
+        self.error = None
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        #Der Validierungsprozess wird erst bei der ersten Validierung gestartet
+        #spawn, damit der Prozess keine TensorFlow-Session erbt
+        self.ctx = mp.get_context('spawn')
+        self.jobs = None
+        self.results_queue = None
+        self.validator = None
+        self.submitted = 0
+        self.results = []
+
+    """
+        Checkpoints im Hintergrund schreiben
+    """
+
+    #Kopiert die Tensoren ({Name: Array} mit global_step) und schreibt sie im Hintergrund
+    def save(self, tensors):
+        self._raise_error()
+        snapshot = {name: np.array(value, copy=True) for name, value in tensors.items()}
+        self.writes.put(snapshot)
+        return int(snapshot['global_step'])
+
+    def _write_loop(self):
+        while True:
+            tensors = self.writes.get()
+            try:
+                if tensors is not None:
+                    self.write(tensors)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.writes.task_done()
+            if tensors is None:
+                return
+
+    #Schreibt checkpoint.ckpt-<global_step> und räumt alte Checkpoints auf
+    def write(self, tensors):
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        prefix = os.path.join(self.checkpoint_path, 'checkpoint.ckpt-' + str(int(tensors['global_step'])))
+        write_checkpoint(prefix, tensors)
+        kept = self.retain(prefix)
+        update_checkpoint_state(self.checkpoint_path, prefix, kept)
+
+    #Präfixe aller Checkpoints im Verzeichnis, nach global_step sortiert
+    def checkpoints(self):
+        prefixes = []
+        for path in glob.glob(os.path.join(self.checkpoint_path, 'checkpoint.ckpt-*.index')):
+            prefix = path[:-len('.index')]
+            step = prefix.rsplit('-', 1)[-1]
+            if step.isdigit():
+                prefixes.append((int(step), prefix))
+        return [prefix for _, prefix in sorted(prefixes)]
+
+    #Löscht alles außer den keep neusten Checkpoints und den Meilensteinen, gibt die übrigen zurück
+    #current (der gerade geschriebene Checkpoint) bleibt immer, auch mit keep=0, da die Datei
+    #'checkpoint' auf ihn zeigt
+    def retain(self, current=None):
+        prefixes = self.checkpoints()
+        kept = set(prefixes[-self.keep:]) if self.keep > 0 else set()
+        if current is not None:
+            kept.add(current)
+        if self.milestone_interval:
+            buckets = set()
+            for prefix in prefixes:
+                bucket = int(prefix.rsplit('-', 1)[-1]) // self.milestone_interval
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    kept.add(prefix)
+        for prefix in prefixes:
+            if prefix not in kept:
+                for path in glob.glob(prefix + '.*'):
+                    os.remove(path)
+        return [prefix for prefix in prefixes if prefix in kept]
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    #Wartet, bis alle Checkpoints geschrieben sind
+    def flush(self):
+        self.writes.join()
+        self._raise_error()
+
+    """
+        Validierung in einem eigenen Prozess
+    """
+
+    #Spielt im Hintergrund games Partien der Gewichte aus tensors gegen RandomPlayer
+    def validate(self, tensors, games=100, name='TD-Gammon'):
+        if self.validator is None:
+            self.jobs = self.ctx.Queue()
+            self.results_queue = self.ctx.Queue()
+            self.validator = self.ctx.Process(target=validation_worker, args=(self.jobs, self.results_queue), daemon=True)
+            self.validator.start()
+        layers = [(np.array(w), np.array(b)) for w, b in dense_layers(tensors)]
+        self.jobs.put((int(tensors['global_step']), layers, name, games, self.seed))
+        self.submitted += 1
+
+    #Neue Ergebnisse der Validierung, ohne zu warten
+    def poll(self):
+        new = []
+        if self.results_queue is not None:
+            try:
+                while True:
+                    new.append(self.results_queue.get_nowait())
+            except queue.Empty:
+                pass
+        self.results.extend(new)
+        return new
+
+    """
+        Einstiegspunkt für die train-Methoden
+    """
+
+    #Checkpoint von model schreiben und validieren, beides im Hintergrund
+    #model braucht checkpoint_tensors() und get_name() (NeuralNetModel, TDTrainer)
+    def checkpoint(self, model, games=100):
+        tensors = model.checkpoint_tensors()
+        step = self.save(tensors)
+        if games:
+            self.validate(tensors, games, model.get_name())
+        self.poll()
+        return step
+
+    #Wartet auf alle Checkpoints und Validierungen und beendet Thread und Prozess
+    #Gibt alle Ergebnisse der Validierung zurück
+    def close(self):
+        self.writes.put(None)
+        self.writer.join()
+        if self.validator is not None:
+            self.jobs.put(None)
+            #Erst die Ergebnisse abholen, sonst kann join hängen
+            while len(self.results) < self.submitted:
+                try:
+                    self.results.append(self.results_queue.get(timeout=1))
+                except queue.Empty:
+                    if not self.validator.is_alive():
+                        break
+            self.validator.join()
+            self.validator = None
+        self._raise_error()
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#Hauptfunktion des Validierungsprozesses, spielt wie NeuralNetModel.test gegen RandomPlayer
+def validation_worker(jobs, results):
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        global_step, layers, name, games, seed = job
+        start = time.time()
+        model = NumpyModel(layers, name, global_step)
+        players = [ModelPlayer('black', model), RandomPlayer('white')]
+        winners = {'black':0, 'white':0}
+        for i in range(games):
+            winner = Game(seed=None if seed is None else seed + i).play(players)
+            winners[winner] += 1
+        result = {'global_step': global_step, 'games': games, 'black': winners['black'], 'white': winners['white'],
+                  'seconds': time.time() - start}
+        print("[Validation step %d] %s vs %s %d:%d of %d games (%.2f%%)" % (global_step, \
+            players[0].get_name(), players[1].get_name(), winners['black'], winners['white'], games, \
+            (winners['black'] / max(games, 1)) * 100.0), flush=True)
+        results.put(result)
@@ -1,69 +1,1016 @@
+# cython: language_level=3
+cimport cython
 import itertools
+import os
 import numpy as np
-import random
-from libc.stdlib cimport rand
+from collections import OrderedDict
+from libc.stdlib cimport malloc, realloc, free
+from libc.string cimport memcpy, memcmp
+from libc.math cimport exp, expf
+from cpython.mem cimport PyMem_Malloc, PyMem_Realloc, PyMem_Free
+
+#Seiten als Integer statt 'black'/'white'
+cdef enum:
+    BLACK = 0
+    WHITE = 1
+
+#Position der Bar als Startfeld: Schwarz zieht von -1 hoch, Weiß von 24 runter
+cdef enum:
+    BLACK_BAR = -1
+    WHITE_BAR = 24
+
+#Startaufstellung
+cdef int START_POINTS[24]
+START_POINTS[:] = [2,0,0,0,0,-5,0,-3,0,0,0,5,-5,0,0,0,3,0,5,0,0,0,0,-2]
+
+#Das komplette Spielbrett als C-Struktur
+cdef struct Board:
+    #Index ist Position auf dem Spielfeld und der Wert die Anzahl der Steine auf dem Feld
+    #Diese Zahl ist positiv für schwarze und negativ für Weiße Steine
+    int points[24]
+    #Steine auf der Bar je Seite
+    int bar[2]
+    #Steine die bereits aus dem Spiel sind je Seite
+    int off[2]
+    #Zobrist-Hash über Felder und Bar, wird bei jedem Unterzug aktualisiert
+    unsigned long long hash
+    #Augen bis alle Steine ab sind je Seite (Bar zählt 25)
+    int pips[2]
+    #Steine in der Homezone (die letzten 6 Felder) je Seite
+    int home[2]
+    #Hinterster Stein je Seite: Schwarz niedrigstes Feld, Weiß höchstes, Bar = -1/24,
+    #ohne Steine 24/-1. Kontakt besteht solange back[BLACK] < back[WHITE]
+    int back[2]
+
+#Aufbau des 198er Feature-Vektors
+cdef enum:
+    WHITE_POINTS = 0
+    WHITE_BAR_FEATURE = 96
+    WHITE_OFF_FEATURE = 97
+    BLACK_POINTS = 98
+    BLACK_BAR_FEATURE = 194
+    BLACK_OFF_FEATURE = 195
+    PLAYER_FEATURE = 196
+    NUM_FEATURES = 198
+
+#Kompakte Stellung als int8-Zeile: 24 Felder, Bar Schwarz/Weiß, Off Schwarz/Weiß
+cdef enum:
+    ROW_BAR = 24
+    ROW_OFF = 26
+    ROW_SIZE = 28
+
+#Kodiert n Steine auf einem Feld in 4 Features
+# 0,1,2,3,4,5 Steine werden kodiert als
+# 0000, 1000, 1100, 1110, 1110.5, 1111
+# (4. Bit = (n-3)/2)
+cdef inline void encode_point(float* f, int n) noexcept nogil:
+    f[0] = 1. if n >= 1 else 0.
+    f[1] = 1. if n >= 2 else 0.
+    f[2] = 1. if n >= 3 else 0.
+    f[3] = (n - 3) / 2. if n > 3 else 0.
+
+# 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
+cdef inline void encode_board_point(const int* points, int i, float* f) noexcept nogil:
+    cdef int n = points[i]
+    #Weiße Steine codieren
+    encode_point(f + WHITE_POINTS + 4*i, -n if n < 0 else 0)
+    #Schwarze Steine codieren
+    encode_point(f + BLACK_POINTS + 4*i, n if n > 0 else 0)
+
+cdef inline void encode_bar_off(const int* bar, const int* off, float* f) noexcept nogil:
+    #Steine auf der "Bar", n/2
+    f[WHITE_BAR_FEATURE] = bar[WHITE] / 2.
+    f[BLACK_BAR_FEATURE] = bar[BLACK] / 2.
+    #Steine die bereits aus dem Spiel sind, n/15
+    #Wie in der ursprünglichen Kodierung (15 - Steine auf dem Brett + Bar) zählen
+    #Steine auf der Bar doppelt, damit die trainierten Netze weiter passen
+    f[WHITE_OFF_FEATURE] = (off[WHITE] + 2 * bar[WHITE]) / 15.
+    f[BLACK_OFF_FEATURE] = (off[BLACK] + 2 * bar[BLACK]) / 15.
+
+#Kodiert eine komplette Stellung in die 198 Features
+cdef inline void encode_board(const int* points, const int* bar, const int* off, int side, float* f) noexcept nogil:
+    cdef int i
+    for i in range(24):
+        encode_board_point(points, i, f)
+    encode_bar_off(bar, off, f)
+    # Zwei Features für den derzeitigen Spieler
+    f[PLAYER_FEATURE] = 1. if side == BLACK else 0.
+    f[PLAYER_FEATURE + 1] = 0. if side == BLACK else 1.
+
+"""
+    Zobrist-Hashing: Jeder Feldinhalt (-15..15 Steine), jede Anzahl an Steinen auf der Bar
+    und die Seite am Zug bekommt einen zufälligen 64-Bit Schlüssel. Der Hash einer Stellung
+    ist das XOR der Schlüssel und kann bei jedem Unterzug in O(1) nachgeführt werden.
+"""
+
+cdef unsigned long long ZOBRIST_POINTS[24][31]
+cdef unsigned long long ZOBRIST_BAR[2][16]
+cdef unsigned long long ZOBRIST_SIDE
+
+#Feste Saat, damit die Hashes in allen Prozessen gleich sind
+cdef unsigned long long splitmix64(unsigned long long* state) noexcept nogil:
+    cdef unsigned long long z
+    state[0] += 0x9E3779B97F4A7C15ULL
+    z = state[0]
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL
+    return z ^ (z >> 31)
+
+cdef void init_zobrist():
+    global ZOBRIST_SIDE
+    cdef unsigned long long state = 0x5444476D6D6F6EULL
+    cdef int i, n
+    for i in range(24):
+        for n in range(31):
+            ZOBRIST_POINTS[i][n] = splitmix64(&state)
+    for i in range(2):
+        for n in range(16):
+            ZOBRIST_BAR[i][n] = splitmix64(&state)
+    ZOBRIST_SIDE = splitmix64(&state)
+
+init_zobrist()
+
+cdef inline void hash_point(Board* b, int i) noexcept nogil:
+    b.hash ^= ZOBRIST_POINTS[i][b.points[i] + 15]
+
+cdef inline void hash_bar(Board* b, int side) noexcept nogil:
+    b.hash ^= ZOBRIST_BAR[side][b.bar[side]]
+
+#Berechnet den Hash einer Stellung komplett neu
+cdef unsigned long long board_hash(Board* b) noexcept nogil:
+    cdef int i
+    b.hash = 0
+    for i in range(24):
+        hash_point(b, i)
+    hash_bar(b, BLACK)
+    hash_bar(b, WHITE)
+    return b.hash
+
+"""
+    Würfel
+
+    Ein PCG32-Zufallszahlengenerator je Spiel statt random/rand(): schnell, ohne GIL nutzbar
+    und mit Saat reproduzierbar. Die Würfel werden blockweise im Voraus erzeugt.
+    Alle Engines (auch FasterBackgammon und RepositoryBackgammon) nutzen diese Klasse, dieselbe
+    Saat ergibt dort also dieselben Würfe.
+"""
+
+cdef enum:
+    DICE_BUFFER = 256
+
+cdef class DiceRNG:
+
+    cdef unsigned long long state
+    cdef unsigned long long inc
+    cdef unsigned char buf[DICE_BUFFER]
+    cdef int pos
+    #Die zuletzt gesetzte Saat (auch die zufällig gewählte), z.B. für GameRecord
+    cdef readonly object seed_value
+
+    #seed: beliebige ganze Zahl, None = zufällig aus dem Betriebssystem
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    #Setzt den Generator auf den Anfang des Stroms zur Saat zurück
+    def seed(self, seed=None):
+        cdef unsigned long long s
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'little')
+        self.seed_value = seed
+        s = (<unsigned long long> (seed & 0xFFFFFFFFFFFFFFFF))
+        #Zustand und Strom aus der Saat ableiten, damit auch kleine Saaten gut verteilt sind
+        self.state = splitmix64(&s)
+        self.inc = splitmix64(&s) | 1
+        self.pos = DICE_BUFFER
+
+    #Pickle/deepcopy: Zustand samt Würfelpuffer, die Kopie würfelt dieselbe Folge weiter
+    #(das automatische Pickle von Cython kann das C-Array nicht)
+    def __reduce__(self):
+        return (DiceRNG, (self.seed_value,), self.__getstate__())
+
+    def __getstate__(self):
+        return (self.state, self.inc, self.pos, (<char*> self.buf)[:DICE_BUFFER])
+
+    def __setstate__(self, state):
+        cdef bytes buf
+        self.state, self.inc, self.pos, buf = state
+        if len(buf) != DICE_BUFFER:
+            raise ValueError("DiceRNG: Würfelpuffer muss %d Bytes haben" % DICE_BUFFER)
+        memcpy(self.buf, <char*> buf, DICE_BUFFER)
+
+    cdef inline unsigned int next32(self) noexcept nogil:
+        cdef unsigned long long old = self.state
+        cdef unsigned int xorshifted, rot
+        self.state = old * 6364136223846793005ULL + self.inc
+        xorshifted = <unsigned int> (((old >> 18) ^ old) >> 27)
+        rot = <unsigned int> (old >> 59)
+        return (xorshifted >> rot) | (xorshifted << ((-rot) & 31))
+
+    #Gleichverteilte Zahl aus 0..n-1 (Multiplikation statt Modulo)
+    cdef inline unsigned int next_below(self, unsigned int n) noexcept nogil:
+        return <unsigned int> ((<unsigned long long> self.next32() * n) >> 32)
+
+    #Nächster Würfel 1..6 aus dem Puffer
+    cdef inline int next_die(self) noexcept nogil:
+        cdef int i
+        if self.pos == DICE_BUFFER:
+            for i in range(DICE_BUFFER):
+                self.buf[i] = <unsigned char> (self.next_below(6) + 1)
+            self.pos = 0
+        self.pos += 1
+        return self.buf[self.pos - 1]
+
+    def die(self):
+        return self.next_die()
+
+    def roll(self):
+        cdef int a = self.next_die()
+        cdef int b = self.next_die()
+        return (a, b)
+
+    def below(self, unsigned int n):
+        return self.next_below(n)
+
+    #n Würfel auf einmal als int8-Array
+    def dice(self, Py_ssize_t n):
+        out = np.empty(n, dtype=np.int8)
+        cdef signed char[::1] o = out
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(n):
+                o[i] = <signed char> self.next_die()
+        return out
+
+    #n gleichverteilte Zahlen aus [0, 1) als float64-Array
+    def uniform(self, Py_ssize_t n):
+        out = np.empty(n, dtype=np.float64)
+        cdef double[::1] o = out
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(n):
+                o[i] = self.next32() * (1.0 / 4294967296.0)
+        return out
+
+"""
+    Spielregeln auf dem C-Brett, ohne GIL nutzbar
+"""
+
+#Augen von der Position bis zum Ziel, Bar = 25
+cdef inline int board_pip(int pos, int side) noexcept nogil:
+    if side == BLACK:
+        return 25 if pos < 0 else 24 - pos
+    return 25 if pos > 23 else pos + 1
+
+cdef inline int board_in_home(int pos, int side) noexcept nogil:
+    if side == BLACK:
+        return 18 <= pos <= 23
+    return 0 <= pos <= 5
+
+#Sucht den hintersten Stein der Seite
+cdef int board_back(const Board* b, int side) noexcept nogil:
+    cdef int i
+    if side == BLACK:
+        if b.bar[BLACK] > 0:
+            return BLACK_BAR
+        for i in range(24):
+            if b.points[i] > 0:
+                return i
+        return 24
+    if b.bar[WHITE] > 0:
+        return WHITE_BAR
+    for i in range(23, -1, -1):
+        if b.points[i] < 0:
+            return i
+    return -1
+
+#Berechnet alles außer den Feldern und der Bar neu: Off, Augen, Homezone, hinterste Steine, Hash
+cdef void board_refresh(Board* b) noexcept nogil:
+    cdef int i, side, n
+    b.off[BLACK] = 15 - b.bar[BLACK]
+    b.off[WHITE] = 15 - b.bar[WHITE]
+    for side in range(2):
+        b.pips[side] = 25 * b.bar[side]
+        b.home[side] = 0
+    for i in range(24):
+        n = b.points[i]
+        side = BLACK if n > 0 else WHITE
+        if n < 0:
+            n = -n
+        b.off[side] -= n
+        b.pips[side] += n * board_pip(i, side)
+        b.home[side] += n * board_in_home(i, side)
+    b.back[BLACK] = board_back(b, BLACK)
+    b.back[WHITE] = board_back(b, WHITE)
+    board_hash(b)
+
+#Hat die Seite alle ihre Steine in ihrer Homezone?
+#Hinterster Stein muss in der Homezone stehen (Schwarz > 18, Weiß < 7), Bar zählt als ganz hinten
+cdef inline bint board_can_offboard(const Board* b, int side) noexcept nogil:
+    if side == BLACK:
+        return b.back[BLACK] > 18
+    return b.back[WHITE] < 7
+
+#Prüft ob das angegeben Ziel gültig ist
+cdef inline bint board_valid(const Board* b, int target, int side) noexcept nogil:
+    #Landen wir jenseis des Spielbretts?
+    if target < 0 or target >= 24:
+        return board_can_offboard(b, side)
+    #Prüfen ob das Ziel blockiert ist (2 oder mehr Gegnersteine vorhanden)
+    if side == BLACK:
+        return b.points[target] > -2
+    return b.points[target] < 2
+
+#Setzt einen Stein von src nach dst und gibt zurück ob ein Gegnerstein geschlagen wurde
+cdef inline int board_apply(Board* b, int src, int dst, int side) noexcept nogil:
+    cdef int piece = 1 if side == BLACK else -1
+    cdef int hit = 0
+    #Stein von der alten Position nehmen, falls nicht auf der Bar
+    #(der Hash wird jeweils vor und nach der Änderung per XOR angepasst)
+    b.pips[side] -= board_pip(src, side)
+    if src < 0 or src > 23:
+        hash_bar(b, side)
+        b.bar[side] -= 1
+        hash_bar(b, side)
+        if b.bar[side] == 0:
+            b.back[side] = board_back(b, side)
+    else:
+        hash_point(b, src)
+        b.points[src] -= piece
+        hash_point(b, src)
+        b.home[side] -= board_in_home(src, side)
+        #Der hinterste Stein ist weggezogen
+        if b.points[src] * piece <= 0 and src == b.back[side]:
+            b.back[side] = board_back(b, side)
+    #Stein auf die gewünschte Stelle setzen, falls noch auf dem Spielfeld
+    if dst >= 0 and dst < 24:
+        hash_point(b, dst)
+        #Falls dort bereits ein Gegnerstein war wird er auf die Bar gelegt
+        if b.points[dst] == -piece:
+            b.points[dst] = 0
+            hash_bar(b, 1 - side)
+            b.bar[1 - side] += 1
+            hash_bar(b, 1 - side)
+            b.pips[1 - side] += 25 - board_pip(dst, 1 - side)
+            b.home[1 - side] -= board_in_home(dst, 1 - side)
+            b.back[1 - side] = WHITE_BAR if side == BLACK else BLACK_BAR
+            hit = 1
+        #Stein platzieren
+        b.points[dst] += piece
+        hash_point(b, dst)
+        b.pips[side] += board_pip(dst, side)
+        b.home[side] += board_in_home(dst, side)
+        #Nach dem Einsetzen von der Bar oder wenn der hinterste Stein gezogen hat kann das Ziel ganz hinten sein
+        if (dst < b.back[side]) if side == BLACK else (dst > b.back[side]):
+            b.back[side] = dst
+    else:
+        b.off[side] += 1
+    return hit
+
+#Exakte Umkehrung von board_apply
+cdef inline void board_unapply(Board* b, int src, int dst, int side, int hit) noexcept nogil:
+    cdef int piece = 1 if side == BLACK else -1
+    if dst >= 0 and dst < 24:
+        hash_point(b, dst)
+        b.points[dst] -= piece
+        b.pips[side] -= board_pip(dst, side)
+        b.home[side] -= board_in_home(dst, side)
+        if hit:
+            b.points[dst] = -piece
+            hash_bar(b, 1 - side)
+            b.bar[1 - side] -= 1
+            hash_bar(b, 1 - side)
+            b.pips[1 - side] -= 25 - board_pip(dst, 1 - side)
+            b.home[1 - side] += board_in_home(dst, 1 - side)
+            b.back[1 - side] = board_back(b, 1 - side)
+        hash_point(b, dst)
+    else:
+        b.off[side] -= 1
+    b.pips[side] += board_pip(src, side)
+    if src < 0 or src > 23:
+        hash_bar(b, side)
+        b.bar[side] += 1
+        hash_bar(b, side)
+        b.back[side] = src
+    else:
+        hash_point(b, src)
+        b.points[src] += piece
+        hash_point(b, src)
+        b.home[side] += board_in_home(src, side)
+        #Das Ziel lag immer vor der Quelle, also ist der hinterste Stein höchstens die Quelle
+        if (src < b.back[side]) if side == BLACK else (src > b.back[side]):
+            b.back[side] = src
+
+#Ein zufälliger Unterzug mit einem Würfel, dieselben Regeln und Würfe wie Game.execute_random_move
+cdef inline void board_random_move(Board* b, int side, DiceRNG rng) noexcept:
+    cdef int dice, pos, c, n = 0
+    cdef int sources[24]
+    dice = rng.next_die()
+    if side == WHITE:
+        dice = -dice
+    if b.bar[side] > 0:
+        pos = dice - 1 if side == BLACK else 24 + dice
+        if board_valid(b, pos, side):
+            board_apply(b, BLACK_BAR if side == BLACK else WHITE_BAR, pos, side)
+        return
+    for c in range(24):
+        if (b.points[c] > 0 if side == BLACK else b.points[c] < 0) and board_valid(b, c + dice, side):
+            sources[n] = c
+            n += 1
+    if n > 0:
+        c = sources[rng.next_below(n)]
+        board_apply(b, c, c + dice, side)
+
+#Spielt das Brett wie Game.play_random_fast zufällig zu Ende, side zieht zuerst
+#Gibt die Seite des Siegers zurück
+cdef int board_random_playout(Board* b, int side, DiceRNG rng) noexcept:
+    while b.off[BLACK] != 15 and b.off[WHITE] != 15:
+        board_random_move(b, side, rng)
+        board_random_move(b, side, rng)
+        side = 1 - side
+    return BLACK if b.off[BLACK] == 15 else WHITE
+
+"""
+    Pasch-Generator
+
+    Bei einem Pasch ist die Stellung nach dem Zug allein durch die Menge der Unterzüge
+    bestimmt. Die Tiefensuche zieht die Steine deshalb nur in Zugrichtung aufsteigend
+    (ein Unterzug startet nie vor dem Startfeld des vorherigen), so wird jede Menge von
+    Unterzügen und damit jede Stellung genau einmal erzeugt. Sortieren und Set sind
+    nicht mehr nötig.
+"""
+
+#Felder in Zugreihenfolge: Schwarz 0..23, Weiß 23..0
+cdef int ORDER[2][24]
+#Zielfeld je Seite, Augenzahl und Startfeld
+cdef int DEST[2][7][24]
+
+cdef void init_tables():
+    cdef int i, d
+    for i in range(24):
+        ORDER[BLACK][i] = i
+        ORDER[WHITE][i] = 23 - i
+        for d in range(7):
+            DEST[BLACK][d][i] = i + d
+            DEST[WHITE][d][i] = i - d
+
+init_tables()
+
+#Liste von Zügen mit bis zu 4 Unterzügen (je 2 ints) in einem C-Puffer
+cdef struct MoveList:
+    int n
+    #Anzahl der Unterzüge je Zug, es werden nur die längsten Züge behalten
+    int length
+    int capacity
+    int* data
+
+cdef int movelist_add(MoveList* ml, const int* cur, int length) noexcept nogil:
+    cdef int* grown
+    if length < ml.length:
+        return 0
+    #Längere Züge gefunden, alle kürzeren verwerfen
+    if length > ml.length:
+        ml.n = 0
+        ml.length = length
+    if ml.n == ml.capacity:
+        grown = <int*> realloc(ml.data, 2 * (ml.capacity + 16) * 8 * sizeof(int))
+        if not grown:
+            return -1
+        ml.data = grown
+        ml.capacity = 2 * (ml.capacity + 16)
+    memcpy(ml.data + 8 * ml.n, cur, 8 * sizeof(int))
+    ml.n += 1
+    return 0
+
+#Tiefensuche über die Unterzüge eines Paschs, first ist das erste erlaubte Feld in Zugreihenfolge
+cdef int doubles_dfs(Board* b, int side, int die, int depth, int first, int* cur, MoveList* ml) noexcept nogil:
+    cdef int k, src, dst, hit
+    cdef int own = 1 if side == BLACK else -1
+    cdef bint extended = False
+    if depth < 4:
+        for k in range(first, 24):
+            src = ORDER[side][k]
+            if b.points[src] * own <= 0:
+                continue
+            dst = DEST[side][die][src]
+            if not board_valid(b, dst, side):
+                continue
+            hit = board_apply(b, src, dst, side)
+            cur[2*depth] = src
+            cur[2*depth + 1] = dst
+            #Gleiches Feld bleibt erlaubt, so können mehrere Steine von dort ziehen
+            if doubles_dfs(b, side, die, depth + 1, k, cur, ml) < 0:
+                board_unapply(b, src, dst, side, hit)
+                return -1
+            board_unapply(b, src, dst, side, hit)
+            extended = True
+    #Nicht weiter ziehbar, Zug merken
+    if not extended and depth > 0:
+        return movelist_add(ml, cur, depth)
+    return 0
+
+"""
+    GIL-freier Kern
+
+    Zuggenerator, Duplikaterkennung und Feature-Kodierung arbeiten nur auf dem Board und
+    C-Puffern und laufen deshalb ohne GIL. Mehrere Threads können so gleichzeitig Züge suchen,
+    solange jedes Game nur von einem Thread benutzt wird.
+    Die Züge sind dieselben und in derselben Reihenfolge wie bei den Python-Generatoren
+    (generate_moves, get_bar_to_board_moves, get_quad_bar_to_board_moves). Ein Unterzug ist ein
+    Paar (Start, Ziel) im MoveList-Puffer, die Bar ist BLACK_BAR/WHITE_BAR und der leere
+    Zug (0,0) das Paar (0,0).
+"""
+
+cdef inline void movelist_init(MoveList* ml) noexcept nogil:
+    ml.n = 0
+    ml.length = 0
+    ml.capacity = 0
+    ml.data = NULL
+
+#Die Steine der Seite in Zugreihenfolge (wie Game._checkers), gibt ihre Anzahl zurück
+cdef int board_checkers(const Board* b, int side, int* checkers) noexcept nogil:
+    cdef int k, i, n = 0
+    cdef int own = 1 if side == BLACK else -1
+    for k in range(24):
+        i = ORDER[side][k]
+        if b.points[i] * own > 0:
+            checkers[n] = i
+            n += 1
+    return n
+
+#Hängt einen Zug aus bis zu drei Unterzügen an
+cdef inline int movelist_push(MoveList* ml, int length, int a, int b, int c, int d, int e, int f) noexcept nogil:
+    cdef int cur[8]
+    cur[0] = a
+    cur[1] = b
+    cur[2] = c
+    cur[3] = d
+    cur[4] = e
+    cur[5] = f
+    cur[6] = 0
+    cur[7] = 0
+    return movelist_add(ml, cur, length)
+
+#Wie generate_single_move, d mit Vorzeichen in Zugrichtung
+#has_prev: Der Stein auf prev (Ziel des vorherigen Unterzugs) darf weiterziehen
+cdef int board_single(const Board* b, int side, bint has_prev, int prev, int d, MoveList* ml) noexcept nogil:
+    cdef int checkers[24]
+    cdef int k, x, n = board_checkers(b, side, checkers)
+    for k in range(n):
+        x = checkers[k]
+        if board_valid(b, x + d, side):
+            if movelist_push(ml, 1, x, x + d, 0, 0, 0, 0) < 0:
+                return -1
+    if has_prev and board_valid(b, prev + d, side):
+        if movelist_push(ml, 1, prev, prev + d, 0, 0, 0, 0) < 0:
+            return -1
+    return 0
+
+#Wie generate_double_move
+cdef int board_double(const Board* b, int side, bint has_prev, int prev, int d, MoveList* ml) noexcept nogil:
+    cdef int checkers[24]
+    cdef int i, k, x, y0, y1, n
+    cdef int rc = 0
+    cdef MoveList s
+    movelist_init(&s)
+    if board_single(b, side, has_prev, prev, d, &s) < 0:
+        free(s.data)
+        return -1
+    for i in range(s.n):
+        y0 = s.data[8*i]
+        y1 = s.data[8*i + 1]
+        if board_valid(b, y1 + d, side) and rc == 0:
+            rc = movelist_push(ml, 2, y0, y1, y1, y1 + d, 0, 0)
+    n = board_checkers(b, side, checkers)
+    for k in range(n):
+        x = checkers[k]
+        if not board_valid(b, x + d, side):
+            continue
+        for i in range(s.n):
+            y0 = s.data[8*i]
+            y1 = s.data[8*i + 1]
+            #Denselben Unterzug zweimal nur mit genug Steinen (für Weiß nie, wie im Original)
+            if (y0 == x and y1 == x + d and b.points[x] > 2) or y0 != x or y1 != x + d:
+                if rc == 0:
+                    rc = movelist_push(ml, 2, y0, y1, x, x + d, 0, 0)
+    free(s.data)
+    return rc
+
+#Wie generate_triple_move
+cdef int board_triple(const Board* b, int side, bint has_prev, int prev, int d, MoveList* ml) noexcept nogil:
+    cdef int checkers[24]
+    cdef int i, k, x, n
+    cdef int* m
+    cdef bint same
+    cdef int rc = 0
+    cdef MoveList dm
+    movelist_init(&dm)
+    if board_double(b, side, has_prev, prev, d, &dm) < 0:
+        free(dm.data)
+        return -1
+    for i in range(dm.n):
+        m = dm.data + 8*i
+        if board_valid(b, m[3] + d, side) and rc == 0:
+            rc = movelist_push(ml, 3, m[0], m[1], m[2], m[3], m[3], m[3] + d)
+    n = board_checkers(b, side, checkers)
+    for k in range(n):
+        x = checkers[k]
+        if not board_valid(b, x + d, side):
+            continue
+        for i in range(dm.n):
+            m = dm.data + 8*i
+            same = (m[0] == x and m[1] == x + d) or (m[2] == x and m[3] == x + d)
+            if (same and b.points[x] > 2) or not same:
+                if rc == 0:
+                    rc = movelist_push(ml, 3, m[0], m[1], m[2], m[3], x, x + d)
+    free(dm.data)
+    return rc
+
+#Wie get_bar_to_board_moves
+cdef int board_bar_moves(const Board* b, int side, int d0, int d1, MoveList* ml) noexcept nogil:
+    cdef int bar = BLACK_BAR if side == BLACK else WHITE_BAR
+    cdef int sign = 1 if side == BLACK else -1
+    cdef int pos0 = d0 - 1 if side == BLACK else 24 - d0
+    cdef int pos1 = d1 - 1 if side == BLACK else 24 - d1
+    cdef bint val1 = board_valid(b, pos0, side)
+    cdef bint val2 = board_valid(b, pos1, side)
+    cdef int i
+    cdef int rc = 0
+    cdef MoveList s
+    if b.bar[side] > 1 and val1 and val2:
+        return movelist_push(ml, 2, bar, pos0, bar, pos1, 0, 0)
+    if val1:
+        movelist_init(&s)
+        rc = board_single(b, side, True, pos0, sign * d1, &s)
+        for i in range(s.n):
+            if rc == 0:
+                rc = movelist_push(ml, 2, bar, pos0, s.data[8*i], s.data[8*i + 1], 0, 0)
+        free(s.data)
+    if val2 and rc == 0:
+        movelist_init(&s)
+        rc = board_single(b, side, True, pos1, sign * d0, &s)
+        for i in range(s.n):
+            if rc == 0:
+                rc = movelist_push(ml, 2, bar, pos1, s.data[8*i], s.data[8*i + 1], 0, 0)
+        free(s.data)
+    return rc
+
+#Wie generate_moves: Zwei verschiedene Steine oder einer zweimal, sonst ein einzelner Unterzug
+cdef int board_pair_moves(const Board* b, int side, int d0, int d1, MoveList* ml) noexcept nogil:
+    cdef int checkers[24]
+    cdef int pairs[120][2]
+    cdef int n = board_checkers(b, side, checkers)
+    cdef int i, j, p, a, c, farpos, npairs = 0
+    cdef int r0 = d0 if side == BLACK else -d0
+    cdef int r1 = d1 if side == BLACK else -d1
+    cdef bint a0, a1
+    cdef MoveList s
+    #Alle zweier Kombinationen, danach Felder mit mindestens zwei Steinen
+    for i in range(n):
+        for j in range(i + 1, n):
+            pairs[npairs][0] = checkers[i]
+            pairs[npairs][1] = checkers[j]
+            npairs += 1
+    for i in range(n):
+        if b.points[checkers[i]] > 1 or b.points[checkers[i]] < -1:
+            pairs[npairs][0] = checkers[i]
+            pairs[npairs][1] = checkers[i]
+            npairs += 1
+    for p in range(npairs):
+        a = pairs[p][0]
+        c = pairs[p][1]
+        #Zwei Steine bewegen
+        a0 = board_valid(b, a + r0, side)
+        a1 = board_valid(b, a + r1, side)
+        if a0 and board_valid(b, c + r1, side):
+            if movelist_push(ml, 2, a, a + r0, c, c + r1, 0, 0) < 0:
+                return -1
+        if a1 and board_valid(b, c + r0, side) and not (a == c and a0):
+            if movelist_push(ml, 2, a, a + r1, c, c + r0, 0, 0) < 0:
+                return -1
+        #Ein Stein bewegen
+        farpos = a + r0 + r1
+        if a == c and farpos >= 0 and farpos < 24 and board_valid(b, farpos, side):
+            if a0:
+                if movelist_push(ml, 2, a, a + r0, a + r0, farpos, 0, 0) < 0:
+                    return -1
+            elif a1:
+                if movelist_push(ml, 2, a, a + r1, a + r1, farpos, 0, 0) < 0:
+                    return -1
+    #Kein Zug mit beiden Würfeln, dann ein einzelner Unterzug als ((0,0), Unterzug)
+    if ml.n == 0:
+        movelist_init(&s)
+        if board_single(b, side, False, 0, r0, &s) < 0 or board_single(b, side, False, 0, r1, &s) < 0:
+            free(s.data)
+            return -1
+        for i in range(s.n):
+            if movelist_push(ml, 2, 0, 0, s.data[8*i], s.data[8*i + 1], 0, 0) < 0:
+                free(s.data)
+                return -1
+        free(s.data)
+    return 0
+
+#Wie get_quad_bar_to_board_moves
+cdef int board_quad_bar_moves(const Board* b, int side, int d, MoveList* ml) noexcept nogil:
+    cdef int bar = BLACK_BAR if side == BLACK else WHITE_BAR
+    cdef int pos = d - 1 if side == BLACK else 24 - d
+    cdef int sd = d if side == BLACK else -d
+    cdef int taken = b.bar[side]
+    cdef int cur[8]
+    cdef int i, j, k, rc = 0
+    cdef MoveList rest
+    if not board_valid(b, pos, side):
+        return 0
+    #Erst so viele Steine wie möglich einsetzen, der Rest kommt aus den Einzel-/Doppel-/Dreifachzügen
+    k = 4 if taken >= 4 else taken
+    for i in range(k):
+        cur[2*i] = bar
+        cur[2*i + 1] = pos
+    if k == 4:
+        return movelist_add(ml, cur, 4)
+    movelist_init(&rest)
+    if k == 3:
+        rc = board_single(b, side, True, pos, sd, &rest)
+    elif k == 2:
+        rc = board_double(b, side, True, pos, sd, &rest)
+    else:
+        rc = board_triple(b, side, True, pos, sd, &rest)
+    for i in range(rest.n):
+        if rc < 0:
+            break
+        for j in range(2 * (4 - k)):
+            cur[2*k + j] = rest.data[8*i + j]
+        rc = movelist_add(ml, cur, 4)
+    free(rest.data)
+    return rc
+
+#Alle Züge der Seite für den Wurf, wie Game.get_moves ohne MoveCache
+cdef int board_moves(Board* b, int side, int d0, int d1, MoveList* ml) noexcept nogil:
+    cdef int cur[8]
+    if d0 == d1:
+        if b.bar[side] > 0:
+            return board_quad_bar_moves(b, side, d0, ml)
+        return doubles_dfs(b, side, d0, 0, 0, cur, ml)
+    if b.bar[side] > 0:
+        return board_bar_moves(b, side, d0, d1, ml)
+    return board_pair_moves(b, side, d0, d1, ml)
+
+#Schreibt die Stellung als kompakte Zeile
+cdef inline void board_write_row(const Board* b, signed char* row) noexcept nogil:
+    cdef int i
+    for i in range(24):
+        row[i] = b.points[i]
+    row[ROW_BAR] = b.bar[BLACK]
+    row[ROW_BAR + 1] = b.bar[WHITE]
+    row[ROW_OFF] = b.off[BLACK]
+    row[ROW_OFF + 1] = b.off[WHITE]
+
+#Führt jeden Zug aus ml aus und behält je Nachfolgestellung nur den ersten Zug, der zu ihr führt
+#rows: Platz für ml.n Zeilen, hashes/keep: Platz für ml.n Einträge
+#Die Zeilen der behaltenen Züge stehen danach vorne in rows, ihre Indizes in keep
+#Gibt die Anzahl der verschiedenen Stellungen zurück
+cdef int board_unique(Board* b, int side, const MoveList* ml, signed char* rows,
+                      unsigned long long* hashes, int* keep) noexcept nogil:
+    cdef int i, j, k, u = 0
+    cdef int hits[4]
+    cdef int* m
+    cdef bint seen
+    for i in range(ml.n):
+        m = ml.data + 8*i
+        for k in range(ml.length):
+            #(0,0) ist der leere Unterzug
+            if m[2*k] != m[2*k + 1]:
+                hits[k] = board_apply(b, m[2*k], m[2*k + 1], side)
+        board_write_row(b, rows + u * ROW_SIZE)
+        seen = False
+        for j in range(u):
+            if hashes[j] == b.hash and memcmp(rows + j * ROW_SIZE, rows + u * ROW_SIZE, ROW_SIZE) == 0:
+                seen = True
+                break
+        if not seen:
+            hashes[u] = b.hash
+            keep[u] = i
+            u += 1
+        for k in range(ml.length - 1, -1, -1):
+            if m[2*k] != m[2*k + 1]:
+                board_unapply(b, m[2*k], m[2*k + 1], side, hits[k])
+    return u
+
+#198 Features einer kompakten Zeile, Spieler-Features für side
+cdef inline void encode_row(const signed char* row, int side, float* f) noexcept nogil:
+    cdef int points[24]
+    cdef int bar[2]
+    cdef int off[2]
+    cdef int i
+    for i in range(24):
+        points[i] = row[i]
+    bar[BLACK] = row[ROW_BAR]
+    bar[WHITE] = row[ROW_BAR + 1]
+    off[BLACK] = row[ROW_OFF]
+    off[WHITE] = row[ROW_OFF + 1]
+    encode_board(points, bar, off, side, f)
+
+#Ein Eintrag auf dem Undo-Stapel: ein einzelner Unterzug
+cdef struct SubMove:
+    int src
+    int dst
+    #-1 für den leeren Zug (0,0)
+    int side
+    #Wurde dabei ein Gegnerstein geschlagen?
+    int hit
+
+cdef class Game:
 
-class Game:
-    
     PLAYERS = ['black', 'white']
 
-    def __init__(self):
-        #Spielbrett. Index ist Position auf dem Spielfeld und der Wert die Anzahl der Steine auf dem Feld
-        #Diese Zahl ist positiv für schwarze und negativ für Weiße Steine
-        cdef int points[24]
-        points[:] = [2,0,0,0,0,-5,0,-3,0,0,0,5,-5,0,0,0,3,0,5,0,0,0,0,-2]
-        self.points = points
-        #Steinpositionen
-        self.refresh_piece_positions()
+    cdef Board b
+    cdef SubMove* stack
+    cdef int sp
+    cdef int capacity
+    cdef public list players
+    cdef public int turns
+    #Feature-Vektor der bei jedem Unterzug aktualisiert wird
+    cdef object features
+    cdef object features_view
+    cdef float* feat
+    #Optionaler MoveCache für get_moves/get_afterstates, None = aus
+    cdef public object move_cache
+    #Würfel dieses Spiels
+    cdef public DiceRNG rng
+    #Optionaler GameRecord.GameRecordWriter, bekommt in next_step jeden Zug
+    cdef public object recorder
+    #Zustände der angehängten Accumulatoren (NNUE), werden bei jedem Unterzug nachgeführt
+    cdef list accumulators
+
+    def __cinit__(self):
+        self.capacity = 64
+        self.sp = 0
+        self.stack = <SubMove*> PyMem_Malloc(self.capacity * sizeof(SubMove))
+        if not self.stack:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        PyMem_Free(self.stack)
+
+    #seed: Saat für die Würfel, None = zufällig
+    def __init__(self, move_cache=None, seed=None, recorder=None):
+        cdef int i
+        self.move_cache = move_cache
+        self.rng = DiceRNG(seed)
+        self.recorder = recorder
+        #Spielbrett in der Startaufstellung
+        for i in range(24):
+            self.b.points[i] = START_POINTS[i]
         #Steine die auf der Bar sind
-        self.black_taken = 0
-        self.white_taken = 0
+        self.b.bar[BLACK] = 0
+        self.b.bar[WHITE] = 0
+        board_refresh(&self.b)
         self.players = ['black', 'white']
         self.turns = 0
-        
+        self.accumulators = []
+        #Puffer für die Features anlegen und einmal komplett füllen
+        self.features = np.zeros(NUM_FEATURES, dtype=np.float32)
+        self.features_view = self.features.reshape(1, -1)
+        cdef float[::1] buf = self.features
+        self.feat = &buf[0]
+        self.refresh_features()
+
+    """
+        Python-Schnittstelle: Die alten Attribute werden aus dem C-Brett erzeugt
+    """
+
+    property points:
+        def __get__(self):
+            return [self.b.points[i] for i in range(24)]
+        def __set__(self, points):
+            cdef int i
+            for i in range(24):
+                self.b.points[i] = points[i]
+            self.refresh_board()
+            self.refresh_features()
+
+    property black_taken:
+        def __get__(self):
+            return self.b.bar[BLACK]
+        def __set__(self, int n):
+            self.b.bar[BLACK] = n
+            self.refresh_board()
+            self.refresh_features()
+
+    property white_taken:
+        def __get__(self):
+            return self.b.bar[WHITE]
+        def __set__(self, int n):
+            self.b.bar[WHITE] = n
+            self.refresh_board()
+            self.refresh_features()
+
+    property black_off:
+        def __get__(self):
+            return self.b.off[BLACK]
+
+    property white_off:
+        def __get__(self):
+            return self.b.off[WHITE]
+
+    #Augen bis alle Steine ab sind, Steine in der Homezone und Kontakt werden bei jedem
+    #Unterzug mitgeführt und kosten hier nichts
+    property black_pips:
+        def __get__(self):
+            return self.b.pips[BLACK]
+
+    property white_pips:
+        def __get__(self):
+            return self.b.pips[WHITE]
+
+    property black_home:
+        def __get__(self):
+            return self.b.home[BLACK]
+
+    property white_home:
+        def __get__(self):
+            return self.b.home[WHITE]
+
+    #Müssen die Seiten noch aneinander vorbei? False = reines Wettrennen
+    property contact:
+        def __get__(self):
+            return self.b.back[BLACK] < self.b.back[WHITE]
+
+    def get_pips(self, player):
+        return self.b.pips[self._side(player)]
+
+    #Zobrist-Hash der Stellung (ohne Seite am Zug)
+    property hash:
+        def __get__(self):
+            return self.b.hash
+
+    #Zobrist-Hash der Stellung aus Sicht des angegebenen Spielers
+    def get_hash(self, player):
+        return self.b.hash ^ ZOBRIST_SIDE if self._side(player) == WHITE else self.b.hash
+
+    #Positionen der schwarzen Steine
+    property black_checkers:
+        def __get__(self):
+            return self._checkers(BLACK)
+
+    #Positionen der weißen Steine
+    property white_checkers:
+        def __get__(self):
+            return self._checkers(WHITE)
+
+    cdef list _checkers(self, int side):
+        cdef int i
+        if side == BLACK:
+            return [i for i in range(24) if self.b.points[i] > 0]
+        return [i for i in range(23, -1, -1) if self.b.points[i] < 0]
+
+    cdef inline int _side(self, player):
+        return BLACK if player == self.players[0] else WHITE
+
     # Methode die exakt die 198 Features liefert die in TD-Gammon 0.0 benutzt wurden
     # Nach "Reinforcement Learning: An Introduction", Sutton & Barto, 2017
+    # Die Features werden bei jedem Unterzug aktualisiert, hier werden nur noch die
+    # Spieler-Features gesetzt. Zurückgegeben wird eine Sicht auf den internen Puffer,
+    # wer die Features aufbewahren will muss sie kopieren!
     def extractFeatures(self, player):
-        points = self.points
-        # 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
-        # 0,1,2,3,4,5 Steine werden kodiert als
-        # 0000, 1000, 1100, 1110, 1110.5, 1111
-        # (4. Bit = (n-3)/2)
-        features = []
-        #Weiße Steine codieren
-        whites = 0
-        for point in points[:24]:
-            point = -point
-            if point > 0:
-                whites += point
-                features += self.encodePoint(point)
-            else:
-                features += [0.,0.,0.,0.]
-        #Weiße Steine auf der "Bar", n/2
-        features.append(self.white_taken/2.)
-        #Weiße Steine die bereits aus dem Spiel sind, n/15
-        off = 15 - whites + self.white_taken
-        features.append(off/15.)
-        #Schwarze Steine codieren
-        blacks = 0
-        for point in points[:24]:
-            if point > 0:
-                blacks += point
-                features += self.encodePoint(point)
-            else:
-                features += [0.,0.,0.,0.]
-        #Schwarze Steine auf der "Bar", n/2
-        features.append(self.black_taken/2.)
-        #Schwarze Steine die bereits aus dem Spiel sind, n/15
-        off = 15 - blacks + self.black_taken
-        features.append(off/15.)
         # Zwei Features für den derzeitigen Spieler
         if player == self.players[0]:
-            features += [1., 0.]
+            self.feat[PLAYER_FEATURE] = 1.
+            self.feat[PLAYER_FEATURE + 1] = 0.
         else:
-            features += [0., 1.]
-        return np.array(features).reshape(1, -1)
-    
+            self.feat[PLAYER_FEATURE] = 0.
+            self.feat[PLAYER_FEATURE + 1] = 1.
+        return self.features_view
+
+    #Baut den Feature-Puffer komplett neu auf
+    def refresh_features(self):
+        cdef int i
+        for i in range(24):
+            self._encode_point(i)
+        self._encode_bar_off()
+        for state in self.accumulators:
+            (<AccumulatorState>state).refresh(self.feat)
+
+    #Zustand des Accumulators für dieses Spiel, beim ersten Mal wird er angehängt und voll berechnet
+    cdef AccumulatorState _accumulator_state(self, Accumulator model):
+        cdef AccumulatorState state
+        for state in self.accumulators:
+            if state.model is model:
+                return state
+        state = AccumulatorState(model)
+        state.refresh(self.feat)
+        self.accumulators.append(state)
+        return state
+
+    #Hängt alle Accumulatoren ab, die Unterzüge kosten dann wieder nichts extra
+    def detach_accumulators(self):
+        self.accumulators = []
+
+    cdef inline void _encode_point(self, int i) noexcept:
+        encode_board_point(self.b.points, i, self.feat)
+
+    cdef inline void _encode_bar_off(self) noexcept:
+        encode_bar_off(self.b.bar, self.b.off, self.feat)
+
     def encodePoint(self, point):
         if point == 0:
             return [0.,0.,0.,0.]
@@ -75,11 +1022,14 @@ class Game:
             return [1.,1.,1.,0.]
         else:
             return [1.,1.,1.,(point-3)/2.]
-        
-    def play(self, player, debug=False):
+
+    def play(self, player, debug=False, seed=None):
         cdef int player_num
+        #Mit Saat ist das ganze Spiel reproduzierbar
+        if seed is not None:
+            self.rng.seed(seed)
         #Wer anfängt ist zufällig
-        player_num = rand() % 2
+        player_num = self.rng.next_below(2)
         #Solange spielen bis es einen Gewinner gibt
         while not self.get_winner():
             #Zug ausführen
@@ -105,38 +1055,60 @@ class Game:
                 self.print_game_state()
                 print()
         return self.get_winner()
-        
+
+    #n zufällige Spiele wie play_random_fast ab der aktuellen Stellung, jedes auf einer Kopie des
+    #C-Bretts (die Stellung des Spiels bleibt unverändert, gewürfelt wird mit self.rng)
+    #Gibt die Anzahl der Siege von Schwarz zurück
+    def random_playouts(self, start_player, int n):
+        cdef int side = self._side(start_player)
+        cdef int i, black = 0
+        cdef Board b
+        for i in range(n):
+            b = self.b
+            if board_random_playout(&b, side, self.rng) == BLACK:
+                black += 1
+        return black
+
     def execute_random_move(self, player):
-        chk = self.black_checkers[:] if player == self.players[0] else self.white_checkers[:]
-        random.shuffle(chk)
-        dice = random.randint(1,6)
-        if player == self.players[1]:
+        cdef int side = self._side(player)
+        cdef int dice, pos, c, n = 0
+        cdef int sources[24]
+        dice = self.rng.next_die()
+        if side == WHITE:
             dice = -dice
         #Steine auf der Bar
-        if player == self.players[0] and self.black_taken > 0 or player == self.players[1] and self.white_taken > 0:
-            pos = dice - 1 if player == self.players[0] else len(self.points) + dice
-            if self.is_target_valid(pos, player):
-                self.execute_move(('bar', pos), player)
+        if self.b.bar[side] > 0:
+            pos = dice - 1 if side == BLACK else 24 + dice
+            if self._valid(pos, side):
+                self._apply(BLACK_BAR if side == BLACK else WHITE_BAR, pos, side)
                 return ('bar', pos)
         else:
-            #Steine auf dem Brett
-            for c in chk:
-                if self.is_target_valid(c + dice, player):
-                    self.execute_move((c, c + dice), player)
-                    return (c, c + dice)
-    
+            #Steine auf dem Brett: gleichverteilt eines der Felder wählen, die ziehen können
+            #(dieselbe Verteilung wie früher Mischen und den ersten gültigen nehmen)
+            for c in range(24):
+                if (self.b.points[c] > 0 if side == BLACK else self.b.points[c] < 0) and self._valid(c + dice, side):
+                    sources[n] = c
+                    n += 1
+            if n > 0:
+                c = sources[self.rng.next_below(n)]
+                self._apply(c, c + dice, side)
+                return (c, c + dice)
+
     def next_step(self, player, player_num, debug=False):
         cdef int a,b
         self.turns += 1
         #Würfeln
-        a = rand() % 6 + 1
-        b = rand() % 6 + 1
+        a = self.rng.next_die()
+        b = self.rng.next_die()
         roll = (a, b)
         #Züge berechnen
         moves = self.get_moves(roll, self.players[player_num])
         #Spieler fragen welche der Züge er gerne ausführen möchte
         move = player.get_action(moves, self) if moves else None
-        #Zug ausführen falls es möglich ist 
+        #Aufzeichnen, vor dem Ausführen damit der Recorder die Startstellung kennt
+        if self.recorder is not None:
+            self.recorder.record(self, roll, move, player_num)
+        #Zug ausführen falls es möglich ist
         if move:
             #Einzelne Unterzüge ausführen
             if debug:
@@ -149,76 +1121,311 @@ class Game:
             print("Roll:", roll, "| Move:", move)
             self.print_game_state()
             print()
-            
+
     def execute_moves(self, moves, player):
         #Unterzüge ausführen
         for m in moves:
             self.execute_move(m, player)
-            
-    #Führt einen Zug aus und gibt die vorherige Spielposition zurück
+
+    #Führt einen Zug aus, ohne ihn auf dem Undo-Stapel zu merken
     def execute_move(self, move, player):
+        cdef int side
         if move != (0,0):
-            piece = 1 if player == self.players[0] else - 1
-            #Stein von der alten Position nehmen, falls nicht auf der Bar
-            if move[0] != "bar":
-                self.points[move[0]] -= piece
-            elif player == self.players[0]:
-                self.black_taken -= 1
-            else:
-                self.white_taken -= 1
-            #Stein auf die gewünschte Stelle setzen, falls noch auf dem Spielfeld
-            if move[1] >= 0 and move[1] < len(self.points):
-                #Falls dort bereits ein Gegnerstein war wird er auf die Bar gelegt
-                if player == self.players[0] and self.points[move[1]] == -1:
-                    self.points[move[1]] = 0
-                    self.white_taken += 1
-                elif player == self.players[1] and self.points[move[1]] == 1:
-                    self.points[move[1]] = 0
-                    self.black_taken += 1
-                #Stein platzieren
-                self.points[move[1]] += piece
-            #Positionen der schwarzen und weißen Steine aktualisieren
-            self.refresh_piece_positions()
+            side = self._side(player)
+            self._apply(self._source(move[0], side), move[1], side)
+
+    """
+        Make/Unmake: Züge werden auf einem Undo-Stapel gemerkt und können
+        ohne Kopie des Spielbretts wieder zurückgenommen werden
+    """
+
+    #Führt einen Unterzug aus und merkt ihn auf dem Undo-Stapel
+    def make_move(self, move, player):
+        cdef int side, src, dst
+        if move == (0,0):
+            self._push(0, 0, -1, 0)
+        else:
+            side = self._side(player)
+            src = self._source(move[0], side)
+            dst = move[1]
+            self._push(src, dst, side, self._apply(src, dst, side))
+
+    #Nimmt den zuletzt mit make_move ausgeführten Unterzug zurück
+    def unmake_move(self):
+        if self.sp == 0:
+            raise IndexError("unmake_move: Undo-Stapel ist leer")
+        self._pop()
+
+    def make_moves(self, moves, player):
+        for m in moves:
+            self.make_move(m, player)
+
+    def unmake_moves(self, moves):
+        cdef int n = len(moves)
+        if n > self.sp:
+            raise IndexError("unmake_moves: Undo-Stapel ist leer")
+        while n > 0:
+            self._pop()
+            n -= 1
+
+    cdef inline int _source(self, src, int side):
+        if src == "bar":
+            return BLACK_BAR if side == BLACK else WHITE_BAR
+        return src
+
+    #Setzt einen Stein von src nach dst und gibt zurück ob ein Gegnerstein geschlagen wurde
+    cdef int _apply(self, int src, int dst, int side) noexcept:
+        cdef int hit = board_apply(&self.b, src, dst, side)
+        self._patch(src, dst)
+        return hit
+
+    #Exakte Umkehrung von _apply
+    cdef void _unapply(self, int src, int dst, int side, int hit) noexcept:
+        board_unapply(&self.b, src, dst, side, hit)
+        self._patch(src, dst)
+
+    #Features der betroffenen Felder aktualisieren
+    cdef inline void _patch(self, int src, int dst) noexcept:
+        if self.accumulators:
+            self._patch_tracked(src, dst)
+            return
+        if src >= 0 and src < 24:
+            self._encode_point(src)
+        if dst >= 0 and dst < 24:
+            self._encode_point(dst)
+        self._encode_bar_off()
+
+    #Wie _patch, merkt sich dabei die alten Werte der betroffenen Features und führt mit
+    #den geänderten die Accumulatoren nach
+    cdef void _patch_tracked(self, int src, int dst) noexcept:
+        cdef int index[20]
+        cdef float old[20]
+        cdef int n = 0, k, p
+        cdef int points[2]
+        points[0] = src
+        points[1] = dst
+        for p in points:
+            if p >= 0 and p < 24:
+                for k in range(4):
+                    index[n] = WHITE_POINTS + 4*p + k
+                    index[n + 1] = BLACK_POINTS + 4*p + k
+                    n += 2
+        index[n] = WHITE_BAR_FEATURE
+        index[n + 1] = WHITE_OFF_FEATURE
+        index[n + 2] = BLACK_BAR_FEATURE
+        index[n + 3] = BLACK_OFF_FEATURE
+        n += 4
+        for k in range(n):
+            old[k] = self.feat[index[k]]
+        if src >= 0 and src < 24:
+            self._encode_point(src)
+        if dst >= 0 and dst < 24:
+            self._encode_point(dst)
+        self._encode_bar_off()
+        for state in self.accumulators:
+            (<AccumulatorState>state).update(index, old, self.feat, n)
+
+    cdef void _push(self, int src, int dst, int side, int hit) except *:
+        cdef SubMove* grown
+        if self.sp == self.capacity:
+            grown = <SubMove*> PyMem_Realloc(self.stack, 2 * self.capacity * sizeof(SubMove))
+            if not grown:
+                raise MemoryError()
+            self.stack = grown
+            self.capacity *= 2
+        self.stack[self.sp].src = src
+        self.stack[self.sp].dst = dst
+        self.stack[self.sp].side = side
+        self.stack[self.sp].hit = hit
+        self.sp += 1
+
+    cdef void _pop(self) noexcept:
+        cdef SubMove m
+        self.sp -= 1
+        m = self.stack[self.sp]
+        if m.side >= 0:
+            self._unapply(m.src, m.dst, m.side, m.hit)
 
     def get_state(self):
-        return (self.points[:], self.black_taken, self.white_taken)
+        return (self.points, self.b.bar[BLACK], self.b.bar[WHITE])
 
     #Setzt das Spiel auf die gegebene Spielposition (zurück)
     def reset_to_state(self, state):
-        self.points = state[0][:]
-        self.black_taken = state[1]
-        self.white_taken = state[2]
-        #Positionen der schwarzen und weißen Steine aktualisieren
-        self.refresh_piece_positions()
+        cdef int i
+        for i in range(24):
+            self.b.points[i] = state[0][i]
+        self.b.bar[BLACK] = state[1]
+        self.b.bar[WHITE] = state[2]
+        self.refresh_board()
+        self.refresh_features()
+        #Der Undo-Stapel passt nicht mehr zur neuen Stellung
+        self.sp = 0
 
-    #Aktualisiert die Listen mit den Position der Steine
+    #Bleibt aus Kompatibilitätsgründen erhalten, die Steinpositionen werden bei Bedarf berechnet
     def refresh_piece_positions(self):
-        #Positionen der schwarzen Steine
-        self.black_checkers = [i for i in range(24) if self.points[i] > 0]
-        #Positionen der weißen Steine
-        self.white_checkers = sorted([i for i in range(24) if self.points[i] < 0], reverse=True)
-    
+        pass
+
+    #Berechnet Off, Augen, Homezone, hinterste Steine und den Zobrist-Hash neu
+    def refresh_board(self):
+        board_refresh(&self.b)
+
     def get_moves(self, roll, player):
-        #Pasch?
-        if roll[0] == roll[1]:
-            return self.get_quad_moves(roll[0], player)
-        #Hat der Spieler Steine die er erst wieder ins Spiel bringen muss?
-        if self.has_bar_pieces(player):
-            return self.get_bar_to_board_moves(roll, player)
-        #Sonstige Züge finden
-        else:
-            return self.generate_moves(roll, player)
+        cdef bytes key
+        if self.move_cache is None:
+            return self._generate(roll, player)
+        #Schon einmal für diese Stellung, diesen Wurf und diese Seite erzeugt?
+        key = self._cache_key(roll, player, 0)
+        moves = self.move_cache.get(key)
+        if moves is None:
+            moves = tuple(self._generate(roll, player))
+            self.move_cache.put(key, moves, len(moves))
+        return list(moves)
+
+    #Erzeugt die Züge ohne GIL im C-Kern (board_moves), dieselben wie die Python-Generatoren
+    def _generate(self, roll, player):
+        cdef int side = self._side(player)
+        cdef int d0 = roll[0]
+        cdef int d1 = roll[1]
+        cdef int rc
+        cdef MoveList ml
+        movelist_init(&ml)
+        try:
+            with nogil:
+                rc = board_moves(&self.b, side, d0, d1, &ml)
+            if rc < 0:
+                raise MemoryError()
+            return self._moves_from(&ml, side, NULL, ml.n)
+        finally:
+            free(ml.data)
+
+    #Wandelt Züge aus einem MoveList-Puffer in Tupel, keep: Indizes der Züge oder NULL für die ersten n
+    cdef list _moves_from(self, const MoveList* ml, int side, const int* keep, int n):
+        cdef int bar = BLACK_BAR if side == BLACK else WHITE_BAR
+        cdef int i, j, src
+        cdef int* m
+        moves = []
+        for i in range(n):
+            m = ml.data + 8 * (keep[i] if keep != NULL else i)
+            move = []
+            for j in range(ml.length):
+                src = m[2*j]
+                move.append(("bar" if src == bar else src, m[2*j + 1]))
+            moves.append(tuple(move))
+        return moves
+
+    """
+        Nachfolgestellungen: Jede unterschiedliche Stellung nach dem Zug genau einmal,
+        als kompakte Zeile zusammen mit einem Zug der zu ihr führt
+    """
+
+    #Gibt (Stellungen, Züge) für den Wurf zurück, Stellungen als (K,28) int8-Array
+    def get_afterstates(self, roll, player):
+        cdef bytes key
+        if self.move_cache is None:
+            return self.unique_afterstates(self._generate(roll, player), player)
+        key = self._cache_key(roll, player, 1)
+        entry = self.move_cache.get(key)
+        if entry is None:
+            rows, moves = self.unique_afterstates(self._generate(roll, player), player)
+            #Die Stellungen werden geteilt, also schreibgeschützt
+            rows.flags.writeable = False
+            entry = (rows, tuple(moves))
+            self.move_cache.put(key, entry, len(moves))
+        return entry[0], list(entry[1])
+
+    #Schlüssel für den MoveCache: kompakte Stellung, Wurf, Seite und Art des Eintrags
+    cdef bytes _cache_key(self, roll, player, int kind):
+        cdef signed char key[ROW_SIZE + 4]
+        self._write_row(key)
+        key[ROW_SIZE] = roll[0]
+        key[ROW_SIZE + 1] = roll[1]
+        key[ROW_SIZE + 2] = self._side(player)
+        key[ROW_SIZE + 3] = kind
+        return (<char*> key)[:ROW_SIZE + 4]
+
+    #Entfernt aus moves alle Züge die zu einer bereits gefundenen Stellung führen
+    #Gibt (Stellungen, Züge) zurück, Stellungen als (K,28) int8-Array, je Stellung der erste Zug
+    #Ausführen und Vergleichen der Stellungen läuft ohne GIL (board_unique)
+    def unique_afterstates(self, moves, player):
+        cdef int side = self._side(player)
+        cdef int n = len(moves)
+        cdef int i, j, u
+        cdef MoveList ml
+        cdef unsigned long long* hashes = NULL
+        cdef int* keep = NULL
+        rows = np.empty((n, ROW_SIZE), dtype=np.int8)
+        if n == 0:
+            return rows, []
+        cdef signed char[:, ::1] r = rows
+        #Züge mit (0,0) auf 4 Unterzüge auffüllen, der leere Unterzug wird nicht ausgeführt
+        ml.n = n
+        ml.length = 4
+        ml.capacity = n
+        ml.data = <int*> malloc(8 * n * sizeof(int))
+        hashes = <unsigned long long*> malloc(n * sizeof(unsigned long long))
+        keep = <int*> malloc(n * sizeof(int))
+        try:
+            if not ml.data or not hashes or not keep:
+                raise MemoryError()
+            for i in range(n):
+                m = moves[i]
+                if len(m) > 4:
+                    raise ValueError("unique_afterstates: mehr als 4 Unterzüge " + str(m))
+                for j in range(4):
+                    if j < len(m) and m[j] != (0, 0):
+                        ml.data[8*i + 2*j] = self._source(m[j][0], side)
+                        ml.data[8*i + 2*j + 1] = m[j][1]
+                    else:
+                        ml.data[8*i + 2*j] = 0
+                        ml.data[8*i + 2*j + 1] = 0
+            with nogil:
+                u = board_unique(&self.b, side, &ml, &r[0, 0], hashes, keep)
+            return rows[:u].copy(), [moves[keep[i]] for i in range(u)]
+        finally:
+            free(ml.data)
+            free(hashes)
+            free(keep)
+
+    #Wie unique_afterstates, dazu die 198 Features jeder Stellung als (K,198) float32-Array
+    #Die Spieler-Features gehören zu player, wie extractFeatures(player) nach dem eigenen Zug
+    #Gibt (Stellungen, Features, Züge) zurück, die Kodierung läuft ohne GIL
+    def afterstate_features(self, moves, player):
+        cdef int side = self._side(player)
+        cdef Py_ssize_t i, n
+        rows, moves = self.unique_afterstates(moves, player)
+        n = len(rows)
+        features = np.empty((n, NUM_FEATURES), dtype=np.float32)
+        if n == 0:
+            return rows, features, moves
+        cdef signed char[:, ::1] r = rows
+        cdef float[:, ::1] f = features
+        with nogil:
+            for i in range(n):
+                encode_row(&r[i, 0], side, &f[i, 0])
+        return rows, features, moves
+
+    #Die aktuelle Stellung als kompakte Zeile
+    def board_array(self):
+        row = np.empty(ROW_SIZE, dtype=np.int8)
+        cdef signed char[::1] r = row
+        self._write_row(&r[0])
+        return row
+
+    cdef void _write_row(self, signed char* row) noexcept:
+        board_write_row(&self.b, row)
 
     def get_bar_to_board_moves(self, roll, player):
+        cdef int side = self._side(player)
+        cdef int pos0, pos1
+        cdef bint val1, val2
         moves = []
         #Sind die Heimfelder blockiert die die Würfel anzeigen?
-        pos0 = roll[0] - 1 if player == self.players[0] else len(self.points) - roll[0]
-        pos1 = roll[1] - 1 if player == self.players[0] else len(self.points) - roll[1]
-        val1 = self.is_target_valid(pos0, player)
-        val2 = self.is_target_valid(pos1, player)
-        taken = self.black_taken if player == self.players[0] else self.white_taken
+        pos0 = roll[0] - 1 if side == BLACK else 24 - roll[0]
+        pos1 = roll[1] - 1 if side == BLACK else 24 - roll[1]
+        val1 = self._valid(pos0, side)
+        val2 = self._valid(pos1, side)
         #Falls beide Würfel genutzt werden können müssen sie genutzt werden
-        if taken > 1 and val1 and val2:
+        if self.b.bar[side] > 1 and val1 and val2:
             moves.append((("bar", pos0), ("bar", pos1)))
         else:
             #Falls nicht möglich, andere Züge für den zweiten würfel finden
@@ -233,83 +1440,88 @@ class Game:
         return moves
 
     def generate_moves(self, roll, player):
-        valid = self.is_target_valid
-        board = self.points
+        cdef int side = self._side(player)
+        cdef int r0, r1, a, b, farpos
+        cdef bint a0, a1
         #Alle zweier Kombinationen aus den derzeitigen Positionen ermitteln
-        chk = self.black_checkers if player == self.players[0] else self.white_checkers
+        chk = self._checkers(side)
         comb = list(itertools.combinations(chk, 2))
-        comb += [(a,a) for a in chk if board[a] > 1 or board[a] < -1]
+        comb += [(a,a) for a in chk if self.b.points[a] > 1 or self.b.points[a] < -1]
         #Züge suchen
         moves = []
         #Schwarz geht die Zahlen hoch, Weiß runter
-        if player == self.players[1]:
-            roll = (-roll[0], -roll[1])
+        r0, r1 = roll
+        if side == WHITE:
+            r0, r1 = -r0, -r1
         #Jeden Zug prüfen
         for (a,b) in comb:
             #Zwei Steine Bewegen
-            a0 = valid(a + roll[0], player)
-            a1 = valid(a + roll[1], player)
-            if a0 and valid(b + roll[1], player):
-                moves.append(((a, a + roll[0]), (b, b + roll[1])))
-            if a1 and valid(b + roll[0], player) and not (a==b and a0):
-                moves.append(((a, a + roll[1]), (b, b + roll[0])))
+            a0 = self._valid(a + r0, side)
+            a1 = self._valid(a + r1, side)
+            if a0 and self._valid(b + r1, side):
+                moves.append(((a, a + r0), (b, b + r1)))
+            if a1 and self._valid(b + r0, side) and not (a==b and a0):
+                moves.append(((a, a + r1), (b, b + r0)))
             #Ein Stein bewegen
-            farpos = a + roll[0] + roll[1]
-            if a == b and farpos >= 0 and farpos < len(self.points) and valid(farpos, player):
+            farpos = a + r0 + r1
+            if a == b and farpos >= 0 and farpos < 24 and self._valid(farpos, side):
                 if a0:
-                    moves.append(((a, a + roll[0]), (a + roll[0], farpos)))
+                    moves.append(((a, a + r0), (a + r0, farpos)))
                 elif a1:
-                    moves.append(((a, a + roll[1]), (a + roll[1], farpos)))
+                    moves.append(((a, a + r1), (a + r1, farpos)))
         #Falls man keine zwei Züge generieren kann, schauen ob man vielleicht einen Einzelnen schafft
         if moves == []:
-            m1 = self.generate_single_move(prev_move=None, dice=roll[0], player=player)
-            m2 = self.generate_single_move(prev_move=None, dice=roll[1], player=player)
+            m1 = self.generate_single_move(prev_move=None, dice=r0, player=player)
+            m2 = self.generate_single_move(prev_move=None, dice=r1, player=player)
             m1.extend(m2)
             moves += [((0,0), m) for m in m1]
         #Zurückgeben
         return moves
-    
-    def generate_single_move(self, prev_move, dice, player):
-        chk = self.black_checkers if player == self.players[0] else self.white_checkers
-        if player == self.players[1] and dice > 0:
+
+    def generate_single_move(self, prev_move, int dice, player):
+        cdef int side = self._side(player)
+        cdef int x
+        if side == WHITE and dice > 0:
             dice = -dice
-        #Alle normalen Züge 
-        moves = [(x, x + dice) for x in chk if self.is_target_valid(x + dice, player)]
+        #Alle normalen Züge
+        moves = [(x, x + dice) for x in self._checkers(side) if self._valid(x + dice, side)]
         #kann man den Stein direkt weiter ziehen?
-        if prev_move and self.is_target_valid(prev_move[1] + dice, player):
+        if prev_move and self._valid(prev_move[1] + dice, side):
             moves.append((prev_move[1], prev_move[1] + dice))
         return moves
-    
-    def generate_double_move(self, prev_move, dice, player):
-        chk = self.black_checkers if player == self.players[0] else self.white_checkers
-        if player == self.players[1] and dice > 0:
+
+    def generate_double_move(self, prev_move, int dice, player):
+        cdef int side = self._side(player)
+        cdef int x
+        if side == WHITE and dice > 0:
             dice = -dice
         #Einzelzüge besorgen
         s_moves = self.generate_single_move(prev_move, dice, player)
         #Weiteren Zug anhängen
-        moves = [((a,b),(b,b+dice)) for (a,b) in s_moves if self.is_target_valid(b+dice, player)]
-        for x in chk:
+        moves = [((a,b),(b,b+dice)) for (a,b) in s_moves if self._valid(b+dice, side)]
+        for x in self._checkers(side):
             for y in s_moves:
-                if self.is_target_valid(x+dice, player):
-                    if ((x,x+dice) == y and self.points[x] > 2) or (x,x+dice) != y:
+                if self._valid(x+dice, side):
+                    if ((x,x+dice) == y and self.b.points[x] > 2) or (x,x+dice) != y:
                         moves.append((y, (x,x+dice)))
         return moves
-            
-    def generate_triple_move(self, prev_move, dice, player):
-        chk = self.black_checkers if player == self.players[0] else self.white_checkers
-        if player == self.players[1] and dice > 0:
+
+    def generate_triple_move(self, prev_move, int dice, player):
+        cdef int side = self._side(player)
+        cdef int x
+        if side == WHITE and dice > 0:
             dice = -dice
         #Doppelzüge besorgen
         d_moves = self.generate_double_move(prev_move, dice, player)
         #Weiteren Zug anhängen
-        moves = [((a,b), (c,d), (d, d+dice)) for ((a,b), (c,d)) in d_moves if self.is_target_valid(d+dice, player)]
-        for x in chk:
+        moves = [((a,b), (c,d), (d, d+dice)) for ((a,b), (c,d)) in d_moves if self._valid(d+dice, side)]
+        for x in self._checkers(side):
             for (y,z) in d_moves:
-                if self.is_target_valid(x+dice, player):
-                    if (((x,x+dice) == y or (x,x+dice) == z) and self.points[x] > 2) or ((x,x+dice) != y and (x,x+dice) != z):
+                if self._valid(x+dice, side):
+                    if (((x,x+dice) == y or (x,x+dice) == z) and self.b.points[x] > 2) or ((x,x+dice) != y and (x,x+dice) != z):
                         moves.append((y, z, (x,x+dice)))
         return moves
-            
+
     #Bei einem Pasch müssen 4 Züge ausgeführt werden
     def get_quad_moves(self, dice, player):
         #Bis zu 4 Steine von der Bar bewegen
@@ -318,15 +1530,16 @@ class Game:
         #4 Züge finden
         else:
             return self.generate_quad_moves(dice, player)
-        
-    def get_quad_bar_to_board_moves(self, dice, player):
+
+    def get_quad_bar_to_board_moves(self, int dice, player):
+        cdef int side = self._side(player)
+        cdef int pos, taken
         moves = []
         #Ist das von den Würfeln gezeigt Heimfeld blockiert?
-        pos = dice - 1 if player == self.players[0] else len(self.points) - dice
-        valid = self.is_target_valid(pos, player)
-        taken = self.black_taken if player == self.players[0] else self.white_taken
+        pos = dice - 1 if side == BLACK else 24 - dice
+        taken = self.b.bar[side]
         #Falls alle Würfel genutzt werden können müssen sie genutzt werden
-        if valid:
+        if self._valid(pos, side):
             bar_move = ("bar", pos)
             if taken >= 4:
                 moves.append((bar_move, bar_move, bar_move, bar_move))
@@ -340,184 +1553,573 @@ class Game:
                 triples = self.generate_triple_move(bar_move, dice, player)
                 moves += [(bar_move, t1, t2, t3) for (t1, t2, t3) in triples]
         return moves
-  
-    """
-        Kombinationsmöglichkeiten:
-        1. quad
-        2. triple + single
-        3. double + double
-        4. double + single + single
-        5. single + single + single + single
-        
-        Der Genickbruch eines jeden schnellen Backgammon-Programms:
-        Die Berechnung von allen Möglichkeiten bei 4 Würfeln!
-    """
-    def generate_quad_moves(self, dice, player):
-        #Optimieren
-        board = self.points
-        valid = self.is_target_valid
-        #Weiß läuft entgengesetzt
-        if player == self.players[1] and dice > 0:
+
+    #Alle Züge für einen Pasch ohne Steine auf der Bar, siehe doubles_dfs
+    #Können nicht alle 4 Würfel genutzt werden, werden so viele wie möglich gezogen
+    def generate_quad_moves(self, int dice, player):
+        cdef int side = self._side(player)
+        cdef int cur[8]
+        cdef int i, j, rc
+        cdef MoveList ml
+        ml.n = 0
+        ml.length = 0
+        ml.capacity = 0
+        ml.data = NULL
+        if dice < 0:
             dice = -dice
-        #Alle zweier Kombinationen aus den derzeitigen Positionen ermitteln
-        chk = self.black_checkers if player == self.players[0] else self.white_checkers
-        #Alle Positionen mit mindestens einem Stein
-        single = chk[:]
-        #Alle Positionen mit mindestens zwei Steinen
-        double = [x for x in chk if abs(board[x]) >= 2]
-        #Alle Positionen mit mindestens drei Steinen
-        triple = [x for x in chk if abs(board[x]) >= 3]
-        #Alle Positionen mit mindestens vier Steinen
-        quad = [x for x in chk if abs(board[x]) >= 4]
-        #Gültige Zielpunkte sammeln
-        valid_dict = {}
-        for s in single:
-            for i in range(4):
-                target = s+dice*(i+1)
-                if target not in valid_dict:
-                    if i == 0:
-                        valid_dict[target] = valid(target, player)
-                    else:
-                        valid_dict[target] = valid(target, player) and target >= 0 and target < len(self.points)
-                        
-        moves = []
-        
-        #Quads, 1. Kombination
-        for q in quad:
-            if valid_dict[q+dice]:
-                moves.append(((q, q+dice),(q, q+dice),(q, q+dice),(q, q+dice)))
-                
-        #Triples
-        for t in triple:
-            #2. Kombination
-            for s in single:
-                if t != s and valid_dict[t+dice] and valid_dict[s+dice]:
-                    moves.append(((t, t+dice),(t, t+dice),(t, t+dice),(s, s+dice)))
-            #Folgezüge für triples
-            if valid_dict[t+dice] and valid_dict[t+dice*2]:
-                moves.append(((t, t+dice),(t, t+dice),(t, t+dice),(t+dice, t+dice*2)))   
-                
-        #Doubles
-        for d in double:
-            d1 = valid_dict[d+dice]
-            d2 = valid_dict[d+dice*2]
-            d3 = valid_dict[d+dice*3]
-            #3. Kombination
-            for ds in double:
-                #Keine Doppelten bitte
-                if ds > d:
-                    if d1 and valid_dict[ds+dice]:
-                        moves.append(((d, d+dice),(d, d+dice),(ds, ds+dice),(ds, ds+dice)))
-            #4. Kombination
-            for s1 in single:
-                for s2 in single:
-                    if s2 > s1 and d != s1 and d != s2:
-                        if valid_dict[d+dice] and valid_dict[s1+dice] and valid_dict[s2+dice]:
-                            moves.append(((d, d+dice),(d, d+dice),(s1, s1+dice),(s2, s2+dice)))
-                #Doppelzug gefolgt von einem Folgezug und einem single
-                if d1 and d2 and d != s1 and valid_dict[s1+dice]:
-                        moves.append(((d, d+dice),(d, d+dice),(d+dice, d+dice*2),(s1, s1+dice)))
-            #Folgezüge für doubles
-            #Jeweils zwei Züge mit zwei Steinen
-            if d1 and d2:
-                moves.append(((d, d+dice),(d, d+dice),(d+dice, d+dice*2),(d+dice, d+dice*2)))
-            #Ein double gefolgt von einem doppelten Folgezug
-            if d1 and d2 and d3:
-                moves.append(((d, d+dice),(d, d+dice),(d+dice, d+dice*2),(d+dice*2, d+dice*3)))
-
-        #Singles
-        for s1 in single:
-            sv1 = valid_dict[s1+dice]
-            sv2 = valid_dict[s1+dice*2]
-            sv3 = valid_dict[s1+dice*3]
-            sv4 = valid_dict[s1+dice*4]
-            for s2 in single:
-                sec1 = valid_dict[s2+dice]
-                sec2 = valid_dict[s2+dice*2]
-                sec3 = valid_dict[s2+dice*3]
-                for s3 in single:
-                    for s4 in single:
-                        #5. Kombination
-                        if s4 > s3 > s2 > s1:
-                            if sv1 and valid_dict[s2+dice] and valid_dict[s3+dice] and valid_dict[s4+dice]:
-                                moves.append(((s1, s1+dice),(s2, s2+dice),(s3, s3+dice),(s4, s4+dice)))
-                    #Züge mit mindestens drei Steinen
-                    if s2 > s1 and s3 != s2 and s3 != s1:
-                        #Zwei Einzelzüge gefolgt von einem Folgezug
-                        if sv1 and sec1 and valid_dict[s3+dice] and valid_dict[s3+dice*2]:
-                            moves.append(((s1, s1+dice),(s2, s2+dice),(s3, s3+dice),(s3+dice, s3+dice*2)))
-                
-            #Folgezüge für singles
-                if s2 > s1:
-                    #Ein Zug mit dem ersten Stein und drei mit dem zweiten
-                    if sv1 and sec1 and sec2 and sec3:
-                        moves.append(((s1, s1+dice),(s2, s2+dice),(s2+dice, s2+dice*2),(s2+dice*2, s2+dice*3)))
-                    #Zwei Züge mit dem ersten und zwei mit dem zweiten
-                    if sv1 and sv2 and sec1 and sec2:
-                        moves.append(((s1, s1+dice),(s1+dice, s1+dice*2),(s2, s2+dice),(s2+dice, s2+dice*2)))
-                    #Drei Züge mit dem ersten Stein und einen weiteren mit dem zweiten
-                    if sv1 and sv2 and sv3 and sec1:
-                        moves.append(((s1, s1+dice),(s1+dice, s1+dice*2),(s1+dice*2, s1+dice*3),(s2, s2+dice)))
-            #Zwei Züge mit dem ersten Stein gefolgt von einem double
-            for d in double:
-                if d != s1 and sv1 and sv2 and valid_dict[d+dice]:
-                    moves.append(((s1, s1+dice),(s1+dice, s1+dice*2),(d, d+dice),(d, d+dice)))
-                    
-            #Vier Züge mit einem einzigen Stein
-            if sv1 and sv2 and sv3 and sv4:
-                moves.append(((s1, s1+dice),(s1+dice, s1+dice*2),(s1+dice*2, s1+dice*3),(s1+dice*3, s1+dice*4)))
-
-        #Tupel sortieren um Doppelte zu finden und zu löschen
-        #Erhöht zwar hier den Rechenaufwand, aber reduziert die Anzahl der Züge erheblich!
-        if player == self.players[0]:
-            return set([tuple(sorted(x)) for x in moves])
-        else:
-            return set([tuple(sorted(x, reverse=True)) for x in moves])
+        try:
+            #Die Suche verändert das Brett nur vorübergehend, die Features bleiben gültig
+            with nogil:
+                rc = doubles_dfs(&self.b, side, dice, 0, 0, cur, &ml)
+            if rc < 0:
+                raise MemoryError()
+            moves = []
+            for i in range(ml.n):
+                moves.append(tuple([(ml.data[8*i + 2*j], ml.data[8*i + 2*j + 1]) for j in range(ml.length)]))
+        finally:
+            free(ml.data)
+        return moves
 
-   #Prüft ob das angegeben Ziel gültig ist
+    #Prüft ob das angegeben Ziel gültig ist
     def is_target_valid(self, int target, str player):
-        #Landen wir jenseis des Spielbretts?
-        if target < 0 or target >= len(self.points):
-            return self.can_offboard(player)
-        #Prüfen ob das Ziel blockiert ist (2 oder mehr Gegnersteine vorhanden)
-        if player == self.players[0]:
-            return self.points[target] > -2
-        elif player == self.players[1]:
-            return self.points[target] < 2
-            
+        return self._valid(target, self._side(player))
+
+    cdef inline bint _valid(self, int target, int side) noexcept:
+        return board_valid(&self.b, target, side)
+
     #Hat der Spieler Steine die vom Gegner rausgeworfen wurden?
     def has_bar_pieces(self, str player):
-        if player == self.players[0]:
-            return self.black_taken > 0
-        elif player == self.players[1]:
-            return self.white_taken > 0
-    
+        return self.b.bar[self._side(player)] > 0
+
     #Hat der Spieler alle seine Steine in seiner Homezone?
     def can_offboard(self, str player):
-        if player == self.players[0]:
-            return self.black_taken == 0 and self.black_checkers[0] > 18
-        elif player == self.players[1]:
-            return self.white_taken == 0 and self.white_checkers[0] < 7
-        
+        return self._can_offboard(self._side(player))
+
+    cdef inline bint _can_offboard(self, int side) noexcept:
+        return board_can_offboard(&self.b, side)
+
     #Gibt den Gewinner zurück falls es einen gibt
     def get_winner(self):
-        if self.black_checkers == [] and self.black_taken == 0:
+        if self.b.off[BLACK] == 15:
             return self.players[0]
-        elif self.white_checkers == [] and self.white_taken == 0:
+        elif self.b.off[WHITE] == 15:
             return self.players[1]
         else:
             return None
-        
+
     def get_opponent(self, player):
         return self.players[0] if player == self.players[1] else self.players[1]
-    
+
     def Clone(self):
-        g = Game()
-        g.reset_to_state(self.get_state())
+        cdef Game g = Game(self.move_cache)
+        #Die Kopie würfelt mit demselben Generator weiter
+        g.rng = self.rng
+        g.b = self.b
+        g.refresh_features()
         return g
 
     def print_game_state(self):
         print("GameState:", self.points, "|", self.black_checkers, "|", self.white_checkers)
-        bl = sum([self.points[i] for i in range(len(self.points)) if self.points[i] > 0])
-        wt = sum([self.points[i] for i in range(len(self.points)) if self.points[i] < 0])
-        print("Black/White:", bl, "/", wt, "Bar:", self.black_taken, "/", self.white_taken)
\ No newline at end of file
+        bl = sum([p for p in self.points if p > 0])
+        wt = sum([p for p in self.points if p < 0])
+        print("Black/White:", bl, "/", wt, "Bar:", self.b.bar[BLACK], "/", self.b.bar[WHITE])
+
+#Rundet auf die nächste ganze Zahl in [-127,127]
+cdef inline signed char quantize_int8(float a) noexcept nogil:
+    if a >= 127:
+        return 127
+    if a <= -127:
+        return -127
+    return <signed char>(<int>(a + 0.5) if a >= 0 else <int>(a - 0.5))
+
+#Berechnet die 198 Features für viele Stellungen auf einmal, in derselben Kodierung wie Game.extractFeatures
+#boards: (N,24) Steine je Feld, positiv für Schwarz und negativ für Weiß
+#bar, off: (N,2) Steine auf der Bar bzw. außerhalb des Spiels, Spalte 0 Schwarz, Spalte 1 Weiß
+#side: Spieler für die beiden letzten Features (0/'black' oder 1/'white'), einer für alle oder einer je Stellung
+#out: optionaler (N,198) float32 Puffer, in den geschrieben wird
+def extract_features_batch(boards, bar, off, side, out=None):
+    cdef int[:, ::1] b = np.ascontiguousarray(boards, dtype=np.intc)
+    cdef int[:, ::1] br = np.ascontiguousarray(bar, dtype=np.intc)
+    cdef int[:, ::1] of = np.ascontiguousarray(off, dtype=np.intc)
+    cdef Py_ssize_t n = b.shape[0], k
+    if b.shape[1] != 24 or br.shape[0] != n or br.shape[1] != 2 or of.shape[0] != n or of.shape[1] != 2:
+        raise ValueError("extract_features_batch: erwartet boards (N,24), bar (N,2) und off (N,2)")
+    #Spielernamen in Seiten umwandeln
+    if isinstance(side, str):
+        side = BLACK if side == Game.PLAYERS[0] else WHITE
+    cdef int[::1] sides = np.ascontiguousarray(np.broadcast_to(side, (n,)), dtype=np.intc)
+    if out is None:
+        out = np.empty((n, NUM_FEATURES), dtype=np.float32)
+    cdef float[:, ::1] o = out
+    if o.shape[0] != n or o.shape[1] != NUM_FEATURES:
+        raise ValueError("extract_features_batch: out muss die Form (N,198) haben")
+    with nogil:
+        for k in range(n):
+            encode_board(&b[k, 0], &br[k, 0], &of[k, 0], sides[k], &o[k, 0])
+    return out
+
+#Zobrist-Hashes vieler Stellungen, gleich Game.get_hash(player) in der jeweiligen Stellung
+#rows: (N,28) oder (N,26) Stellungszeilen, side: Spieler (0/'black' oder 1/'white')
+def hash_rows(rows, side):
+    cdef signed char[:, ::1] r = np.ascontiguousarray(rows, dtype=np.int8)
+    cdef Py_ssize_t n = r.shape[0], k
+    cdef int i
+    cdef Board b
+    cdef unsigned long long flip
+    if n and r.shape[1] < ROW_OFF:
+        raise ValueError("hash_rows: erwartet (N,28) oder (N,26) Zeilen")
+    if isinstance(side, str):
+        side = BLACK if side == Game.PLAYERS[0] else WHITE
+    flip = ZOBRIST_SIDE if side == WHITE else 0
+    out = np.empty(n, dtype=np.uint64)
+    cdef unsigned long long[::1] o = out
+    with nogil:
+        for k in range(n):
+            for i in range(24):
+                b.points[i] = r[k, i]
+            b.bar[BLACK] = r[k, ROW_BAR]
+            b.bar[WHITE] = r[k, ROW_BAR + 1]
+            o[k] = board_hash(&b) ^ flip
+    return out
+
+#Vorwärtsrechnung für QuantizedModel: Eingaben und Hidden-Aktivierungen als int8, Gewichte int8,
+#Summen in int32, danach Skala, Bias und sigmoid in float
+#X: (N,D) Features, in_inverse: (D,) Kehrwerte der Eingabeskalen
+#layers: Liste von (w (D,H) int8, w_scale (H,) float32, bias (H,) float32), Ergebnis (N,H) float32
+#Die Eingaben einer Schicht werden erst beim Summieren quantisiert, Nullen (bei den Features die
+#meisten) dabei übersprungen
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def quantized_forward(X, in_inverse, layers):
+    out = np.ascontiguousarray(X, dtype=np.float32)
+    cdef float[:, ::1] x = out
+    cdef float[::1] inv = np.ascontiguousarray(in_inverse, dtype=np.float32)
+    cdef Py_ssize_t n = x.shape[0], d = x.shape[1], h, k, i, j
+    cdef signed char[:, ::1] m
+    cdef float[::1] ws
+    cdef float[::1] bias
+    cdef float[:, ::1] o
+    cdef int[::1] accumulator
+    cdef int* acc
+    cdef const signed char* row
+    cdef int v
+    cdef float a
+    if inv.shape[0] != d:
+        raise ValueError("quantized_forward: in_inverse passt nicht zu X")
+    for number, (w, w_scale, b) in enumerate(layers):
+        m = np.ascontiguousarray(w, dtype=np.int8)
+        ws = np.ascontiguousarray(w_scale, dtype=np.float32)
+        bias = np.ascontiguousarray(b, dtype=np.float32)
+        h = m.shape[1]
+        if m.shape[0] != d or ws.shape[0] != h or bias.shape[0] != h:
+            raise ValueError("quantized_forward: Layer " + str(number) + " passt nicht")
+        out = np.empty((n, h), dtype=np.float32)
+        o = out
+        accumulator = np.empty(h + 1, dtype=np.intc)
+        acc = &accumulator[0]
+        with nogil:
+            for k in range(n):
+                for j in range(h):
+                    acc[j] = 0
+                for i in range(d):
+                    if x[k, i] != 0:
+                        v = quantize_int8(x[k, i] * inv[i])
+                        row = &m[i, 0]
+                        for j in range(h):
+                            acc[j] += v * row[j]
+                for j in range(h):
+                    o[k, j] = 1.0 / (1.0 + expf(-(acc[j] * ws[j] + bias[j])))
+        #Aktivierungen in [0,1] gehen mit der Skala 1/127 in die nächste Schicht
+        x = o
+        inv = np.full(h, 127, dtype=np.float32)
+        d = h
+    return out
+
+"""
+    Inkrementelle Bewertung (NNUE-artig)
+
+    Ein Unterzug ändert nur wenige der 198 Features. Statt für jede Stellung die ganze erste
+    Schicht (198 x H) neu zu rechnen, führt das Spiel je angehängtem Accumulator die Summe
+    b1 + x W1 der ersten Schicht (ohne die beiden Spieler-Features) mit: Bei jedem Unterzug
+    und jeder Rücknahme werden nur die Zeilen von W1 der geänderten Features addiert.
+    Eine Bewertung kostet dann O(geänderte Features x H) plus die kleine Ausgabeschicht.
+    Die Gewichte (Accumulator) sind unveränderlich und können von mehreren Spielern und
+    Threads geteilt werden, der Zustand (AccumulatorState) gehört zum jeweiligen Spiel.
+"""
+
+cdef class Accumulator:
+
+    cdef object w1
+    cdef object b1
+    cdef object w2
+    cdef object b2
+    cdef const float* w1_data
+    cdef const float* b1_data
+    cdef const float* w2_data
+    cdef float b2_value
+    cdef public int hidden
+    cdef public object name
+
+    #layers: [(kernel (198,H), bias (H,)), (kernel (H,k), bias (k,))] wie NumpyModel.layers,
+    #jeweils mit sigmoid. Bewertet wird nur der erste Output
+    def __init__(self, layers, name='Accumulator'):
+        if len(layers) != 2:
+            raise ValueError("Accumulator: erwartet genau zwei Schichten (Hidden und Output)")
+        (w1, b1), (w2, b2) = layers
+        self.w1 = np.ascontiguousarray(w1, dtype=np.float32)
+        self.b1 = np.ascontiguousarray(b1, dtype=np.float32)
+        self.w2 = np.ascontiguousarray(np.asarray(w2, dtype=np.float32)[:, 0])
+        self.b2 = np.ascontiguousarray(b2, dtype=np.float32)
+        self.hidden = self.w1.shape[1]
+        if self.w1.shape[0] != NUM_FEATURES or self.b1.shape[0] != self.hidden or self.w2.shape[0] != self.hidden:
+            raise ValueError("Accumulator: Schichten passen nicht zu 198 Features")
+        cdef float[:, ::1] v1 = self.w1
+        cdef float[::1] vb = self.b1
+        cdef float[::1] v2 = self.w2
+        self.w1_data = &v1[0, 0]
+        self.b1_data = &vb[0]
+        self.w2_data = &v2[0]
+        self.b2_value = self.b2[0]
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+    #Output des Netzes für die aktuelle Stellung des Spiels mit den Spieler-Features für player
+    #(gleich model.get_output(game.extractFeatures(player))[0][0])
+    def evaluate(self, Game game, player):
+        cdef AccumulatorState state = game._accumulator_state(self)
+        cdef int side = game._side(player)
+        cdef const float* turn = self.w1_data + (PLAYER_FEATURE + (0 if side == BLACK else 1)) * self.hidden
+        cdef double out = self.b2_value
+        cdef int j
+        with nogil:
+            for j in range(self.hidden):
+                out += self.w2_data[j] / (1. + exp(-(state.acc[j] + turn[j])))
+        return 1. / (1. + exp(-out))
+
+#Summe der ersten Schicht eines Accumulators für ein Spiel, in double damit sich bei vielen
+#Unterzügen und Rücknahmen keine Rundungsfehler aufsummieren
+cdef class AccumulatorState:
+
+    cdef Accumulator model
+    cdef object values
+    cdef double* acc
+
+    def __init__(self, Accumulator model):
+        self.model = model
+        self.values = np.zeros(model.hidden + 1, dtype=np.float64)
+        cdef double[::1] v = self.values
+        self.acc = &v[0]
+
+    #Berechnet die Summe aus dem kompletten Feature-Puffer neu
+    cdef void refresh(self, const float* feat) noexcept:
+        cdef int i, j, h = self.model.hidden
+        cdef const float* row
+        for j in range(h):
+            self.acc[j] = self.model.b1_data[j]
+        for i in range(PLAYER_FEATURE):
+            if feat[i] != 0:
+                row = self.model.w1_data + i * h
+                for j in range(h):
+                    self.acc[j] += feat[i] * row[j]
+
+    #Führt die Summe für n Features mit den alten Werten old und dem neuen Puffer feat nach
+    cdef void update(self, const int* index, const float* old, const float* feat, int n) noexcept:
+        cdef int k, j, h = self.model.hidden
+        cdef double delta
+        cdef const float* row
+        for k in range(n):
+            delta = <double>feat[index[k]] - old[k]
+            if delta != 0:
+                row = self.model.w1_data + index[k] * h
+                for j in range(h):
+                    self.acc[j] += delta * row[j]
+
+"""
+    Cache für die Zuggenerierung
+
+    Merkt sich die Zuglisten (und Nachfolgestellungen) je Stellung, Wurf und Seite, damit
+    Suchen die dieselben Stellungen mehrfach besuchen nicht jedes Mal neu generieren.
+    Begrenzt wird über die Anzahl gespeicherter Züge, verdrängt wird der am längsten
+    nicht benutzte Eintrag (LRU). Kann von mehreren Game-Objekten geteilt werden.
+"""
+
+cdef class MoveCache:
+
+    cdef object entries
+    #Höchstzahl gespeicherter Züge über alle Einträge
+    cdef public long max_moves
+    cdef public long moves
+    cdef public long hits
+    cdef public long misses
+    cdef public long evictions
+
+    def __init__(self, max_moves=1000000):
+        self.entries = OrderedDict()
+        self.max_moves = max_moves
+        self.clear()
+
+    #Löscht alle Einträge und die Statistik
+    def clear(self):
+        self.entries.clear()
+        self.moves = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    #Gibt den gespeicherten Eintrag zurück oder None
+    def get(self, bytes key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value[0]
+
+    #Speichert einen Eintrag der n Züge enthält und verdrängt alte Einträge bis wieder Platz ist
+    def put(self, bytes key, value, long n):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.moves -= old[1]
+        self.entries[key] = (value, n)
+        self.moves += n
+        while self.moves > self.max_moves and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.moves -= old[1]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'moves': self.moves, 'max_moves': self.max_moves,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.}
+
+"""
+    Transpositionstabelle für Bewertungen
+
+    Feste Größe, je Hash-Bucket zwei Einträge: Der erste wird nur durch Einträge mit
+    mindestens derselben Suchtiefe ersetzt (teuer neu zu berechnen), der zweite immer.
+    Ein Eintrag gilt nur für genau die Suchtiefe, mit der er gespeichert wurde.
+"""
+
+cdef struct TTEntry:
+    unsigned long long key
+    double value
+    #-1 = leerer Eintrag
+    int depth
+
+cdef class TranspositionTable:
+
+    cdef TTEntry* entries
+    cdef unsigned long long mask
+    cdef public long hits
+    cdef public long misses
+    cdef public long stores
+
+    #size: Anzahl der Einträge, wird auf eine Zweierpotenz abgerundet
+    def __cinit__(self, size=1 << 18):
+        cdef unsigned long long buckets = 1
+        while buckets * 4 <= size:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.entries = <TTEntry*> PyMem_Malloc(2 * buckets * sizeof(TTEntry))
+        if not self.entries:
+            raise MemoryError()
+        self.clear()
+
+    def __dealloc__(self):
+        PyMem_Free(self.entries)
+
+    #Löscht alle Einträge und die Statistik
+    def clear(self):
+        cdef unsigned long long i
+        for i in range(2 * (self.mask + 1)):
+            self.entries[i].key = 0
+            self.entries[i].depth = -1
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    #Gibt den gespeicherten Wert zurück oder None
+    def probe(self, unsigned long long key, int depth=0):
+        cdef TTEntry* bucket = self.entries + 2 * (key & self.mask)
+        if bucket[0].depth == depth and bucket[0].key == key:
+            self.hits += 1
+            return bucket[0].value
+        if bucket[1].depth == depth and bucket[1].key == key:
+            self.hits += 1
+            return bucket[1].value
+        self.misses += 1
+        return None
+
+    #Wie probe, zählt aber nicht in hits/misses (zum Nachsehen vor einer gebündelten Bewertung)
+    def peek(self, unsigned long long key, int depth=0):
+        cdef TTEntry* bucket = self.entries + 2 * (key & self.mask)
+        if bucket[0].depth == depth and bucket[0].key == key:
+            return bucket[0].value
+        if bucket[1].depth == depth and bucket[1].key == key:
+            return bucket[1].value
+        return None
+
+    def store(self, unsigned long long key, int depth, double value):
+        cdef TTEntry* bucket = self.entries + 2 * (key & self.mask)
+        cdef TTEntry* entry
+        if bucket[0].depth < 0 or depth >= bucket[0].depth or bucket[0].key == key:
+            entry = bucket
+        else:
+            entry = bucket + 1
+        entry.key = key
+        entry.depth = depth
+        entry.value = value
+        self.stores += 1
+
+    def __len__(self):
+        return 2 * (self.mask + 1)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses, 'stores': self.stores,
+                'hit_rate': self.hits / lookups if lookups else 0.}
+
+"""
+    One-sided Bear-off-Datenbank: Löser
+
+    Stellungen sind bis zu 15 Steine auf den 6 Heimfeldern einer Seite (Feld 0 ist 1 Auge
+    vom Ziel entfernt), zusammen C(21,6) = 54264 Stellungen. Für jede wird die Verteilung
+    der Anzahl Würfe bis alle Steine abgetragen sind berechnet, wobei jeder Wurf so gezogen
+    wird, dass die erwartete Anzahl Würfe minimal ist. Mit jedem Würfel der mindestens so groß
+    ist wie die Augenzahl darf abgetragen werden.
+    Abweichung von der Engine: Dort darf Schwarz erst abtragen, wenn kein Stein mehr 6 Augen vom Ziel
+    steht. Solche Stellungen werden hier wie alle anderen bewertet.
+    Schreiben und Lesen der Datei übernimmt BearoffDatabase.py.
+"""
+
+cdef enum:
+    BEAROFF_POINTS = 6
+    BEAROFF_CHECKERS = 15
+    BEAROFF_POSITIONS = 54264
+
+cdef int BINOM[22][8]
+
+cdef void init_binom():
+    cdef int n, k
+    for n in range(22):
+        for k in range(8):
+            if k == 0:
+                BINOM[n][k] = 1
+            elif n == 0:
+                BINOM[n][k] = 0
+            else:
+                BINOM[n][k] = BINOM[n - 1][k - 1] + BINOM[n - 1][k]
+
+init_binom()
+
+#Index einer Stellung: Rang der Trennstriche im "Stars and Bars"-Bild als Kombination
+cdef inline int bearoff_rank(const int* c) noexcept nogil:
+    cdef int j, total = 0, r = 0
+    for j in range(BEAROFF_POINTS):
+        total += c[j]
+        r += BINOM[total + j][j + 1]
+    return r
+
+#Index der Stellung in der Datenbank, counts: Steine auf den Feldern 1..6 Augen vom Ziel
+def bearoff_index(counts):
+    cdef int c[BEAROFF_POINTS]
+    cdef int j, total = 0
+    if len(counts) != BEAROFF_POINTS:
+        raise ValueError("bearoff_index: es werden genau 6 Felder erwartet")
+    for j in range(BEAROFF_POINTS):
+        c[j] = counts[j]
+        if c[j] < 0:
+            raise ValueError("bearoff_index: negative Anzahl Steine")
+        total += c[j]
+    if total > BEAROFF_CHECKERS:
+        raise ValueError("bearoff_index: mehr als 15 Steine")
+    return bearoff_rank(c)
+
+#Sucht rekursiv die beste Folge von Unterzügen für die restlichen Würfel
+#Gibt den Index der Nachfolgestellung zurück, falls sie besser als best ist, sonst -1
+cdef int bearoff_best(int* c, const int* dice, int n, const double* expected, double* best) noexcept nogil:
+    cdef int p, d, idx, r, result = -1
+    cdef bint moved = False
+    if n > 0:
+        d = dice[0]
+        for p in range(BEAROFF_POINTS):
+            if c[p] == 0:
+                continue
+            #Stein auf Feld p (p+1 Augen) zieht d weiter, ist der Würfel groß genug wird abgetragen
+            moved = True
+            c[p] -= 1
+            if p >= d:
+                c[p - d] += 1
+            r = bearoff_best(c, dice + 1, n - 1, expected, best)
+            if r >= 0:
+                result = r
+            if p >= d:
+                c[p - d] -= 1
+            c[p] += 1
+    #Alle Würfel verbraucht oder keine Steine mehr übrig
+    if not moved:
+        idx = bearoff_rank(c)
+        if expected[idx] < best[0]:
+            best[0] = expected[idx]
+            return idx
+    return result
+
+#Löst die Datenbank, gibt (Erwartete Würfe (N,), Verteilung (N, max_rolls)) zurück
+#Verteilung[i, k] = Wahrscheinlichkeit genau k Würfe zu brauchen
+def solve_bearoff(int max_rolls=32):
+    cdef int n = BEAROFF_POSITIONS
+    expected_arr = np.zeros(n, dtype=np.float64)
+    dist_arr = np.zeros((n, max_rolls), dtype=np.float64)
+    cdef double[::1] expected = expected_arr
+    cdef double[:, ::1] dist = dist_arr
+    cdef int c[BEAROFF_POINTS]
+    cdef int dice[4]
+    cdef int a, b, k, i, j, pips, idx, nxt, ndice
+    cdef double prob, best
+    #Alle Stellungen nach Augenzahl sortiert: Nachfolger haben immer weniger Augen
+    positions = []
+    for counts in itertools.product(range(BEAROFF_CHECKERS + 1), repeat=BEAROFF_POINTS):
+        if sum(counts) <= BEAROFF_CHECKERS:
+            positions.append((sum((j + 1) * counts[j] for j in range(BEAROFF_POINTS)), counts))
+    positions.sort()
+    for pips, counts in positions:
+        for j in range(BEAROFF_POINTS):
+            c[j] = counts[j]
+        idx = bearoff_rank(c)
+        #Alle Steine sind schon ab
+        if pips == 0:
+            expected[idx] = 0.
+            dist[idx, 0] = 1.
+            continue
+        expected[idx] = 1.
+        for a in range(1, 7):
+            for b in range(a, 7):
+                prob = 1. / 18. if a != b else 1. / 36.
+                if a == b:
+                    dice[0] = dice[1] = dice[2] = dice[3] = a
+                    ndice = 4
+                else:
+                    dice[0] = a
+                    dice[1] = b
+                    ndice = 2
+                best = 1e300
+                #Beide Reihenfolgen der Würfel probieren
+                nxt = bearoff_best(c, dice, ndice, &expected[0], &best)
+                if a != b:
+                    dice[0] = b
+                    dice[1] = a
+                    i = bearoff_best(c, dice, ndice, &expected[0], &best)
+                    if i >= 0:
+                        nxt = i
+                expected[idx] += prob * expected[nxt]
+                for k in range(1, max_rolls):
+                    dist[idx, k] += prob * dist[nxt, k - 1]
+    return expected_arr, dist_arr
+
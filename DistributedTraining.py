@@ -0,0 +1,192 @@
+import multiprocessing as mp
+import queue
+import random
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from CythonBackgammon import Game, extract_features_batch
+from NumpyModel import NumpyModel
+from Player import ModelPlayer
+
+# Verteiltes Selbsttraining: mehrere Actor-Prozesse spielen, ein Learner trainiert
+#
+# Der Learner (TDTrainer) veröffentlicht seine Gewichte in einem Shared-Memory-Block
+# (SharedWeights), die Actors lesen daraus ohne Pickling eine Kopie, spielen damit Partien gegen
+# sich selbst und schicken je Partie nur die Stellungen als (K+1,28) int8-Zeilen, die Seite am Zug
+# und den Gewinner zurück. Der Learner berechnet daraus die Features und macht dieselben
+# TD(lambda)-Schritte wie TDTrainer.train. Partien, deren Gewichte mehr als max_staleness
+# Veröffentlichungen alt sind, werden verworfen.
+#
+# Unter Windows (spawn) muss der Aufruf wie üblich hinter if __name__ == '__main__' stehen.
+
+#Größe des Kopfes im Shared Memory: Versionszähler (int64)
+HEADER = 8
+
+#Gewichte im Shared Memory, vor den float32-Daten steht ein Versionszähler
+#Während des Schreibens ist die Version ungerade, Leser wiederholen dann (Seqlock)
+class SharedWeights:
+
+    #shapes: Formen der Arrays (kernel, bias, kernel, bias), name: vorhandenen Block öffnen
+    def __init__(self, shapes, name=None):
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.sizes = [int(np.prod(shape)) for shape in self.shapes]
+        size = HEADER + 4 * sum(self.sizes)
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.version_view = np.ndarray(1, dtype=np.int64, buffer=self.memory.buf)
+        self.data = np.ndarray(sum(self.sizes), dtype=np.float32, buffer=self.memory.buf, offset=HEADER)
+        if self.owner:
+            self.version_view[0] = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def version(self):
+        return int(self.version_view[0]) // 2
+
+    #Schreibt neue Gewichte (nur der Learner)
+    def publish(self, arrays):
+        self.version_view[0] += 1
+        self.data[:] = np.concatenate([np.asarray(a, dtype=np.float32).reshape(-1) for a in arrays])
+        self.version_view[0] += 1
+
+    #Kopie der aktuellen Gewichte als (Version, [Arrays])
+    def snapshot(self):
+        while True:
+            before = int(self.version_view[0])
+            if before % 2:
+                time.sleep(0)
+                continue
+            data = self.data.copy()
+            if int(self.version_view[0]) == before:
+                break
+        arrays = []
+        offset = 0
+        for shape, size in zip(self.shapes, self.sizes):
+            arrays.append(data[offset:offset + size].reshape(shape))
+            offset += size
+        return before // 2, arrays
+
+    def close(self):
+        #Sichten freigeben, sonst lässt sich der Block nicht schließen
+        self.version_view = None
+        self.data = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+#Spielt eine Partie gegen sich selbst und gibt (Zeilen, Seiten, Gewinner) zurück
+#Zeile t ist die Stellung vor dem t-ten Halbzug, die letzte die Endstellung (wie bei TDTrainer.train)
+def play_trajectory(players, player_num, seed=None):
+    game = Game(seed=seed)
+    rows = [game.board_array()]
+    sides = [player_num]
+    while not game.get_winner():
+        game.next_step(players[player_num], player_num)
+        player_num = (player_num + 1) % 2
+        rows.append(game.board_array())
+        sides.append(player_num)
+    winner = 0 if game.get_winner() == game.players[0] else 1
+    return np.array(rows, dtype=np.int8), np.array(sides, dtype=np.int8), winner
+
+#Hauptfunktion eines Actor-Prozesses
+#Alle refresh_interval Partien werden neue Gewichte gelesen, falls es welche gibt
+def actor(number, shm_name, shapes, trajectories, stop, refresh_interval, seed):
+    weights = SharedWeights(shapes, shm_name)
+    rng = random.Random(seed)
+    version = -1
+    games = 0
+    try:
+        while not stop.is_set():
+            if version < 0 or (games % refresh_interval == 0 and weights.version != version):
+                version, arrays = weights.snapshot()
+                model = NumpyModel([(arrays[0], arrays[1]), (arrays[2], arrays[3])])
+                players = [ModelPlayer('black', model), ModelPlayer('white', model)]
+            rows, sides, winner = play_trajectory(players, rng.randint(0, 1), rng.getrandbits(63))
+            games += 1
+            #Blockiert höchstens kurz, damit der Actor das Ende mitbekommt
+            while not stop.is_set():
+                try:
+                    trajectories.put((number, version, rows, sides, winner), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    finally:
+        weights.close()
+
+#Trainiert trainer (TDTrainer) mit games Partien, die actors Prozesse spielen
+#publish_interval: nach so vielen gelernten Partien werden die Gewichte veröffentlicht
+#refresh_interval: so viele Partien spielt ein Actor mindestens mit denselben Gewichten
+#max_staleness: ältere Partien (in Veröffentlichungen) werden verworfen, None = alle lernen
+#validation_interval: alle so viele Partien wird ein Checkpoint gespeichert
+def train_distributed(trainer, games, actors=None, publish_interval=1, refresh_interval=1, max_staleness=None,
+                      validation_interval=None, report_interval=100, seed=None):
+    if actors is None:
+        actors = max(1, (mp.cpu_count() or 2) - 1)
+    variables = trainer.variables
+    weights = SharedWeights([v.shape for v in variables])
+    weights.publish(variables)
+    ctx = mp.get_context()
+    trajectories = ctx.Queue(maxsize=2 * actors)
+    stop = ctx.Event()
+    base = random.randrange(1 << 30) if seed is None else seed
+    processes = [ctx.Process(target=actor, args=(i, weights.name, weights.shapes, trajectories, stop, refresh_interval, base + i),
+                             daemon=True) for i in range(actors)]
+    for p in processes:
+        p.start()
+    stats = {'games': 0, 'plies': 0, 'dropped': 0, 'staleness': 0}
+    start = time.time()
+    try:
+        while stats['games'] < games:
+            try:
+                number, version, rows, sides, winner = trajectories.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    raise RuntimeError("train_distributed: alle Actor-Prozesse sind beendet")
+                continue
+            staleness = weights.version - version
+            if max_staleness is not None and staleness > max_staleness:
+                stats['dropped'] += 1
+                continue
+            #Dieselben Schritte wie TDTrainer.train: Ziel ist die Bewertung der nächsten Stellung,
+            #am Ende der Ausgang der Partie
+            features = extract_features_batch(rows[:, :24], rows[:, 24:26], rows[:, 26:28], sides)
+            for t in range(len(features) - 1):
+                trainer.step(features[t], trainer.get_output(features[t + 1:t + 2]))
+            trainer.step(features[-1], np.array([[winner]], dtype=np.float32))
+            stats['games'] += 1
+            stats['plies'] += len(features)
+            stats['staleness'] += staleness
+            if stats['games'] % publish_interval == 0:
+                weights.publish(variables)
+            if validation_interval and stats['games'] % validation_interval == 0:
+                trainer.save()
+                print("Progress saved!")
+            if report_interval and stats['games'] % report_interval == 0:
+                report(stats, time.time() - start, games)
+    finally:
+        stop.set()
+        #Wartende Actors freigeben
+        try:
+            while True:
+                trajectories.get_nowait()
+        except queue.Empty:
+            pass
+        for p in processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        weights.close()
+    trainer.save()
+    stats['seconds'] = time.time() - start
+    if not report_interval or games % report_interval:
+        report(stats, stats['seconds'], games)
+    return stats
+
+def report(stats, seconds, games):
+    seconds = max(seconds, 1e-9)
+    learned = max(stats['games'], 1)
+    print("Game %d/%d: %.1f games/s, %.0f plies/s, staleness %.2f, dropped %d" % (stats['games'], games, \
+        stats['games'] / seconds, stats['plies'] / seconds, stats['staleness'] / learned, stats['dropped']))
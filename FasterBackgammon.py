@@ -1,13 +1,14 @@
-import random
 import itertools
 import numpy as np
 from Player import RandomPlayer
+from CythonBackgammon import DiceRNG, hash_rows
 
 class Game:
     
     PLAYERS = ['black','white']
     
-    def __init__(self):
+    #seed: Saat für die Würfel, None = zufällig
+    def __init__(self, seed=None, recorder=None):
         #Spielbrett. Index ist Position auf dem Spielfeld und der Wert die Anzahl der Steine auf dem Feld
         #Diese Zahl ist positiv für schwarze und negativ für Weiße Steine
         self.points = [0] * 24
@@ -27,49 +28,52 @@ class Game:
         self.white_taken = 0
         self.players = ['black','white']
         self.turns = 0
+        #Würfel dieses Spiels, wie in CythonBackgammon
+        self.rng = DiceRNG(seed)
+        #Optionaler GameRecord.GameRecordWriter, bekommt in next_step jeden Zug
+        self.recorder = recorder
+        #Gespeicherte Spielpositionen für unmake_moves
+        self.undo_stack = []
+        #Steine die bereits aus dem Spiel sind
+        self.black_off = 0
+        self.white_off = 0
+        #Puffer für die Features, wird bei jedem Unterzug aktualisiert
+        self.features = np.zeros(198, dtype=np.float32)
+        self.refresh_features()
         
     # Methode die exakt die 198 Features liefert die in TD-Gammon 0.0 benutzt wurden
     # Nach "Reinforcement Learning: An Introduction", Sutton & Barto, 2017
+    # Gibt eine Sicht auf den internen Puffer zurück, zum Aufbewahren kopieren!
     def extractFeatures(self, player):
-        points = self.points
-        # 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
-        # 0,1,2,3,4,5 Steine werden kodiert als
-        # 0000, 1000, 1100, 1110, 1110.5, 1111
-        # (4. Bit = (n-3)/2)
-        features = []
-        #Weiße Steine codieren
-        whites = 0
-        for point in points:
-            point = -point
-            if point > 0:
-                whites += point
-                features += self.encodePoint(point)
-            else:
-                features += [0.,0.,0.,0.]
-        #Weiße Steine auf der "Bar", n/2
-        features.append(self.white_taken/2.)
-        #Weiße Steine die bereits aus dem Spiel sind, n/15
-        off = 15 - whites + self.white_taken
-        features.append(off/15.)
-        #Schwarze Steine codieren
-        blacks = 0
-        for point in points:
-            if point > 0:
-                blacks += point
-                features += self.encodePoint(point)
-            else:
-                features += [0.,0.,0.,0.]
-        #Schwarze Steine auf der "Bar", n/2
-        features.append(self.black_taken/2.)
-        #Schwarze Steine die bereits aus dem Spiel sind, n/15
-        off = 15 - blacks + self.black_taken
-        features.append(off/15.)
         # Zwei Features für den derzeitigen Spieler
         if player == self.players[0]:
-            features += [1., 0.]
+            self.features[196:] = [1., 0.]
         else:
-            features += [0., 1.]
-        return np.array(features).reshape(1, -1)
+            self.features[196:] = [0., 1.]
+        return self.features.reshape(1, -1)
+
+    #Baut den Feature-Puffer komplett neu auf
+    def refresh_features(self):
+        for i in range(len(self.points)):
+            self.encode_point_features(i)
+        self.encode_bar_off_features()
+
+    # 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
+    def encode_point_features(self, i):
+        point = self.points[i]
+        #Weiße Steine codieren
+        self.features[4*i:4*i+4] = self.encodePoint(-point if point < 0 else 0)
+        #Schwarze Steine codieren
+        self.features[98+4*i:98+4*i+4] = self.encodePoint(point if point > 0 else 0)
+
+    def encode_bar_off_features(self):
+        #Steine auf der "Bar", n/2
+        self.features[96] = self.white_taken/2.
+        self.features[194] = self.black_taken/2.
+        #Steine die bereits aus dem Spiel sind, n/15
+        #Wie in der ursprünglichen Kodierung zählen Steine auf der Bar doppelt
+        self.features[97] = (self.white_off + 2*self.white_taken)/15.
+        self.features[195] = (self.black_off + 2*self.black_taken)/15.
     
     def encodePoint(self, point):
         if point == 0:
@@ -83,9 +87,12 @@ class Game:
         else:
             return [1.,1.,1.,(point-3)/2.]
         
-    def play(self, player, debug=False):
+    def play(self, player, debug=False, seed=None):
+        #Mit Saat ist das ganze Spiel reproduzierbar
+        if seed is not None:
+            self.rng.seed(seed)
         #Wer anfängt ist zufällig
-        player_num = random.randint(0, 1)
+        player_num = self.rng.below(2)
         #Solange spielen bis es einen Gewinner gibt
         while not self.get_winner():
             #Zug ausführen
@@ -114,11 +121,14 @@ class Game:
     def next_step(self, player, player_num, debug=False):
         self.turns += 1
         #Würfeln
-        roll = (random.randint(1,6), random.randint(1,6))
+        roll = self.rng.roll()
         #Züge berechnen
         moves = self.get_moves(roll, self.players[player_num])
         #Spieler fragen welche der Züge er gerne ausführen möchte
         move = player.get_action(moves, self) if moves else None
+        #Aufzeichnen, vor dem Ausführen damit der Recorder die Startstellung kennt
+        if self.recorder is not None:
+            self.recorder.record(self, roll, move, player_num)
         #Zug ausführen falls es möglich ist 
         if move:
             #Einzelne Unterzüge ausführen
@@ -160,8 +170,26 @@ class Game:
                     self.black_taken += 1
                 #Stein platzieren
                 self.points[move[1]] += piece
+                self.encode_point_features(move[1])
+            elif player == self.players[0]:
+                self.black_off += 1
+            else:
+                self.white_off += 1
+            #Features der betroffenen Felder aktualisieren
+            if move[0] != "bar":
+                self.encode_point_features(move[0])
+            self.encode_bar_off_features()
             #Positionen der schwarzen und weißen Steine aktualisieren
             self.refresh_piece_positions()
+
+    #Führt die Unterzüge aus und merkt sich die vorherige Spielposition
+    def make_moves(self, moves, player):
+        self.undo_stack.append(self.get_state())
+        self.execute_moves(moves, player)
+
+    #Nimmt die zuletzt mit make_moves ausgeführten Unterzüge zurück
+    def unmake_moves(self, moves):
+        self.reset_to_state(self.undo_stack.pop())
             
     def get_state(self):
         return (self.points[:], self.black_taken, self.white_taken)
@@ -173,6 +201,37 @@ class Game:
         self.white_taken = state[2]
         #Positionen der schwarzen und weißen Steine aktualisieren
         self.refresh_piece_positions()
+        #Steine außerhalb des Spiels zählen und Features neu aufbauen
+        self.black_off = 15 - sum([p for p in self.points if p > 0]) - self.black_taken
+        self.white_off = 15 + sum([p for p in self.points if p < 0]) - self.white_taken
+        self.refresh_features()
+
+    #Augen, Steine in der Homezone und Kontakt wie in CythonBackgammon
+    #(hier werden sie bei jedem Aufruf aus den Steinlisten berechnet)
+    @property
+    def black_pips(self):
+        return sum((24 - i) * self.points[i] for i in self.black_checkers) + 25 * self.black_taken
+
+    @property
+    def white_pips(self):
+        return sum((i + 1) * -self.points[i] for i in self.white_checkers) + 25 * self.white_taken
+
+    @property
+    def black_home(self):
+        return sum(self.points[i] for i in self.black_checkers if i >= 18)
+
+    @property
+    def white_home(self):
+        return sum(-self.points[i] for i in self.white_checkers if i <= 5)
+
+    @property
+    def contact(self):
+        black_back = -1 if self.black_taken else (self.black_checkers[0] if self.black_checkers else 24)
+        white_back = 24 if self.white_taken else (self.white_checkers[0] if self.white_checkers else -1)
+        return black_back < white_back
+
+    def get_pips(self, player):
+        return self.black_pips if player == self.players[0] else self.white_pips
 
     #Aktualisiert die Listen mit den Position der Steine
     def refresh_piece_positions(self):
@@ -192,6 +251,30 @@ class Game:
         else:
             return self.generate_moves(roll, player)
 
+    #Gibt jede unterschiedliche Stellung nach dem Wurf genau einmal zurück:
+    #(Stellungen als (K,28) int8-Array: 24 Felder, Bar Schwarz/Weiß, Off Schwarz/Weiß, Züge)
+    def get_afterstates(self, roll, player):
+        return self.unique_afterstates(self.get_moves(roll, player), player)
+
+    #Entfernt aus moves alle Züge die zu einer bereits gefundenen Stellung führen
+    def unique_afterstates(self, moves, player):
+        seen = {}
+        for m in moves:
+            self.make_moves(m, player)
+            key = tuple(self.points) + (self.black_taken, self.white_taken, self.black_off, self.white_off)
+            self.unmake_moves(m)
+            if key not in seen:
+                seen[key] = m
+        return np.array(list(seen), dtype=np.int8).reshape(-1, 28), list(seen.values())
+
+    #Die aktuelle Stellung als kompakte Zeile
+    def board_array(self):
+        return np.array(self.points + [self.black_taken, self.white_taken, self.black_off, self.white_off], dtype=np.int8)
+
+    #Zobrist-Hash der Stellung wie CythonBackgammon.Game.get_hash (für den BatchEvaluator der Model-Player)
+    def get_hash(self, player):
+        return int(hash_rows(self.board_array()[None], player)[0])
+
     def get_bar_to_board_moves(self, roll, player):
         moves = []
         #Sind die Heimfelder blockiert die die Würfel anzeigen?
@@ -506,6 +589,8 @@ class Game:
     def Clone(self):
         g = Game()
         g.reset_to_state(self.get_state())
+        #Die Kopie würfelt mit demselben Generator weiter
+        g.rng = self.rng
         return g
 
     def print_game_state(self):
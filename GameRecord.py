@@ -0,0 +1,210 @@
+import mmap
+import struct
+import numpy as np
+from CythonBackgammon import Game, extract_features_batch
+
+# Kompaktes Binärformat für gespielte Partien
+#
+# Datei: MAGIC, danach beliebig viele Partien hintereinander (nur angehängt, nie geändert)
+# Partie:
+#   1 Byte  GAME_TAG
+#   8 Byte  Saat der Würfel (uint64, Little Endian)
+#   1 Byte  Flags: Bit 0 = Spieler der zuerst zieht (0 Schwarz, 1 Weiß),
+#                  Bit 1 = es folgt die Startstellung als 28 Byte int8-Zeile (sonst Grundstellung)
+#   je Halbzug: 1 Byte (Wurf * 5 + Anzahl Unterzüge), Wurf = (a-1)*6 + (b-1),
+#               danach 1 Byte je Unterzug: Startfeld * 8 + Würfel, Startfeld 24 = Bar,
+#               Würfel 0 = leerer Zug (0,0)
+#   1 Byte  END_TAG, 1 Byte Gewinner (0 Schwarz, 1 Weiß, 2 keiner)
+#
+# Die Spieler wechseln sich immer ab, das Ziel eines Unterzugs ergibt sich aus Startfeld und Würfel.
+
+MAGIC = b'TDGREC1\n'
+GAME_TAG = 0x47
+END_TAG = 0xFF
+BAR = 24
+NO_WINNER = 2
+GAME_HEADER = struct.Struct('<BQB')
+#Grundstellung als kompakte Zeile
+START_ROW = Game().board_array().tobytes()
+
+#Kodiert einen Unterzug der Seite (0 Schwarz, 1 Weiß) in ein Byte
+def encode_submove(move, side):
+    if move == (0, 0):
+        return 0
+    src, dst = move
+    if src == 'bar':
+        die = dst + 1 if side == 0 else 24 - dst
+        src = BAR
+    else:
+        die = dst - src if side == 0 else src - dst
+    if not 1 <= die <= 6:
+        raise ValueError("encode_submove: ungültiger Unterzug " + str(move))
+    return src * 8 + die
+
+def decode_submove(code, side):
+    src, die = divmod(code, 8)
+    if die == 0:
+        return (0, 0)
+    if src == BAR:
+        return ('bar', die - 1 if side == 0 else 24 - die)
+    return (src, src + die if side == 0 else src - die)
+
+#Hängt Partien an eine Datei an
+#Als game.recorder (CythonBackgammon/FasterBackgammon) bekommt er in next_step jeden Zug, und zwar
+#bevor er ausgeführt wird. Eine neue Partie beginnt sobald ein anderes Game-Objekt zieht, die
+#vorherige wird dann mit ihrem Gewinner abgeschlossen (die letzte mit close). Geschrieben werden
+#immer ganze Partien, bei einem Absturz fehlt also höchstens die laufende.
+class GameRecordWriter:
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.game = None
+        self.buffer = bytearray()
+        self.games = 0
+
+    #Zeichnet einen Halbzug auf, move ist der gleich ausgeführte Zug oder None
+    #player_num: 0 Schwarz, 1 Weiß (Index in game.players)
+    def record(self, game, roll, move, player_num):
+        if game is not self.game:
+            self.end_game()
+            self.begin_game(game, player_num)
+        move = move or ()
+        self.buffer.append(((roll[0] - 1) * 6 + roll[1] - 1) * 5 + len(move))
+        self.buffer += bytes(encode_submove(m, player_num) for m in move)
+
+    #Beginnt eine neue Partie in der aktuellen Stellung des Spiels
+    def begin_game(self, game, first_player):
+        row = game.board_array()
+        start = row.tobytes() != START_ROW
+        flags = first_player | (2 if start else 0)
+        self.buffer += GAME_HEADER.pack(GAME_TAG, game.rng.seed_value & 0xFFFFFFFFFFFFFFFF, flags)
+        if start:
+            self.buffer += row.tobytes()
+        self.game = game
+
+    #Schließt die laufende Partie mit dem Gewinner ihres Spiels ab und schreibt sie
+    def end_game(self):
+        if self.game is None:
+            return
+        winner = self.game.get_winner()
+        self.buffer.append(END_TAG)
+        self.buffer.append(NO_WINNER if winner is None else self.game.players.index(winner))
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.game = None
+        self.games += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.end_game()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#Eine gelesene Partie
+class GameRecord:
+
+    def __init__(self, seed, first_player, start, plies, winner):
+        self.seed = seed
+        self.first_player = first_player
+        #Startstellung als 28er Zeile oder None für die Grundstellung
+        self.start = start
+        #Liste von (Spieler 0/1, Wurf, Zug oder None)
+        self.plies = plies
+        #0 Schwarz, 1 Weiß, None falls unvollständig
+        self.winner = winner
+
+    def __len__(self):
+        return len(self.plies)
+
+    #Spielt die Partie nach, liefert vor jedem Halbzug (Spiel, Spieler, Wurf, Zug)
+    #Das Spiel wird dabei weiter verwendet, also nicht festhalten
+    def replay(self):
+        game = Game(seed=self.seed)
+        if self.start is not None:
+            game.reset_to_state((list(self.start[:24]), int(self.start[24]), int(self.start[25])))
+        for player_num, roll, move in self.plies:
+            yield game, player_num, roll, move
+            if move:
+                game.execute_moves(move, game.players[player_num])
+            game.turns += 1
+        yield game, None, None, None
+
+    #Alle Stellungen der Partie als (Halbzüge+1, 28) int8-Array, Zeile 0 ist die Startstellung
+    def positions(self):
+        return np.array([game.board_array() for game, _, _, _ in self.replay()], dtype=np.int8)
+
+    #Seite am Zug je Stellung aus positions()
+    def sides(self):
+        return (self.first_player + np.arange(len(self.plies) + 1)) % 2
+
+    #Feature-Matrix (Halbzüge+1, 198) der Stellungen, Spieler-Features für die Seite am Zug
+    #(so wie NeuralNetModel.train sie nach jedem Zug erzeugt)
+    def features(self):
+        rows = self.positions()
+        return extract_features_batch(rows[:, :24], rows[:, 24:26], rows[:, 26:28], self.sides())
+
+#Liest Partien lazy aus einer Datei, die Datei wird dafür per mmap eingeblendet
+#Eine am Ende nur halb geschriebene Partie wird ignoriert
+class GameRecordReader:
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Keine Partie-Datei: " + str(path))
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __iter__(self):
+        data = self.data
+        pos = len(MAGIC)
+        while pos + GAME_HEADER.size <= len(data):
+            try:
+                record, pos = self.parse(data, pos)
+            except IndexError:
+                return
+            yield record
+
+    #Liest die Partie ab pos und gibt sie mit der Position danach zurück
+    def parse(self, data, pos):
+        tag, seed, flags = GAME_HEADER.unpack_from(data, pos)
+        if tag != GAME_TAG:
+            raise ValueError("Beschädigte Partie-Datei an Position " + str(pos))
+        pos += GAME_HEADER.size
+        start = None
+        if flags & 2:
+            if pos + 28 > len(data):
+                raise IndexError()
+            start = np.frombuffer(data, dtype=np.int8, count=28, offset=pos).copy()
+            pos += 28
+        player_num = flags & 1
+        first_player = player_num
+        plies = []
+        while data[pos] != END_TAG:
+            dice, n = divmod(data[pos], 5)
+            roll = (dice // 6 + 1, dice % 6 + 1)
+            if pos + 1 + n > len(data):
+                raise IndexError()
+            move = tuple(decode_submove(data[pos + 1 + k], player_num) for k in range(n)) or None
+            plies.append((player_num, roll, move))
+            pos += 1 + n
+            player_num = 1 - player_num
+        winner = data[pos + 1]
+        return GameRecord(seed, first_player, start, plies, None if winner == NO_WINNER else winner), pos + 2
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
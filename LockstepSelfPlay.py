@@ -0,0 +1,130 @@
+import random
+import time
+import numpy as np
+from CythonBackgammon import Game
+
+# Selbsttraining mit K Partien im Gleichschritt
+#
+# Statt eine Partie nach der anderen zu spielen (TDTrainer.train) laufen parallel Partien
+# gleichzeitig. Je Halbzug würfeln alle laufenden Partien, die Kandidaten (Stellungen nach jedem
+# möglichen Zug) aller Partien kommen in eine Matrix und werden zusammen mit den Zielwerten der
+# Stellungen aus dem vorherigen Halbzug mit einem einzigen model.get_outputs bewertet.
+# Danach folgen die TD-Schritte des vorherigen Halbzugs, Partie für Partie, und dann wählt jede
+# Partie ihren Zug wie der ModelPlayer (der erste beste Kandidat).
+# Jede Partie hat eigene Eligibility Traces, die mit 0 beginnen. Teilten sich die Partien die
+# Traces des Trainers, würde jede Trace durch die Schritte der anderen Partien zusätzlich abklingen
+# (etwa lambda^parallel je Halbzug) und mit deren TD-Fehlern verrechnet.
+# Unterschiede zu TDTrainer.train: Dort laufen die Traces über alle Partien weiter (wie bei
+# TDGammonModel), hier beginnt jede Partie neu. Die Gewichte ändern sich zwischen den Schritten
+# einer Partie auch durch die anderen Partien, und die Zugwahl sowie die Zielwerte eines Halbzugs
+# werden für alle Partien mit denselben Gewichten berechnet, ohne die Updates des vorherigen.
+
+#Zustand einer laufenden Partie
+class LockstepGame:
+
+    #seed: Saat der Würfel, traces: eigene Traces der Partie (TDTrainer.new_traces)
+    def __init__(self, number, player_num, seed, traces):
+        self.number = number
+        self.game = Game(seed=seed)
+        self.traces = traces
+        self.player_num = player_num
+        #Features der Stellung vor dem nächsten Halbzug aus Sicht des Spielers am Zug
+        self.x = self.game.extractFeatures(self.game.players[player_num]).copy()
+        self.steps = 0
+        #Kandidaten des laufenden Halbzugs
+        self.roll = None
+        self.moves = None
+        #Gespielte Halbzüge (Wurf, Zug, Spieler) für den Recorder
+        self.plies = []
+
+    #Schreibt die beendete Partie in den GameRecordWriter
+    #Der Writer erwartet die Halbzüge einer Partie am Stück, deshalb wird sie erst jetzt nachgespielt
+    def record(self, recorder):
+        game = Game(seed=self.game.rng.seed_value)
+        for roll, move, player_num in self.plies:
+            recorder.record(game, roll, move, player_num)
+            if move:
+                game.execute_moves(move, game.players[player_num])
+        recorder.end_game()
+
+#Trainiert trainer (TDTrainer) mit games Partien, von denen parallel gleichzeitig laufen
+#Speichern und Testen wie bei TDTrainer.train, auch mit einem Checkpointing.AsyncCheckpointer
+#seed: Startspieler und Würfel aller Partien sind damit reproduzierbar
+def train_lockstep(trainer, games, validation_interval, test_games=100, parallel=16, recorder=None, seed=None,
+                   checkpointer=None):
+    rng = random.Random(seed)
+    active = []
+    #TD-Schritte, die noch auf den Wert der nächsten Stellung warten: (Partie, x, x_next, beendet)
+    pending = []
+    started = 0
+    finished = 0
+    plies = 0
+    calls = 0
+    start = time.time()
+    while active or pending or started < games:
+        #Freie Plätze mit neuen Partien füllen
+        while len(active) < parallel and started < games:
+            active.append(LockstepGame(started, rng.randint(0, 1), rng.getrandbits(63), trainer.new_traces()))
+            started += 1
+        #Würfeln und Kandidaten aller Partien sammeln
+        blocks = [np.concatenate([x_next for _, _, x_next, _ in pending])] if pending else []
+        for g in active:
+            game = g.game
+            game.turns += 1
+            g.roll = game.rng.roll()
+            player = game.players[g.player_num]
+            moves = game.get_moves(g.roll, player)
+            if moves:
+                _, features, g.moves = game.afterstate_features(moves, player)
+                blocks.append(features)
+            else:
+                g.moves = None
+        #Eine Bewertung für Zielwerte und Kandidaten
+        values = np.zeros(0, dtype=np.float32)
+        if blocks:
+            values = trainer.get_outputs(np.concatenate(blocks))[:, 0]
+            calls += 1
+        #TD-Schritte des vorherigen Halbzugs, beendete Partien bekommen danach ihre Belohnung
+        for (g, x, x_next, done), v in zip(pending, values):
+            trainer.step(x, np.array([[v]], dtype=np.float32), g.traces)
+            if done:
+                winner = 0 if g.game.get_winner() == g.game.players[0] else 1
+                trainer.step(x_next, np.array([[winner]], dtype=np.float32), g.traces)
+                finished += 1
+                if recorder is not None:
+                    g.record(recorder)
+                print("Game %d/%d (Winner: %s) in %d turns" % (g.number, games, g.game.players[winner], g.steps))
+                #Immer wieder zwischendurch testen und den Fortschritt speichern
+                if validation_interval and finished % validation_interval == 0 and finished < games:
+                    trainer.checkpoint(test_games, checkpointer)
+        offset = len(pending)
+        pending = []
+        #Züge wählen und ausführen
+        still_active = []
+        for g in active:
+            game = g.game
+            player = game.players[g.player_num]
+            move = None
+            if g.moves is not None:
+                v = values[offset:offset + len(g.moves)]
+                offset += len(g.moves)
+                #Wie ModelPlayer: Weiß maximiert den Output, Schwarz minimiert ihn
+                move = g.moves[int(np.argmax(v if g.player_num == 1 else -v))]
+            if recorder is not None:
+                g.plies.append((g.roll, move, g.player_num))
+            if move:
+                game.execute_moves(move, player)
+            g.player_num = (g.player_num + 1) % 2
+            x_next = game.extractFeatures(game.players[g.player_num]).copy()
+            done = game.get_winner() is not None
+            pending.append((g, g.x, x_next, done))
+            g.x = x_next
+            g.steps += 1
+            plies += 1
+            if not done:
+                still_active.append(g)
+        active = still_active
+    seconds = max(time.time() - start, 1e-9)
+    print("%d Spiele, %d Halbzüge, %d Bewertungen in %.1f Sekunden (%.0f Halbzüge/s)" % (finished, plies, calls, seconds, plies / seconds))
+    #Am Ende noch mal speichern und testen
+    trainer.checkpoint(test_games, checkpointer, final=True)
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from Player import RandomPlayer, ModelPlayer
 from CythonBackgammon import Game
+from NumpyModel import save_npz
+from Telemetry import NullTelemetry
 import tensorflow as tf
 import numpy as np
 import random
@@ -21,8 +23,10 @@ class NeuralNetModel(ABC): #based on https://github.com/fomorians/td-gammon
         self.global_step = tf.Variable(0, trainable=False, name='global_step')
 
         # placeholders for input and target output
-        self.x = tf.placeholder('float', [1, input_size], name='x')
-        self.V_next = tf.placeholder('float', [1, output_size], name='V_next')
+        # Die Batch-Dimension ist variabel, damit get_outputs viele Stellungen auf einmal bewerten kann
+        self.x = tf.placeholder('float', [None, input_size], name='x')
+        self.V_next = tf.placeholder('float', [None, output_size], name='V_next')
+        self.output_size = output_size
 
         #Zwei fully-connected, dense Layer: Ein Input-Layer (198 Units) und dann ein Hidden-Layer (40 Units)
         #Beide werden mit der sigmoid Funktion aktiviert
@@ -68,13 +72,20 @@ class NeuralNetModel(ABC): #based on https://github.com/fomorians/td-gammon
     def get_output(self, x):
         return self.sess.run(self.V, feed_dict={ self.x: x })
 
+    #Outputs für viele Stellungen mit einem sess.run, X: (N,198) Features, Ergebnis (N,output_size)
+    def get_outputs(self, X):
+        if len(X) == 0:
+            return np.zeros((0, self.output_size), dtype=np.float32)
+        return self.sess.run(self.V, feed_dict={ self.x: X })
+
     #Testet das Modell gegen den angegebenen enemyAgent
-    def test(self, enemyPlayer=RandomPlayer('white'), games=100, debug=False):
+    #recorder: optionaler GameRecord.GameRecordWriter der alle Partien aufzeichnet
+    def test(self, enemyPlayer=RandomPlayer('white'), games=100, debug=False, recorder=None):
         players = [ModelPlayer('black', self), enemyPlayer]
         
         winners = {'black':0, 'white':0}
         for i in range(games):
-            game = Game()
+            game = Game(recorder=recorder)
 
             winner = game.play(players, debug=debug)
             winners[winner] += 1
@@ -86,50 +97,68 @@ class NeuralNetModel(ABC): #based on https://github.com/fomorians/td-gammon
                 winners['black'], winners['white'], winners_total, \
                 (winners['black'] / winners_total) * 100.0))
             
-    def train(self, games, validation_interval, test_games=100):
+    #checkpointer: optionaler Checkpointing.AsyncCheckpointer, speichert und testet dann im Hintergrund
+    #telemetry: optionales Telemetry.Telemetry, misst die Abschnitte jeder Partie
+    def train(self, games, validation_interval, test_games=100, recorder=None, checkpointer=None, telemetry=None):
+        if telemetry is None:
+            telemetry = NullTelemetry()
         #Selbsttraining, Modell vs Modell
-        players = [ModelPlayer('black', self), ModelPlayer('white', self)]
+        model = telemetry.model(self)
+        players = [ModelPlayer('black', model), ModelPlayer('white', model)]
 
         for i in range(games):
             #Immer wieder zwischendurch testen und den Fortschritt speichern
             if i != 0 and i % validation_interval == 0:
-                self.saver.save(self.sess, self.checkpoint_path + 'checkpoint.ckpt', global_step=global_step)
-                print("Progress saved!")
-                self.test(games = test_games)
+                if checkpointer is not None:
+                    checkpointer.checkpoint(self, test_games)
+                else:
+                    self.saver.save(self.sess, self.checkpoint_path + 'checkpoint.ckpt', global_step=global_step)
+                    print("Progress saved!")
+                    self.test(games = test_games)
 
             #Spiel initialisieren
-            game = Game()
+            game = Game(recorder=recorder)
             player_num = random.randint(0, 1)
+            telemetry.begin_game()
             
-            x = game.extractFeatures(players[player_num].player)
+            #Features kopieren, der Puffer im Spiel ändert sich mit jedem Zug
+            x = game.extractFeatures(players[player_num].player).copy()
 
             #Spiel spielen bis es einen Sieger gibt
             game_step = 0
             while not game.get_winner():
-                game.next_step(players[player_num], player_num)
+                telemetry.next_step(game, players[player_num], player_num)
                 player_num = (player_num + 1) % 2
 
                 #Das Modell mit jeden Schritt im Spiel trainieren
-                x_next = game.extractFeatures(players[player_num].player)
-                V_next = self.get_output(x_next)
+                with telemetry.phase('features'):
+                    x_next = game.extractFeatures(players[player_num].player)
+                V_next = model.get_output(x_next)
                 
-                self.sess.run([self.train_op, self.delta_op], feed_dict={ self.x: x, self.V_next: V_next })
+                with telemetry.phase('update'):
+                    self.sess.run([self.train_op, self.delta_op], feed_dict={ self.x: x, self.V_next: V_next })
 
-                x = x_next
+                x = x_next.copy()
                 game_step += 1
 
             #Gewinner ermitteln
             winner = 0 if game.get_winner() == game.players[0] else 1
 
             #Zu guter letzt reinforcement learning: Dem Modell noch eine "Belohnung" geben, wenn es gewonnen hat
-            _, global_step = self.sess.run([
-                self.train_op,
-                self.global_step,
-            ], feed_dict={ self.x: x, self.V_next: np.array([[winner]], dtype='float') })
+            with telemetry.phase('update'):
+                _, global_step = self.sess.run([
+                    self.train_op,
+                    self.global_step,
+                ], feed_dict={ self.x: x, self.V_next: np.array([[winner]], dtype='float') })
+            telemetry.end_game(winner=players[winner].player)
 
             #Konsolenausgabe hübsch aufbereiten
             print("Game %d/%d (Winner: %s) in %d turns" % (i, games, players[winner].player, game_step))
         #Am Ende noch mal speichern und 100 testen!
+        if checkpointer is not None:
+            checkpointer.checkpoint(self, test_games)
+            checkpointer.flush()
+            return
         self.saver.save(self.sess, self.checkpoint_path + 'checkpoint.ckpt', global_step=global_step) 
         self.test(games = test_games)
         
@@ -139,6 +168,17 @@ class NeuralNetModel(ABC): #based on https://github.com/fomorians/td-gammon
         print("Hidden bias", var_output[1].shape, ":\n", var_output[1])
         print("Hidden weights", var_output[2].shape, ":\n", var_output[2])
         print("Output bias", var_output[3].shape, ":\n", var_output[3])
+
+    #Alle Variablen als {Name: Array}, so wie tf.train.Saver sie speichert (für Checkpointing)
+    def checkpoint_tensors(self):
+        variables = tf.global_variables()
+        return dict(zip([v.op.name for v in variables], self.sess.run(variables)))
+
+    #Schreibt die Gewichte als .npz, die NumpyModel.from_npz ohne TensorFlow lädt
+    def export_npz(self, path):
+        var_output = self.sess.run(tf.trainable_variables())
+        layers = [(var_output[0], var_output[1]), (var_output[2], var_output[3])]
+        save_npz(path, layers, self.get_name(), int(self.sess.run(self.global_step)))
         
 """
 	Implementationen dieser Abstrakten Klasse
@@ -0,0 +1,309 @@
+import os
+import struct
+import numpy as np
+
+# Modell nur für die Vorwärtsrechnung, ohne TensorFlow
+#
+# Liest die Gewichte eines NeuralNetModel einmal aus dessen Checkpoint (checkpoints/<name>/) oder
+# aus einer .npz-Datei (NeuralNetModel.export_npz bzw. save_npz) und rechnet mit NumPy.
+# Über get_output/get_outputs/get_name passt es in alle Model-Player.
+#
+# Ein Checkpoint (Format V2) besteht aus <Präfix>.index, einer SSTable mit einem Eintrag je
+# Tensor (Name -> BundleEntryProto: Typ, Form, Datei, Position, Länge), und den Dateien
+# <Präfix>.data-XXXXX-of-YYYYY mit den Rohdaten. Gelesen wird beides hier ohne TensorFlow.
+
+#Datentypen aus TensorFlows DataType-Enum
+DTYPES = {1: '<f4', 2: '<f8', 3: '<i4', 9: '<i8'}
+TABLE_MAGIC = 0xdb4775248b80fb57
+FOOTER_SIZE = 48
+
+#Tabelle für CRC-32C (Castagnoli), damit prüft TensorFlow Tabellenblöcke und Tensoren
+CRC_TABLE = []
+for _i in range(256):
+    _c = _i
+    for _ in range(8):
+        _c = (_c >> 1) ^ 0x82F63B78 if _c & 1 else _c >> 1
+    CRC_TABLE.append(_c)
+
+def crc32c(data):
+    crc = 0xffffffff
+    for b in data:
+        crc = CRC_TABLE[(crc ^ b) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
+#Gespeichert wird die CRC verschoben plus Konstante (wie crc32c::Mask in TensorFlow/LevelDB)
+def mask_crc(crc):
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xffffffff
+
+def read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+#Felder einer Protobuf-Nachricht als Liste von (Nummer, Wert)
+#Werte von Feldern mit Länge (Nachrichten, Strings) bleiben bytes
+def read_proto(data):
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = read_varint(data, pos)
+        elif wire == 1:
+            value = data[pos:pos + 8]
+            pos += 8
+        elif wire == 2:
+            n, pos = read_varint(data, pos)
+            value = data[pos:pos + n]
+            pos += n
+        elif wire == 5:
+            value = data[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError("read_proto: unbekannter Feldtyp " + str(wire))
+        fields.append((number, value))
+    return fields
+
+#Einträge (Schlüssel, Wert) eines Blocks der SSTable, Schlüssel sind gegen den vorherigen präfixkomprimiert
+def read_block(data, offset, size):
+    #Nach jedem Block folgen 1 Byte Kompression und 4 Byte Prüfsumme
+    if data[offset + size] != 0:
+        raise ValueError("Komprimierter Checkpoint-Index, bitte mit NeuralNetModel.export_npz exportieren")
+    block = data[offset:offset + size]
+    restarts = struct.unpack_from('<I', block, size - 4)[0]
+    end = size - 4 - 4 * restarts
+    entries = []
+    key = b''
+    pos = 0
+    while pos < end:
+        shared, pos = read_varint(block, pos)
+        non_shared, pos = read_varint(block, pos)
+        length, pos = read_varint(block, pos)
+        key = key[:shared] + block[pos:pos + non_shared]
+        pos += non_shared
+        entries.append((key, block[pos:pos + length]))
+        pos += length
+    return entries
+
+#Alle Einträge einer SSTable in Schlüsselreihenfolge
+def read_table(data):
+    footer = data[-FOOTER_SIZE:]
+    if struct.unpack_from('<Q', footer, FOOTER_SIZE - 8)[0] != TABLE_MAGIC:
+        raise ValueError("Keine Checkpoint-Indexdatei")
+    #Erst der Verweis auf den Metaindex (unbenutzt), dann der auf den Index
+    _, pos = read_varint(footer, 0)
+    _, pos = read_varint(footer, pos)
+    index_offset, pos = read_varint(footer, pos)
+    index_size, pos = read_varint(footer, pos)
+    entries = []
+    for _, handle in read_block(data, index_offset, index_size):
+        offset, pos = read_varint(handle, 0)
+        size, pos = read_varint(handle, pos)
+        entries += read_block(data, offset, size)
+    return entries
+
+def write_varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+#Ein Protobuf-Feld: Zahl (wire 0) oder bytes (wire 2)
+def write_proto_field(number, value):
+    if isinstance(value, bytes):
+        return write_varint(number << 3 | 2) + write_varint(len(value)) + value
+    return write_varint(number << 3) + write_varint(value)
+
+#Block der SSTable, jeder Eintrag ist ein Restart-Punkt (keine Präfixkompression)
+def write_block(entries):
+    out = bytearray()
+    restarts = []
+    for key, value in entries:
+        restarts.append(len(out))
+        out += write_varint(0) + write_varint(len(key)) + write_varint(len(value)) + key + value
+    restarts = restarts or [0]
+    out += struct.pack('<%dI' % (len(restarts) + 1), *restarts, len(restarts))
+    return bytes(out)
+
+#SSTable mit den (sortierten) Einträgen in einem Datenblock
+def write_table(entries):
+    out = bytearray()
+    def add_block(block):
+        handle = write_varint(len(out)) + write_varint(len(block))
+        out.extend(block + b'\0' + struct.pack('<I', mask_crc(crc32c(block + b'\0'))))
+        return handle
+    data_handle = add_block(write_block(entries))
+    meta_handle = add_block(write_block([]))
+    index_handle = add_block(write_block([(entries[-1][0], data_handle)]))
+    footer = meta_handle + index_handle
+    out += footer + b'\0' * (FOOTER_SIZE - 8 - len(footer)) + struct.pack('<Q', TABLE_MAGIC)
+    return bytes(out)
+
+#Schreibt Tensoren {Name: Array} als Checkpoint (Format V2, eine Datendatei) mit dem Präfix
+#Lesbar mit read_checkpoint und mit tf.train.Saver.restore
+def write_checkpoint(prefix, tensors):
+    codes = {np.dtype(dtype): code for code, dtype in DTYPES.items()}
+    #Kopf: eine Datendatei, Version 1
+    entries = [(b'', write_proto_field(1, 1) + write_proto_field(3, write_proto_field(1, 1)))]
+    data = bytearray()
+    for name in sorted(tensors):
+        array = np.asarray(tensors[name])
+        array = array.astype(array.dtype.newbyteorder('<'), order='C')
+        raw = array.tobytes()
+        shape = b''.join(write_proto_field(2, write_proto_field(1, d)) for d in array.shape)
+        entry = (write_proto_field(1, codes[array.dtype]) + write_proto_field(2, shape) +
+                 write_proto_field(4, len(data)) + write_proto_field(5, len(raw)) +
+                 write_varint(6 << 3 | 5) + struct.pack('<I', mask_crc(crc32c(raw))))
+        entries.append((name.encode(), entry))
+        data += raw
+    with open(prefix + '.data-00000-of-00001', 'wb') as f:
+        f.write(data)
+    with open(prefix + '.index', 'wb') as f:
+        f.write(write_table(entries))
+
+#Trägt den Checkpoint als neusten im Verzeichnis ein (Datei 'checkpoint' wie von tf.train.Saver)
+#all_prefixes: alle noch vorhandenen Checkpoints, sonst nur prefix
+def update_checkpoint_state(directory, prefix, all_prefixes=None):
+    name = os.path.relpath(prefix, directory)
+    names = [os.path.relpath(p, directory) for p in (all_prefixes or [prefix])]
+    with open(os.path.join(directory, 'checkpoint'), 'w') as f:
+        f.write('model_checkpoint_path: "%s"\n' % name)
+        for n in names:
+            f.write('all_model_checkpoint_paths: "%s"\n' % n)
+
+#Präfix des neusten Checkpoints im Verzeichnis (wie tf.train.latest_checkpoint) oder None
+def latest_checkpoint(directory):
+    path = os.path.join(directory, 'checkpoint')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        for line in f:
+            if line.startswith('model_checkpoint_path:'):
+                prefix = line.split(':', 1)[1].strip().strip('"')
+                if not os.path.isabs(prefix) and not os.path.exists(prefix + '.index'):
+                    prefix = os.path.join(directory, prefix)
+                return prefix
+    return None
+
+#Liest alle ganzen Tensoren bekannter Typen aus dem Checkpoint mit dem Präfix
+#(z.B. checkpoints/TD-Gammon/checkpoint.ckpt-1000), gibt {Name: Array} zurück
+def read_checkpoint(prefix):
+    with open(prefix + '.index', 'rb') as f:
+        entries = read_table(f.read())
+    #Der Eintrag mit leerem Schlüssel ist der Kopf mit der Anzahl der Datendateien
+    num_shards = 1
+    if entries and entries[0][0] == b'':
+        num_shards = dict(read_proto(entries[0][1])).get(1, 1)
+    shards = {}
+    tensors = {}
+    for key, value in entries:
+        if key == b'':
+            continue
+        entry = {}
+        shape = []
+        for number, v in read_proto(value):
+            if number == 2:
+                shape = [dict(read_proto(dim)).get(1, 0) for n, dim in read_proto(v) if n == 2]
+            else:
+                entry[number] = v
+        dtype = DTYPES.get(entry.get(1))
+        #Aufgeteilte Variablen (slices) und andere Typen werden nicht gebraucht
+        if dtype is None or 7 in entry:
+            continue
+        shard = entry.get(3, 0)
+        if shard not in shards:
+            with open('%s.data-%05d-of-%05d' % (prefix, shard, num_shards), 'rb') as f:
+                shards[shard] = f.read()
+        count = entry.get(5, 0) // np.dtype(dtype).itemsize
+        data = np.frombuffer(shards[shard], dtype=dtype, count=count, offset=entry.get(4, 0))
+        tensors[key.decode()] = data.reshape(shape).astype(dtype[1:])
+    return tensors
+
+#Die Dense-Layer als Liste von (kernel, bias) in der Reihenfolge dense, dense_1, dense_2, ...
+#scope: nur Variablen mit diesem Präfix, falls mehrere Modelle im Checkpoint stehen
+def dense_layers(tensors, scope=''):
+    layers = []
+    for name, kernel in tensors.items():
+        if name.startswith(scope) and name.endswith('/kernel') and kernel.ndim == 2:
+            layer = name[:-len('/kernel')]
+            base = layer.rsplit('/', 1)[-1]
+            suffix = base.rsplit('_', 1)[-1]
+            layers.append((layer[:-len(base)], int(suffix) if '_' in base and suffix.isdigit() else 0, layer))
+    layers.sort()
+    layers = [(tensors[layer + '/kernel'], tensors[layer + '/bias']) for _, _, layer in layers]
+    for (w0, _), (w1, _) in zip(layers, layers[1:]):
+        if w0.shape[1] != w1.shape[0]:
+            raise ValueError("dense_layers: Layer passen nicht zusammen, scope angeben")
+    return layers
+
+class NumpyModel:
+
+    #layers: Liste von (kernel, bias), jeder Layer mit sigmoid aktiviert (wie NeuralNetModel)
+    def __init__(self, layers, name='NumpyModel', global_step=None):
+        self.layers = [(np.ascontiguousarray(w, dtype=np.float32), np.ascontiguousarray(b, dtype=np.float32))
+                       for w, b in layers]
+        self.name = name
+        self.global_step = global_step
+
+    #Lädt den neusten Checkpoint eines NeuralNetModel
+    #path: Checkpoint-Verzeichnis oder -Präfix, sonst wie NeuralNetModel CHECKPOINT_PATH bzw. checkpoints/<name>/
+    @classmethod
+    def from_checkpoint(cls, path=None, name='TD-Gammon', scope=''):
+        if path is None:
+            path = os.environ.get('CHECKPOINT_PATH', 'checkpoints/' + name + '/')
+        prefix = latest_checkpoint(path) if os.path.isdir(path) else path
+        if prefix is None:
+            raise IOError("Kein Checkpoint in " + str(path))
+        tensors = read_checkpoint(prefix)
+        step = tensors.get('global_step')
+        return cls(dense_layers(tensors, scope), name, None if step is None else int(step))
+
+    #Lädt die Gewichte aus einer .npz-Datei (siehe save_npz)
+    @classmethod
+    def from_npz(cls, path):
+        with np.load(path) as data:
+            layers = [(data['kernel_%d' % i], data['bias_%d' % i]) for i in range(int(data['layers']))]
+            step = int(data['global_step']) if 'global_step' in data else None
+            return cls(layers, str(data['name']), step)
+
+    #Schreibt die Gewichte als .npz: layers, kernel_i, bias_i, name und global_step
+    def save_npz(self, path):
+        save_npz(path, self.layers, self.name, self.global_step)
+
+    #Outputs für (N,198) Features, Ergebnis (N,1) float32
+    def get_outputs(self, X):
+        a = np.asarray(X, dtype=np.float32)
+        for w, b in self.layers:
+            a = a @ w
+            a += b
+            #sigmoid, ohne Zwischenarrays
+            np.negative(a, out=a)
+            np.exp(a, out=a)
+            a += 1.
+            np.reciprocal(a, out=a)
+        return a
+
+    #Wie NeuralNetModel.get_output, x: (1,198) Features
+    def get_output(self, x):
+        return self.get_outputs(x)
+
+    def get_name(self):
+        return self.name
+
+def save_npz(path, layers, name, global_step=None):
+    data = {'layers': len(layers), 'name': name}
+    for i, (w, b) in enumerate(layers):
+        data['kernel_%d' % i] = w
+        data['bias_%d' % i] = b
+    if global_step is not None:
+        data['global_step'] = global_step
+    np.savez(path, **data)
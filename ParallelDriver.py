@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from CythonBackgammon import Game
+from Player import Player, TwoPlyValuePlayer, ExpectiminimaxValuePlayer
+
+# Mehrere Spiele oder Suchzweige gleichzeitig in Threads eines Prozesses
+#
+# Zuggenerator, Duplikaterkennung und Feature-Kodierung von CythonBackgammon laufen ohne GIL,
+# ebenso die Rechnungen in TensorFlow und NumPy. Threads teilen sich dabei das geladene Modell,
+# MoveCache und Transpositionstabelle, was mit Prozessen nicht billig geht.
+# Ein Game-Objekt gehört immer nur einem Thread, deshalb arbeitet jeder Auftrag auf einem
+# eigenen Spiel bzw. einer eigenen Kopie (Clone).
+
+def default_threads():
+    return os.cpu_count() or 1
+
+#Spielt eine Partie mit der angegebenen Saat, gibt den Gewinner zurück
+def play_game(players, seed=None, move_cache=None):
+    return Game(move_cache=move_cache, seed=seed).play(players)
+
+#Wie PlayerTest.test, die Partien laufen aber auf threads Threads verteilt
+#Spiel i würfelt mit der Saat seed + i, das Ergebnis hängt also nicht von der Anzahl Threads ab
+#(solange die Spieler selbst nicht zufällig entscheiden)
+def play_games(players, games=100, threads=None, seed=None, move_cache=None):
+    if threads is None:
+        threads = default_threads()
+    wins = {Game.PLAYERS[0] : 0, Game.PLAYERS[1] : 0}
+    start = time.time()
+    with ThreadPoolExecutor(threads) as executor:
+        seeds = [None if seed is None else seed + i for i in range(games)]
+        for winner in executor.map(lambda s: play_game(players, s, move_cache), seeds):
+            wins[winner] += 1
+    end = time.time()
+    # Hübsch ausgeben
+    print(wins)
+    print(players[0].get_name(), 'vs.' , players[1].get_name(), ':', wins['black']/games * 100, '%')
+    print(games, "Spiele mit", threads, "Threads in", end - start, "Sekunden")
+    return wins
+
+#Funktion game -> Wert eines Kandidaten (Stellung nach dem eigenen Zug), so wie get_action des
+#Spielers ihn berechnet
+def candidate_value(player):
+    if isinstance(player, ExpectiminimaxValuePlayer):
+        return lambda game: player.expectiminimax(game, 0)
+    if isinstance(player, TwoPlyValuePlayer):
+        return lambda game: player.two_ply(game, player.player)
+    return lambda game: player.evaluate(game, player.player)
+
+#Bewertet die Züge gleichzeitig, die Züge werden dafür in chunks Teile aufgeteilt und jeder Teil
+#auf einer eigenen Kopie des Spiels ausgeführt. Gibt die Werte in der Reihenfolge der Züge zurück
+def evaluate_candidates(game, actions, player, executor, value=None, chunks=None):
+    if value is None:
+        value = candidate_value(player)
+    if chunks is None:
+        chunks = default_threads()
+    def work(part):
+        clone = game.Clone()
+        player.attach_cache(clone)
+        values = []
+        for a in part:
+            clone.make_moves(a, player.player)
+            values.append(value(clone))
+            clone.unmake_moves(a)
+        return values
+    parts = [actions[i::chunks] for i in range(chunks)]
+    results = list(executor.map(work, parts))
+    #Wieder in die ursprüngliche Reihenfolge bringen
+    values = [None] * len(actions)
+    for i, part in enumerate(results):
+        values[i::chunks] = part
+    return values
+
+#Spieler, der die Kandidaten eines anderen Spielers (ValuePlayer, 2-ply, 3-ply, Expectiminimax)
+#gleichzeitig bewertet. Er wählt denselben Zug wie der Spieler selbst
+class ParallelPlayer(Player):
+
+    def __init__(self, player, threads=None):
+        Player.__init__(self, player.player)
+        self.inner = player
+        self.threads = default_threads() if threads is None else threads
+        self.executor = ThreadPoolExecutor(self.threads)
+
+    def get_action(self, actions, game):
+        # Züge die zur selben Stellung führen nur einmal bewerten
+        _, actions = game.unique_afterstates(actions, self.player)
+        values = evaluate_candidates(game, actions, self.inner, self.executor, chunks=self.threads)
+        # Der erste beste Zug, wie in den Schleifen der Spieler
+        best = max(range(len(actions)), key=lambda i: (values[i], -i))
+        return actions[best]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def get_name(self):
+        return "ParallelPlayer [" + self.inner.get_name() + "]"
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import random
 import math
+import numpy as np
 
 
 # Von ABC erben = Abstrakte Klasse
@@ -38,56 +39,86 @@ ValuePlayer und mögliche Implementationen von Value-Funktionen
 
 class ValuePlayer(Player):
     
-    def __init__(self, player, valuefunction):
+    # Optional eine Transpositionstabelle (CythonBackgammon.TranspositionTable), in der bereits
+    # bewertete Stellungen gemerkt werden. Nur für feste Value-Funktionen, nicht beim Training!
+    # Optional ein CythonBackgammon.MoveCache, den die Suchen während get_action an das Spiel hängen
+    def __init__(self, player, valuefunction, table=None, cache=None):
         Player.__init__(self, player)
         self.value = valuefunction
+        self.table = table
+        self.cache = cache
+        
+    # Hängt den MoveCache an das Spiel und gibt den vorherigen zurück
+    def attach_cache(self, game):
+        previous = getattr(game, 'move_cache', None)
+        if self.cache is not None:
+            game.move_cache = self.cache
+        return previous
+    
+    def detach_cache(self, game, previous):
+        if self.cache is not None:
+            game.move_cache = previous
+        
+    # Bewertet die Stellung, fragt vorher die Transpositionstabelle
+    def evaluate(self, game, player):
+        value = self.probe(game, player, 0)
+        if value is None:
+            value = self.value(game, player)
+            self.store(game, player, 0, value)
+        return value
+    
+    # Gespeicherter Wert für die Stellung und die restliche Suchtiefe oder None
+    def probe(self, game, player, depth):
+        if self.table is None:
+            return None
+        return self.table.probe(game.get_hash(player), depth)
+    
+    def store(self, game, player, depth, value):
+        if self.table is not None:
+            self.table.store(game.get_hash(player), depth, value)
         
     def get_action(self, actions, game):
-        # Spielstatus speichern
-        old_state = game.get_state()
+        # Züge die zur selben Stellung führen nur einmal bewerten
+        _, actions = game.unique_afterstates(actions, self.player)
         # Variablen initialisieren
         best_value = float("-inf")
         best_action = None
         # Alle Züge durchsuchen
         for a in actions:
             # Zug ausführen
-            game.execute_moves(a, self.player)
+            game.make_moves(a, self.player)
             # Spielstatus bewerten
-            value = self.value(game, self.player)
+            value = self.evaluate(game, self.player)
             # Besten merken
             if value > best_value:
                 best_value = value
                 best_action = a
-            # Spiel zurücksetzen
-            game.reset_to_state(old_state)
+            # Zug zurücknehmen
+            game.unmake_moves(a)
         return best_action
     
     def get_name(self):
         return "ValuePlayer [" + self.value.__name__ + "]"
 		
 def way_to_go(game, player):
-    # Seite ermitteln
-    black = player == game.players[0]
-    # Steine besorgen
-    enemy_checkers = game.white_checkers if black else game.black_checkers
-    # Schritte berechnen
-    steps = 0
-    # Steine auf dem Spielfeld
-    for tower in enemy_checkers:
-        if black:
-            steps += (24 - tower) * game.points[tower]
-        else:
-            steps += tower * game.points[tower] * -1
-    # Steine auf der Bar
-    bar_chk = game.white_taken if black else game.black_taken
-    steps += 25 * bar_chk 
+    # Früher wurde über die Gegnersteine summiert: Für Schwarz (24 - Feld) * Steine (negativ),
+    # für Weiß -Feld * Steine, plus 25 je Stein auf der Bar. Das ist dasselbe wie die
+    # Augenzahl des Gegners minus 25 (bzw. 24) je Gegnerstein auf dem Brett, beides führt das
+    # Spiel mit, also ohne Schleife
+    if player == game.players[0]:
+        on_board = 15 - game.white_off - game.white_taken
+        steps = game.white_pips - 25 * on_board
+    else:
+        on_board = 15 - game.black_off - game.black_taken
+        steps = game.black_pips - 24 * on_board
     return steps / 375
 	
 def singleton(game, player):
     chk = game.black_checkers if player == game.players[0] else game.white_checkers
+    points = game.points
     singles = 0
     for i in chk:
-        if abs(game.points[i]) == 1:
+        if abs(points[i]) == 1:
             singles += 1
             
     # Zahl in [0,1]
@@ -98,24 +129,122 @@ def single_to_go(game, player):
 	
 def blocker(game, player):
     chk = game.black_checkers if player == game.players[0] else game.white_checkers
-    blocked = len([x for x in chk if abs(game.points[x]) >= 2])
+    points = game.points
+    blocked = len([x for x in chk if abs(points[x]) >= 2])
     return blocked / 7
+
+# Value-Funktion aus einem CythonBackgammon.Accumulator (NNUE), Werte wie beim ModelPlayer von owner
+# Die erste Schicht wird bei jedem make_move/unmake_move der Suche nachgeführt statt neu gerechnet,
+# passt also zu ValuePlayer, den n-ply- und Expectiminimax-Spielern, z.B.
+# TwoPlyValuePlayer('white', accumulator_value(Accumulator(model.layers, model.get_name()), 'white'))
+def accumulator_value(accumulator, owner):
+    def value(game, player):
+        v = accumulator.evaluate(game, player)
+        return 1 - v if owner == game.players[0] else v
+    value.__name__ = accumulator.get_name()
+    return value
 	
 """
 ModelPlayer
 """
 
+ALL_ROLLS = [(a,b) for a in range(1,7) for b in range(a,7)]
+
+# Gebündelte Bewertung für die Model-Player
+# Vor einer Entscheidung werden alle Stellungen gesammelt, die die Suche bewerten wird, und mit
+# wenigen Aufrufen von model.get_outputs bewertet. Die Suche selbst bleibt unverändert und findet
+# die Werte über den Zobrist-Hash (game.get_hash) der Stellung wieder.
+# Vorgemerkt wird jede Stellung nur einmal. Ab max_rows vorgemerkten Stellungen wird bewertet,
+# damit die Feature-Matrix auch bei tiefen Suchbäumen klein bleibt (65536 Zeilen sind etwa 50 MB).
+# CythonBackgammon wird erst beim ersten Vormerken geladen, die Spieler funktionieren also auch
+# ohne die kompilierte Erweiterung mit anderen Engines (dann wird jede Stellung einzeln bewertet).
+class BatchEvaluator:
+
+    def __init__(self, model, player, max_rows=65536):
+        self.model = model
+        self.player = player
+        self.max_rows = max_rows
+        self.values = {}
+        self.pending = []
+        self.pending_keys = set()
+        self.pending_rows = 0
+        #Ob der Wert für self.player umgedreht wird (game.players[0] minimiert), beim Vormerken gesetzt
+        self.flip = None
+
+    # Merkt Stellungen als (K,28) Zeilen zur Bewertung aus Sicht des Spielers vor
+    # Schon bewertete, vorgemerkte oder in der Transpositionstabelle gespeicherte Stellungen werden
+    # übersprungen (peek zählt nicht als Zugriff, die Statistik der Tabelle zählt nur ValuePlayer.evaluate)
+    def add(self, game, rows, table=None):
+        if not len(rows):
+            return
+        from CythonBackgammon import hash_rows
+        self.flip = self.player == game.players[0]
+        keys, index = np.unique(hash_rows(rows, self.player), return_index=True)
+        keep_keys = []
+        keep = []
+        for k, i in zip(keys.tolist(), index.tolist()):
+            if k in self.values or k in self.pending_keys:
+                continue
+            if table is not None and table.peek(k, 0) is not None:
+                continue
+            self.pending_keys.add(k)
+            keep_keys.append(k)
+            keep.append(i)
+        if not keep:
+            return
+        self.pending.append((keep_keys, rows[keep]))
+        self.pending_rows += len(keep)
+        if self.pending_rows >= self.max_rows:
+            self.flush()
+
+    # Bewertet alle vorgemerkten Stellungen mit einem Aufruf des Modells
+    def flush(self):
+        if not self.pending:
+            return
+        from CythonBackgammon import extract_features_batch
+        keys = [k for part, _ in self.pending for k in part]
+        rows = np.concatenate([r for _, r in self.pending])
+        self.pending = []
+        self.pending_keys = set()
+        self.pending_rows = 0
+        features = extract_features_batch(rows[:, :24], rows[:, 24:26], rows[:, 26:28], self.player)
+        v = self.model.get_outputs(features)[:, 0]
+        v = 1 - v if self.flip else v
+        self.values.update(zip(keys, v.tolist()))
+
+    # Wert der Stellung aus Sicht von player, vorab bewertet oder mit einem einzelnen Aufruf
+    def value(self, game, player):
+        v = self.values.get(game.get_hash(player)) if self.values else None
+        if v is None:
+            features = game.extractFeatures(player)
+            v = self.model.get_output(features)[0][0]
+            v = 1 - v if self.player == game.players[0] else v
+        return v
+
+    def clear(self):
+        self.values = {}
+        self.pending = []
+        self.pending_keys = set()
+        self.pending_rows = 0
+
 class ModelPlayer(ValuePlayer):
     
-    def __init__(self, player, model):
-        ValuePlayer.__init__(self, player, self.get_value)
+    def __init__(self, player, model, table=None, cache=None):
+        ValuePlayer.__init__(self, player, self.get_value, table, cache)
         self.model = model
+        self.batch = BatchEvaluator(model, player)
+        
+    # Alle Kandidaten mit einem Aufruf des Modells bewerten, dann wählen wie der ValuePlayer
+    def get_action(self, actions, game):
+        rows, _ = game.unique_afterstates(actions, self.player)
+        self.batch.add(game, rows, self.table)
+        self.batch.flush()
+        action = ValuePlayer.get_action(self, actions, game)
+        self.batch.clear()
+        return action
         
     def get_value(self, game, player):
-        features = game.extractFeatures(player)
-        v = self.model.get_output(features)
-        v = 1 - v if self.player == game.players[0] else v
-        return v
+        return self.batch.value(game, player)
     
     def get_name(self):
         return "ModelPlayer [" + self.model.get_name() +"]"
@@ -127,23 +256,25 @@ class ModelPlayer(ValuePlayer):
 class TwoPlyValuePlayer(ValuePlayer):
     
     def get_action(self, actions, game):
-        # Spielstatus speichern
-        old_state = game.get_state()
+        # Züge die zur selben Stellung führen nur einmal bewerten
+        _, actions = game.unique_afterstates(actions, self.player)
+        previous = self.attach_cache(game)
         # Variablen initialisieren
         best_value = float("-inf")
         best_action = None
         # Alle Züge durchsuchen
         for a in actions:
             # Zug ausführen
-            game.execute_moves(a, self.player)
+            game.make_moves(a, self.player)
             # Spielstatus bewerten
             value = self.two_ply(game, self.player)
             # Besten merken
             if value > best_value:
                 best_value = value
                 best_action = a
-            # Spiel zurücksetzen
-            game.reset_to_state(old_state)
+            # Zug zurücknehmen
+            game.unmake_moves(a)
+        self.detach_cache(game, previous)
         return best_action
         
     def two_ply(self, game, player):
@@ -152,13 +283,12 @@ class TwoPlyValuePlayer(ValuePlayer):
         value = 0
         for roll in all_rolls:
             probability = 1/18 if roll[0] != roll[1] else 1/36
-            state = game.get_state()
-            moves = game.get_moves(roll, game.get_opponent(player))
+            _, moves = game.get_afterstates(roll, game.get_opponent(player))
             min_val = 1
             for move in moves:
-                game.execute_moves(move, game.get_opponent(player))
-                v = self.value(game, player)
-                game.reset_to_state(state)
+                game.make_moves(move, game.get_opponent(player))
+                v = self.evaluate(game, player)
+                game.unmake_moves(move)
                 if v < min_val:
                     min_val = v
             value += probability * min_val
@@ -170,15 +300,30 @@ class TwoPlyValuePlayer(ValuePlayer):
 
 class TwoPlyModelPlayer(TwoPlyValuePlayer):
 
-    def __init__(self, player, model):
-        TwoPlyValuePlayer.__init__(self, player, self.get_value)
+    def __init__(self, player, model, table=None, cache=None):
+        TwoPlyValuePlayer.__init__(self, player, self.get_value, table, cache)
         self.model = model
+        self.batch = BatchEvaluator(model, player)
+        
+    # Alle Gegnerantworten auf alle Kandidaten mit einem Aufruf des Modells bewerten
+    def get_action(self, actions, game):
+        _, candidates = game.unique_afterstates(actions, self.player)
+        opponent = game.get_opponent(self.player)
+        previous = self.attach_cache(game)
+        for a in candidates:
+            game.make_moves(a, self.player)
+            for roll in ALL_ROLLS:
+                rows, _ = game.get_afterstates(roll, opponent)
+                self.batch.add(game, rows, self.table)
+            game.unmake_moves(a)
+        self.detach_cache(game, previous)
+        self.batch.flush()
+        action = TwoPlyValuePlayer.get_action(self, actions, game)
+        self.batch.clear()
+        return action
         
     def get_value(self, game, player):
-        features = game.extractFeatures(player)
-        v = self.model.get_output(features)
-        v = 1 - v if self.player == game.players[0] else v
-        return v
+        return self.batch.value(game, player)
     
     def get_name(self):
         return "TwoPlyModelPlayer [" + self.model.get_name() +"]"
@@ -196,39 +341,42 @@ class ThreePlyValuePlayer(TwoPlyValuePlayer):
         value = 0
         for roll in all_rolls:
             probability = 1/18 if roll[0] != roll[1] else 1/36
-            state = game.get_state()
             # Wir betrachten die Gegnerzüge
-            moves = game.get_moves(roll, game.get_opponent(player))
+            _, moves = game.get_afterstates(roll, game.get_opponent(player))
             min_val = 1
             for move in moves:
-                game.execute_moves(move, game.get_opponent(player))
+                game.make_moves(move, game.get_opponent(player))
                 # Bewertet wird aber aus unserer Perspektive
                 v = self.three_ply(game, player)
                 if v < min_val:
                     min_val = v
-                game.reset_to_state(state)
+                game.unmake_moves(move)
             value += probability * min_val
         # Wert zurückgeben
         return value
     
     # Wie two_ply nur das diesmal maximiert wird
     def three_ply(self, game, player):
+        # Dieselben Stellungen kommen nach vielen Gegnerzügen vor
+        value = self.probe(game, player, 1)
+        if value is not None:
+            return value
         # Alle möglichen Würfe und dazugehörige Züge bewerten und mit der WS des Wurfes multiplizieren
         all_rolls = [(a,b) for a in range(1,7) for b in range(a,7)]
         value = 0
         for roll in all_rolls:
             probability = 1/18 if roll[0] != roll[1] else 1/36
-            state = game.get_state()
-            moves = game.get_moves(roll, player)
+            _, moves = game.get_afterstates(roll, player)
             max_val = 0
             for move in moves:
-                game.execute_moves(move, player)
+                game.make_moves(move, player)
                 # Bewertet wird aber aus unserer Perspektive
-                v = self.value(game, player)
+                v = self.evaluate(game, player)
                 if v > max_val:
                     max_val = v
-                game.reset_to_state(state)
+                game.unmake_moves(move)
             value += probability * max_val
+        self.store(game, player, 1, value)
         # Wert zurückgeben
         return value
     
@@ -244,66 +392,72 @@ class ExpectiminimaxValuePlayer(ValuePlayer):
 
     # Konstruktor braucht einen Parameter für die maximal Suchtiefe
     # 0 = 1-ply, 1= 2-ply, 2 = 3-ply, usw.
-    def __init__(self, player, valuefunction, max_depth):
-        ValuePlayer.__init__(self, player, valuefunction)
+    def __init__(self, player, valuefunction, max_depth, table=None, cache=None):
+        ValuePlayer.__init__(self, player, valuefunction, table, cache)
         self.max_depth = max_depth
     
     def get_action(self, actions, game):
-        # Spielstatus speichern
-        old_state = game.get_state()
+        # Züge die zur selben Stellung führen nur einmal bewerten
+        _, actions = game.unique_afterstates(actions, self.player)
+        previous = self.attach_cache(game)
         # Variablen initialisieren
         best_value = -1
         best_action = None
         # Alle Züge durchsuchen
         for a in actions:
             # Zug ausführen
-            game.execute_moves(a, self.player)
+            game.make_moves(a, self.player)
             # Spielstatus bewerten
             value = self.expectiminimax(game, 0)
             # Besten merken
             if value > best_value:
                 best_value = value
                 best_action = a
-            # Spiel zurücksetzen
-            game.reset_to_state(old_state)
+            # Zug zurücknehmen
+            game.unmake_moves(a)
+        self.detach_cache(game, previous)
         return best_action
         
     def expectiminimax(self, game, depth):
         # Blatt in unserem Baum
         if depth == self.max_depth:
-            return self.value(game, self.player)
+            return self.evaluate(game, self.player)
         else:
+            # Bereits mit derselben restlichen Suchtiefe bewertet?
+            value = self.probe(game, self.player, self.max_depth - depth)
+            if value is not None:
+                return value
             # Alle möglichen Würfe betrachten
             all_rolls = [(a,b) for a in range(1,7) for b in range(a,7)]
             value = 0
             for roll in all_rolls:
                 # Wahrscheinlichkeiten von jedem Wurf
                 probability = 1/18 if roll[0] != roll[1] else 1/36
-                state = game.get_state()
                 # Min-Knoten
                 if depth % 2 == 0:
-                    moves = game.get_moves(roll, game.get_opponent(self.player))
+                    _, moves = game.get_afterstates(roll, game.get_opponent(self.player))
                     temp_val = 1
                     for move in moves:
-                        game.execute_moves(move, game.get_opponent(self.player))
+                        game.make_moves(move, game.get_opponent(self.player))
                         # Bewertet wird aber aus unserer Perspektive
                         v = self.expectiminimax(game, depth + 1)
                         if v < temp_val:
                             temp_val = v
+                        game.unmake_moves(move)
                 # Max-Knoten
                 else:
-                    moves = game.get_moves(roll, self.player)
+                    _, moves = game.get_afterstates(roll, self.player)
                     temp_val = 0
                     for move in moves:
-                        game.execute_moves(move, self.player)
+                        game.make_moves(move, self.player)
                         # Bewertet wird aber aus unserer Perspektive
                         v = self.expectiminimax(game, depth + 1)
                         if v > temp_val:
                             temp_val = v
-                # Spiel zurücksetzen    
-                game.reset_to_state(state)
+                        game.unmake_moves(move)
                 # Wert gewichtet addieren
                 value += probability * temp_val
+            self.store(game, self.player, self.max_depth - depth, value)
             return value
     
     def get_name(self):
@@ -312,15 +466,46 @@ class ExpectiminimaxValuePlayer(ValuePlayer):
 
 class ExpectiminimaxModelPlayer(ExpectiminimaxValuePlayer):
     
-    def __init__(self, player, model, depth):
-        ExpectiminimaxValuePlayer.__init__(self, player, self.get_value, depth)
+    def __init__(self, player, model, depth, table=None, cache=None):
+        ExpectiminimaxValuePlayer.__init__(self, player, self.get_value, depth, table, cache)
         self.model = model
+        self.batch = BatchEvaluator(model, player)
+        
+    # Alle Blätter des Suchbaums sammeln und mit einem Aufruf des Modells bewerten
+    def get_action(self, actions, game):
+        _, candidates = game.unique_afterstates(actions, self.player)
+        previous = self.attach_cache(game)
+        for a in candidates:
+            game.make_moves(a, self.player)
+            self.prefetch(game, 0)
+            game.unmake_moves(a)
+        self.detach_cache(game, previous)
+        self.batch.flush()
+        action = ExpectiminimaxValuePlayer.get_action(self, actions, game)
+        self.batch.clear()
+        return action
+    
+    # Merkt die Blätter vor, die expectiminimax(game, depth) bewerten wird
+    def prefetch(self, game, depth):
+        if depth == self.max_depth:
+            self.batch.add(game, game.board_array()[None, :], self.table)
+            return
+        # Teilbäume aus der Transpositionstabelle werden nicht durchsucht
+        if self.probe(game, self.player, self.max_depth - depth) is not None:
+            return
+        mover = game.get_opponent(self.player) if depth % 2 == 0 else self.player
+        for roll in ALL_ROLLS:
+            rows, moves = game.get_afterstates(roll, mover)
+            if depth + 1 == self.max_depth:
+                self.batch.add(game, rows, self.table)
+                continue
+            for move in moves:
+                game.make_moves(move, mover)
+                self.prefetch(game, depth + 1)
+                game.unmake_moves(move)
         
     def get_value(self, game, player):
-        features = game.extractFeatures(player)
-        v = self.model.get_output(features)
-        v = 1 - v if self.player == game.players[0] else v
-        return v
+        return self.batch.value(game, player)
     
     def get_name(self):
         return "EMinMaxModelPlayer [" + self.model.get_name() +"]"
@@ -368,8 +553,18 @@ class Node:
 
 class MCTSValuePlayer(ValuePlayer):
     
+    # playouts: Anzahl zufälliger Spiele je Iteration. Bei mehr als einem spielt sie
+    # game.random_playouts in einer C-Schleife und der Anteil der Siege wird zurückpropagiert
+    def __init__(self, player, valuefunction, cache=None, playouts=1):
+        ValuePlayer.__init__(self, player, valuefunction, cache=cache)
+        self.playouts = playouts
+    
     def get_action(self, actions, game):
-        return self.MCTS(actions, game, 5000)
+        # Die Kopien des Spiels in MCTS übernehmen den MoveCache
+        previous = self.attach_cache(game)
+        action = self.MCTS(actions, game, 5000)
+        self.detach_cache(game, previous)
+        return action
 
     def MCTS(self, actions, rootgame, itermax):
         #Erstellt die Wurzel
@@ -390,6 +585,7 @@ class MCTSValuePlayer(ValuePlayer):
 
             #Phase 2: Expansion. Hängt den von der value-function als besten Zug bezeichneten Zug an den Baum an
             if node.untriedMoves != []:
+                self.prepare_node(node, game)
                 #Value-function fragen was wir denn nehmen sollten!
                 #m = ValuePlayer.get_action(self, node.untriedMoves, game) 
                 m = random.choice(node.untriedMoves)
@@ -407,12 +603,17 @@ class MCTSValuePlayer(ValuePlayer):
                 node = node.AddChild(m, next_actions, next_player, value)
 
             #Phase 3: Simulation. Spielt das Spiel von dem gewählten Knoten aus zufällig zuende und ermittelt dem Gewinner
-            winner = game.play_random_fast(node.playerJustMoved)
+            if self.playouts > 1:
+                #Anteil der Siege von Schwarz aus vielen Spielen
+                black_wins = game.random_playouts(node.playerJustMoved, self.playouts) / self.playouts
+            else:
+                winner = game.play_random_fast(node.playerJustMoved)
+                black_wins = 1 if winner == game.players[0] else 0
             
             #Phase 4: Backpropagation. Update alle Vorgängerknoten bis hin zu Wurzel und erhöhe ggf. den Siegeszähler
             while node != None:
                 #Siegeszähler deren Knoten erhöhen die den Sieger als Spieler eingetragen haben
-                result = 1 if winner == node.playerJustMoved else 0
+                result = black_wins if node.playerJustMoved == game.players[0] else 1 - black_wins
                 node.Update(result)
                 node = node.parentNode
                 
@@ -424,14 +625,17 @@ class MCTSValuePlayer(ValuePlayer):
         #self.print_tree(rootnode)
         return best_move
     
+    # Wird vor jeder Expansion aufgerufen, game ist in der Stellung des Knotens
+    def prepare_node(self, node, game):
+        pass
+
     def get_value(self, action, game):
-        old_state = game.get_state()
         # Zug ausführen
-        game.execute_moves(action, self.player)
+        game.make_moves(action, self.player)
         # Spielstatus bewerten
         value = self.value(game, self.player)
-        # Spiel zurücksetzen
-        game.reset_to_state(old_state)
+        # Zug zurücknehmen
+        game.unmake_moves(action)
         return value
     
     def print_tree(self, root):
@@ -445,15 +649,26 @@ class MCTSValuePlayer(ValuePlayer):
         
 class MCTSModelPlayer(MCTSValuePlayer):
     
-    def __init__(self, player, model):
-        MCTSValuePlayer.__init__(self, player, self.get_model_value)
+    def __init__(self, player, model, cache=None, playouts=1):
+        MCTSValuePlayer.__init__(self, player, self.get_model_value, cache, playouts)
         self.model = model
+        self.batch = BatchEvaluator(model, player)
+        
+    def get_action(self, actions, game):
+        action = MCTSValuePlayer.get_action(self, actions, game)
+        self.batch.clear()
+        return action
+    
+    # Beim ersten Expandieren der Wurzel alle Kandidaten mit einem Aufruf des Modells bewerten
+    # Tiefere Knoten haben die Züge aller 21 Würfe, von denen nur wenige expandiert werden
+    def prepare_node(self, node, game):
+        if node.parentNode is None and not node.childNodes:
+            rows, _ = game.unique_afterstates(node.untriedMoves, node.playerJustMoved)
+            self.batch.add(game, rows)
+            self.batch.flush()
         
     def get_model_value(self, game, player):
-        features = game.extractFeatures(player)
-        v = self.model.get_output(features)
-        v = 1 - v if self.player == game.players[0] else v
-        return v
+        return self.batch.value(game, player)
     
     def get_name(self):
         return "MCTSModelPlayer [" + self.model.get_name() +"]"
@@ -1,15 +1,25 @@
 import time
+import random
 from CythonBackgammon import Game 
 	
 # Testfunktion für Player
 
-def test(players, games=100, debug=False):
+# Mit seed sind alle Spiele reproduzierbar: Spiel i würfelt mit der Saat seed + i,
+# zufällige Entscheidungen der Spieler (random-Modul) werden einmal mit seed initialisiert
+# telemetry: optionales Telemetry.Telemetry, misst jede Partie (ohne debug-Ausgaben),
+# für die Zeit der Bewertungen die Modelle der Spieler mit telemetry.model(model) einpacken
+def test(players, games=100, debug=False, seed=None, telemetry=None):
     wins = {Game.PLAYERS[0] : 0, Game.PLAYERS[1] : 0}
+    if seed is not None:
+        random.seed(seed)
     # Zeit messen und Spielen, diesmal ohne loggen
     start = time.time()
     for i in range(games):
-        game = Game()
-        winner = game.play(players, debug=debug)
+        game = Game(seed=None if seed is None else seed + i)
+        if telemetry is not None:
+            winner = telemetry.play(game, players)
+        else:
+            winner = game.play(players, debug=debug)
         wins[winner] += 1
         win_num = 0 if winner == game.players[0] else 1
         print("Spiel", i, "von", games ,"geht an", players[win_num].get_name(), "(" , winner , ")")
@@ -0,0 +1,156 @@
+import json
+import os
+import numpy as np
+from CythonBackgammon import extract_features_batch
+
+# Speicher für Trainingsstellungen auf der Festplatte
+#
+# Ein Verzeichnis mit index.json und Chunks aus je vier .npy-Dateien:
+#   boards_XXXXX.npy   (n,10) uint8, bitgepackte Stellungen (siehe pack_boards)
+#   sides_XXXXX.npy    (n,)   int8, Seite am Zug (0 Schwarz, 1 Weiß)
+#   targets_XXXXX.npy  (n,k)  float32, Zielwerte
+#   games_XXXXX.npy    (n,)   int64, Nummer der Partie
+# Gelesen wird mit np.load(mmap_mode='r'): Ein Minibatch innerhalb eines Chunks ist eine Sicht
+# ohne Kopie, nur die Bretter werden ausgepackt und die 198 Features erst dann berechnet.
+
+INDEX = 'index.json'
+FIELDS = ('boards', 'sides', 'targets', 'games')
+#24 Felder und die Bar je Seite
+SLOTS = 25
+SIDE_BITS = 40
+
+#Packt (N,28) oder (N,26) Stellungszeilen in (N,10) Bytes
+#Je Seite 40 Bit: für jedes der 24 Felder in Zugrichtung und die Bar so viele 1-Bits wie Steine
+#dort stehen, gefolgt von einer 0 (wie die Positions-Keys von GNU Backgammon). Off ergibt sich daraus.
+def pack_boards(rows):
+    rows = np.asarray(rows)
+    n = len(rows)
+    points = rows[:, :24].astype(np.int64)
+    black = np.concatenate([np.maximum(points, 0), rows[:, 24:25]], axis=1)
+    white = np.concatenate([np.maximum(-points, 0)[:, ::-1], rows[:, 25:26]], axis=1)
+    bits = np.zeros((n, 2 * SIDE_BITS), dtype=bool)
+    ones = np.arange(15)
+    for side, counts in enumerate((black, white)):
+        offset = np.full(n, side * SIDE_BITS)
+        for j in range(SLOTS):
+            c = counts[:, j]
+            mask = ones[None, :] < c[:, None]
+            r, k = np.nonzero(mask)
+            bits[r, offset[r] + k] = True
+            offset += c + 1
+    return np.packbits(bits, axis=1)
+
+#Umkehrung von pack_boards, gibt (N,28) int8-Zeilen zurück
+def unpack_boards(packed):
+    bits = np.unpackbits(np.asarray(packed, dtype=np.uint8), axis=1)[:, :2 * SIDE_BITS]
+    n = len(bits)
+    rows = np.zeros((n, 28), dtype=np.int8)
+    for side in range(2):
+        half = bits[:, side * SIDE_BITS:(side + 1) * SIDE_BITS]
+        #Die ersten 25 Nullen trennen die Felder, davor gezählte Einsen ergeben die Steine
+        zeros = np.argsort(half, axis=1, kind='stable')[:, :SLOTS]
+        ones_before = np.take_along_axis(np.cumsum(half, axis=1), zeros, axis=1)
+        counts = np.diff(ones_before, axis=1, prepend=0).astype(np.int8)
+        if side == 0:
+            rows[:, :24] += counts[:, :24]
+        else:
+            rows[:, :24] -= counts[:, 23::-1]
+        rows[:, 24 + side] = counts[:, 24]
+        rows[:, 26 + side] = 15 - counts.sum(axis=1)
+    return rows
+
+#Schreibt Stellungen in Chunks, ein angefangener Speicher wird fortgesetzt
+class PositionStoreWriter:
+
+    def __init__(self, path, chunk_size=1 << 16, target_size=1):
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'target_size': target_size, 'chunks': []}
+        self.target_size = self.index['target_size']
+        self.buffers = {field: [] for field in FIELDS}
+        self.buffered = 0
+
+    #Fügt Stellungen hinzu: rows (N,28) oder (N,26), sides, targets (N,k) und game_id je Stellung oder eine für alle
+    def add(self, rows, sides, targets, game_ids):
+        rows = np.asarray(rows)
+        n = len(rows)
+        self.buffers['boards'].append(pack_boards(rows))
+        self.buffers['sides'].append(np.broadcast_to(np.asarray(sides, dtype=np.int8), (n,)))
+        self.buffers['targets'].append(np.asarray(targets, dtype=np.float32).reshape(n, self.target_size))
+        self.buffers['games'].append(np.broadcast_to(np.asarray(game_ids, dtype=np.int64), (n,)))
+        self.buffered += n
+        while self.buffered >= self.chunk_size:
+            self.write_chunk(self.chunk_size)
+
+    #Fügt alle Stellungen einer Partie aus GameRecord hinzu
+    #targets: (K+1,k) Zielwerte, sonst der Ausgang der Partie (1 = Weiß gewinnt, wie im Training)
+    def add_record(self, record, game_id, targets=None):
+        rows = record.positions()
+        if targets is None:
+            targets = np.full(len(rows), float(record.winner == 1), dtype=np.float32)
+        self.add(rows, record.sides(), targets, game_id)
+
+    #Schreibt die ersten n gepufferten Stellungen als neuen Chunk
+    def write_chunk(self, n):
+        number = len(self.index['chunks'])
+        for field in FIELDS:
+            data = np.concatenate(self.buffers[field])
+            np.save(os.path.join(self.path, '%s_%05d.npy' % (field, number)), data[:n])
+            self.buffers[field] = [data[n:]] if len(data) > n else []
+        self.index['chunks'].append(n)
+        self.buffered -= n
+        with open(os.path.join(self.path, INDEX), 'w') as f:
+            json.dump(self.index, f)
+
+    def close(self):
+        if self.buffered:
+            self.write_chunk(self.buffered)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#Liest einen mit PositionStoreWriter geschriebenen Speicher
+class PositionStore:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX)) as f:
+            self.index = json.load(f)
+        self.target_size = self.index['target_size']
+        self.chunks = [{field: np.load(os.path.join(path, '%s_%05d.npy' % (field, number)), mmap_mode='r')
+                        for field in FIELDS} for number in range(len(self.index['chunks']))]
+
+    def __len__(self):
+        return sum(self.index['chunks'])
+
+    #Stellungen start..stop-1 als (n,28) Zeilen (nur innerhalb eines Chunks)
+    def boards(self, number, start, stop):
+        return unpack_boards(self.chunks[number]['boards'][start:stop])
+
+    #Features (n,198) der Stellungen start..stop-1 im Chunk, erst hier berechnet
+    def features(self, number, start, stop):
+        rows = self.boards(number, start, stop)
+        return extract_features_batch(rows[:, :24], rows[:, 24:26], rows[:, 26:28], self.chunks[number]['sides'][start:stop])
+
+    #Minibatches (features, targets, game_ids), targets und game_ids sind Sichten auf die Datei
+    #shuffle mischt die Reihenfolge der Batches, nicht die Stellungen innerhalb eines Batches
+    def batches(self, batch_size, shuffle=False, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        slices = [(number, start, min(start + batch_size, len(chunk['sides'])))
+                  for number, chunk in enumerate(self.chunks)
+                  for start in range(0, len(chunk['sides']), batch_size)]
+        if shuffle:
+            rng.shuffle(slices)
+        for number, start, stop in slices:
+            chunk = self.chunks[number]
+            yield self.features(number, start, stop), chunk['targets'][start:stop], chunk['games'][start:stop]
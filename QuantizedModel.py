@@ -0,0 +1,124 @@
+import time
+import numpy as np
+from CythonBackgammon import Game, quantized_forward
+from NumpyModel import NumpyModel
+from Player import Player
+
+# Quantisiertes Modell nur für die Vorwärtsrechnung
+#
+# Gewichte als int8 mit einer Skala je Ausgabe-Neuron, Summen in int32 (quantized_forward), nur
+# Bias, sigmoid und Skalen in float32. Die Eingaben werden je Feature mit einer Skala aus der
+# Kalibrierung auf int8 gebracht, die Skala steckt dabei schon in den Gewichten. Die Aktivierungen
+# der Hidden-Schicht liegen in [0,1] und werden mit 127 skaliert.
+# Die float32-Variante ist NumpyModel. accuracy_report vergleicht ein Modell mit dem Ausgangsmodell.
+#
+#   quantized = quantize(NumpyModel.from_checkpoint(name='TD-Gammon80'), games=20, seed=0)
+#   accuracy_report(reference, quantized, games=20, seed=1000)
+
+QMAX = 127
+
+class QuantizedModel:
+
+    #model: NumpyModel oder Liste von (kernel, bias), features: (N,D) Stellungen zur Kalibrierung
+    def __init__(self, model, features, name=None):
+        if isinstance(model, NumpyModel):
+            layers = model.layers
+            name = name or model.get_name() + " int8"
+        else:
+            layers = model
+        self.name = name or "QuantizedModel"
+        self.calibrate(layers, features)
+
+    #Bestimmt die Eingabeskalen aus dem größten Betrag je Feature und quantisiert die Gewichte
+    def calibrate(self, layers, features):
+        in_max = np.abs(np.asarray(features, dtype=np.float32)).max(axis=0)
+        #Nie gesehene Features bekommen die Skala der 0/1-Features
+        in_max[in_max == 0] = 1.
+        #Eingabe x ≈ qx * scale
+        scale = in_max / QMAX
+        self.in_inverse = (1. / scale).astype(np.float32)
+        self.layers = []
+        for w, b in layers:
+            w = np.asarray(w, dtype=np.float32) * scale[:, None]
+            w_max = np.abs(w).max(axis=0)
+            w_max[w_max == 0] = 1.
+            w_scale = w_max / QMAX
+            qw = np.rint(w / w_scale).astype(np.int8)
+            self.layers.append((qw, w_scale.astype(np.float32), np.asarray(b, dtype=np.float32)))
+            scale = np.full(w.shape[1], 1. / QMAX, dtype=np.float32)
+
+    #Outputs für (N,D) Features, Ergebnis (N,1) float32
+    def get_outputs(self, X):
+        return quantized_forward(X, self.in_inverse, self.layers)
+
+    def get_output(self, x):
+        return self.get_outputs(x)
+
+    def get_name(self):
+        return self.name
+
+#Index des besten Kandidaten für player, wie beim ModelPlayer der erste beste
+def best_index(values, player):
+    return int(np.argmax(values if player == Game.PLAYERS[1] else -values))
+
+#Zieht wie ModelPlayer und merkt sich die Features aller Kandidaten jeder Entscheidung
+class SamplingPlayer(Player):
+
+    def __init__(self, player, model, decisions):
+        Player.__init__(self, player)
+        self.model = model
+        self.decisions = decisions
+
+    def get_action(self, actions, game):
+        _, features, moves = game.afterstate_features(actions, self.player)
+        self.decisions.append((features, self.player))
+        return moves[best_index(self.model.get_outputs(features)[:, 0], self.player)]
+
+    def get_name(self):
+        return "SamplingPlayer [" + self.model.get_name() + "]"
+
+#Entscheidungen (Features der Kandidaten, Spieler) aus games Partien des Modells gegen sich selbst
+def sample_decisions(model, games=20, seed=0):
+    decisions = []
+    players = [SamplingPlayer(p, model, decisions) for p in Game.PLAYERS]
+    for i in range(games):
+        Game(seed=seed + i).play(players)
+    return decisions
+
+#Kalibriert ein QuantizedModel auf den Stellungen aus games Partien des Modells gegen sich selbst
+def quantize(model, games=20, seed=0):
+    decisions = sample_decisions(model, games, seed)
+    return QuantizedModel(model, np.concatenate([features for features, _ in decisions]))
+
+#Vergleicht candidate mit reference auf den Kandidaten jeder Entscheidung
+#Abweichung der Werte (maximal, mittel), Anteil gleich gewählter Züge und Stellungen je Sekunde.
+#Ohne decisions werden games Partien von reference gespielt, dafür eine andere Saat als bei der
+#Kalibrierung nehmen
+def accuracy_report(reference, candidate, decisions=None, games=20, seed=1000):
+    if decisions is None:
+        decisions = sample_decisions(reference, games, seed)
+    deviations = []
+    agree = 0
+    times = [0., 0.]
+    for features, player in decisions:
+        values = []
+        for k, model in enumerate((reference, candidate)):
+            start = time.time()
+            values.append(model.get_outputs(features)[:, 0])
+            times[k] += time.time() - start
+        deviations.append(np.abs(values[0] - values[1]))
+        agree += best_index(values[0], player) == best_index(values[1], player)
+    deviations = np.concatenate(deviations)
+    report = {'decisions': len(decisions),
+              'positions': len(deviations),
+              'max_deviation': float(deviations.max()),
+              'mean_deviation': float(deviations.mean()),
+              'agreement': agree / len(decisions),
+              'reference_per_second': len(deviations) / max(times[0], 1e-9),
+              'candidate_per_second': len(deviations) / max(times[1], 1e-9)}
+    # Hübsch ausgeben
+    print(candidate.get_name(), 'vs.', reference.get_name(), ':', report['decisions'], 'Entscheidungen,', report['positions'], 'Stellungen')
+    print('Abweichung max', report['max_deviation'], 'mittel', report['mean_deviation'])
+    print('Gleicher Zug:', report['agreement'] * 100, '%')
+    print('Stellungen/s:', report['reference_per_second'], '->', report['candidate_per_second'])
+    return report
@@ -1,8 +1,9 @@
 #Original Source: https://github.com/awni/backgammon
 
-import random
+import copy
 import time
 import numpy as np
+from CythonBackgammon import DiceRNG
 
 class Game:
 
@@ -13,18 +14,22 @@ class Game:
     ON = 'on'
     TOKENS = ['x', 'o']
 
-    def __init__(self, layout=LAYOUT, grid=None, off_pieces=None, bar_pieces=None, num_pieces=None, players=None):
+    def __init__(self, layout=LAYOUT, grid=None, off_pieces=None, bar_pieces=None, num_pieces=None, players=None, seed=None):
         """
-        Define a new game object
+        Define a new game object, seed seeds the dice (None = random)
         """
         self.die = Game.QUAD
         self.layout = layout
+        self.rng = DiceRNG(seed)
+        # Feature buffer, patched on every take_action/undo_action
+        self.features = np.zeros(198, dtype=np.float32)
         if grid:
             self.grid = copy.deepcopy(grid)
             self.off_pieces = copy.deepcopy(off_pieces)
             self.bar_pieces = copy.deepcopy(bar_pieces)
             self.num_pieces = copy.deepcopy(num_pieces)
             self.players = players
+            self.refresh_features()
             return
         self.players = Game.TOKENS
         self.grid = [[] for _ in range(Game.NUMCOLS)]
@@ -35,6 +40,7 @@ class Game:
             self.bar_pieces[t] = []
             self.off_pieces[t] = []
             self.num_pieces[t] = 0
+        self.refresh_features()
 
     @staticmethod
     def new():
@@ -44,41 +50,57 @@ class Game:
 
     # Methode die exakt die 198 Features liefert die in TD-Gammon 0.0 benutzt wurden
     # Nach "Reinforcement Learning: An Introduction", Sutton & Barto, 2017
+    # Gibt eine Sicht auf den internen Puffer zurück, zum Aufbewahren kopieren!
     def extractFeatures(self, player):
-        features = []
-        # 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
-        for p in self.players:
-            # 24 mögliche Brettpositionen
-            for col in self.grid:
-                # 4 Features kodieren eine Stelle auf dem Spielbrett
-                feats = [0.] * 4
-                if len(col) > 0 and col[0] == p:
-                    # 0,1,2,3,4,5 Steine werden kodiert als
-                    # 0000, 1000, 1100, 1110, 1110.5, 1111
-                    # (4. Bit = (n-3)/2)
-                    for i in range(len(col)):
-                        if i < 3:
-                            feats[i] += 1
-                        else:
-                            feats[3] = (len(col)-3)/2.0
-                            break
-                features += feats
-            # Anzahl der Steine auf der "Bar", n/2
-            features.append(float(len(self.bar_pieces[p])) / 2.)
-            # Anzahl der Steine die bereits aus dem Spiel sind, n/15
-            features.append(float(len(self.off_pieces[p])) / 15.)
         # Zwei Features für den derzeitigen Spieler
         if player == self.players[0]:
-            features += [1., 0.]
+            self.features[196:] = [1., 0.]
         else:
-            features += [0., 1.]
-        return np.array(features).reshape(1, -1)
+            self.features[196:] = [0., 1.]
+        return self.features.reshape(1, -1)
+
+    def refresh_features(self):
+        """
+        Rebuild the whole feature buffer from the grid
+        """
+        for c in range(len(self.grid)):
+            self.encode_column(c)
+        self.encode_bar_off()
+
+    def encode_column(self, c):
+        """
+        Re-encode the 4 features of column c for both players
+        """
+        col = self.grid[c]
+        # 196 Features kodieren den Zustand der Spielfelder, 98 für jeden Spieler
+        for k, p in enumerate(self.players):
+            n = len(col) if len(col) > 0 and col[0] == p else 0
+            # 0,1,2,3,4,5 Steine werden kodiert als
+            # 0000, 1000, 1100, 1110, 1110.5, 1111
+            # (4. Bit = (n-3)/2)
+            i = k * 98 + 4 * c
+            self.features[i] = n >= 1
+            self.features[i + 1] = n >= 2
+            self.features[i + 2] = n >= 3
+            self.features[i + 3] = (n - 3) / 2.0 if n > 3 else 0.
+
+    def encode_bar_off(self):
+        """
+        Re-encode the bar and off features of both players
+        """
+        for k, p in enumerate(self.players):
+            # Anzahl der Steine auf der "Bar", n/2
+            self.features[k * 98 + 96] = len(self.bar_pieces[p]) / 2.
+            # Anzahl der Steine die bereits aus dem Spiel sind, n/15
+            self.features[k * 98 + 97] = len(self.off_pieces[p]) / 15.
 
     def roll_dice(self):
-        return (random.randint(1, self.die), random.randint(1, self.die))
+        return self.rng.roll()
 
-    def play(self, players, draw=False):
-        player_num = random.randint(0, 1)
+    def play(self, players, draw=False, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+        player_num = self.rng.below(2)
         while not self.is_over():
             self.next_step(players[player_num], player_num, draw=draw)
             player_num = (player_num + 1) % 2
@@ -97,7 +119,8 @@ class Game:
             print("Player %s rolled <%d, %d>." % (player.player, roll[0], roll[1]))
             time.sleep(1)
 
-        moves = self.get_actions(roll, player.player, nodups=True)
+        # one move per distinct position is enough to choose from
+        _, moves = self.get_afterstates(roll, player.player)
         move = player.get_action(moves, self) if moves else None
 
         if move:
@@ -108,8 +131,11 @@ class Game:
         Return an exact copy of the game. Changes can be made
         to the cloned version without affecting the original.
         """
-        return Game(None, self.grid, self.off_pieces,
+        game = Game(None, self.grid, self.off_pieces,
                     self.bar_pieces, self.num_pieces, self.players)
+        # The copy keeps rolling from the same dice stream
+        game.rng = self.rng
+        return game
 
     def take_action(self, action, token):
         """
@@ -122,6 +148,7 @@ class Game:
                 piece = self.bar_pieces[token].pop()
             else:
                 piece = self.grid[s].pop()
+                self.encode_column(s)
             if e == Game.OFF:
                 self.off_pieces[token].append(piece)
                 continue
@@ -130,6 +157,8 @@ class Game:
                 self.bar_pieces[bar_piece].append(bar_piece)
                 ateList[i] = 1
             self.grid[e].append(piece)
+            self.encode_column(e)
+        self.encode_bar_off()
         return ateList
 
     def undo_action(self, action, player, ateList):
@@ -149,83 +178,69 @@ class Game:
                 self.bar_pieces[player].append(piece)
             else:
                 self.grid[s].append(piece)
+                self.encode_column(s)
+            if e != Game.OFF:
+                self.encode_column(e)
+        self.encode_bar_off()
 
 
     def get_actions(self, roll, player, nodups=False):
         """
         Get set of all possible move tuples
         """
+        search = MoveSearch(self, player)
         moves = set()
-        if nodups:
-            start = 0
-        else:
-            start = None
+        for group in self.dice_sequences(roll):
+            for rs in group:
+                moves |= search.suffixes(rs)
+            if moves:
+                break
+        return moves
 
+    def get_afterstates(self, roll, player):
+        """
+        Get one move per distinct resulting position. Returns (states, moves),
+        states are (columns, bar, off) count mirrors from the view of player
+        (see board_counts), moves the move tuple that leads to each of them
+        """
+        search = MoveSearch(self, player)
+        found = {}
+        for group in self.dice_sequences(roll):
+            for rs in group:
+                search.afterstates(rs, found)
+            if found:
+                break
+        return list(found.keys()), list(found.values())
+
+    def dice_sequences(self, roll):
+        """
+        Dice orders to try for a roll, grouped by priority: the moves of
+        the first group that has any are the legal ones
+        """
         r1, r2 = roll
         if r1 == r2: # doubles
-            i = 4
             # keep trying until we find some moves
-            while not moves and i > 0:
-                self.find_moves(tuple([r1]*i), player, (), moves, start)
-                i -= 1
-        else:
-            self.find_moves(roll, player, (), moves, start)
-            self.find_moves((r2, r1), player, (), moves, start)
-            # has no moves, try moving only one piece
-            if not moves:
-                for r in roll:
-                    self.find_moves((r, ), player, (), moves, start)
-
-        return moves
+            return [[tuple([r1]*i)] for i in range(4, 0, -1)]
+        # has no moves, try moving only one piece
+        return [[(r1, r2), (r2, r1)], [(r1, ), (r2, )]]
 
     def find_moves(self, rs, player, move, moves, start=None):
-        if len(rs)==0:
-            moves.add(move)
-            return
-        r, rs = rs[0], rs[1:]
-        # see if we can remove a piece from the bar
-        if self.bar_pieces[player]:
-            if self.can_onboard(player, r):
-                piece = self.bar_pieces[player].pop()
-                bar_piece = None
-                if len(self.grid[r - 1]) == 1 and self.grid[r - 1][-1]!=player:
-                    bar_piece = self.grid[r - 1].pop()
-
-                self.grid[r - 1].append(piece)
-
-                self.find_moves(rs, player, move+((Game.ON, r - 1), ), moves, start)
-                self.grid[r - 1].pop()
-                self.bar_pieces[player].append(piece)
-                if bar_piece:
-                    self.grid[r - 1].append(bar_piece)
-            return
+        """
+        Add every move that plays all dice in rs, prefixed by move, to moves
+        """
+        for rest in MoveSearch(self, player).suffixes(tuple(rs)):
+            moves.add(move + rest)
 
-        # otherwise check each grid location for valid move using r
-        offboarding = self.can_offboard(player)
-
-        for i in range(len(self.grid)):
-            if start is not None:
-                start = i
-            if self.is_valid_move(i, i + r, player):
-
-                piece = self.grid[i].pop()
-                bar_piece = None
-                if len(self.grid[i+r]) == 1 and self.grid[i+r][-1] != player:
-                    bar_piece = self.grid[i + r].pop()
-                self.grid[i + r].append(piece)
-                self.find_moves(rs, player, move + ((i, i + r), ), moves, start)
-                self.grid[i + r].pop()
-                self.grid[i].append(piece)
-                if bar_piece:
-                    self.grid[i + r].append(bar_piece)
-
-            # If we can't move on the board can we take the piece off?
-            if offboarding and self.remove_piece(player, i, r):
-                piece = self.grid[i].pop()
-                self.off_pieces[player].append(piece)
-                self.find_moves(rs, player, move + ((i, Game.OFF), ), moves, start)
-                self.off_pieces[player].pop()
-                self.grid[i].append(piece)
+    def board_counts(self, player):
+        """
+        Count-array mirror of the grid from the view of player: one int per
+        column (+n own pieces, -n opponent pieces), own bar and off counts
+        """
+        cols = [0] * Game.NUMCOLS
+        for i, col in enumerate(self.grid):
+            if col:
+                cols[i] = len(col) if col[0] == player else -len(col)
+        return cols, len(self.bar_pieces[player]), len(self.off_pieces[player])
 
     def opponent(self, token):
         """
@@ -254,6 +269,7 @@ class Game:
         """
         self.grid.reverse()
         self.players.reverse()
+        self.refresh_features()
 
     def reset(self):
         """
@@ -265,6 +281,7 @@ class Game:
         for col in self.grid:
             for piece in col:
                 self.num_pieces[piece] += 1
+        self.refresh_features()
 
     def winner(self):
         """
@@ -363,3 +380,134 @@ class Game:
             for piece in self.bar_pieces[t]:
                 print(t+'', end = '')
             print()
+
+class MoveSearch:
+
+    def __init__(self, game, player):
+        """
+        Move search for player on a count-array mirror of the game (see
+        Game.board_counts). The grid itself is never touched. Partial positions
+        are memoized with the dice still to play, so every distinct intermediate
+        position is expanded only once, however many die orders reach it
+        """
+        self.cols, self.bar, self.off = game.board_counts(player)
+        self.num = game.num_pieces[player]
+        self.die = game.die
+        # remove_piece looks for higher pieces of players[0], whoever moves
+        self.first = 1 if player == game.players[0] else -1
+        self.memo = {}
+        self.visited = set()
+
+    def key(self, rs):
+        return (tuple(self.cols), self.bar, self.off, rs)
+
+    def suffixes(self, rs):
+        """
+        Set of submove tuples that play all dice in rs from the current position
+        """
+        if not rs:
+            return {()}
+        # last die, nothing to expand
+        if len(rs) == 1:
+            return {(step, ) for step in self.steps(rs[0])}
+        key = self.key(rs)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+        result = set()
+        for step in self.steps(rs[0]):
+            hit = self.apply(step)
+            for rest in self.suffixes(rs[1:]):
+                result.add((step, ) + rest)
+            self.undo(step, hit)
+        self.memo[key] = result
+        return result
+
+    def afterstates(self, rs, found, move=()):
+        """
+        Map every final position reachable by playing all dice in rs to the
+        first move found that reaches it, each partial position is visited once
+        """
+        if not rs:
+            state = (tuple(self.cols), self.bar, self.off)
+            if state not in found:
+                found[state] = move
+            return
+        key = self.key(rs)
+        if key in self.visited:
+            return
+        self.visited.add(key)
+        for step in self.steps(rs[0]):
+            hit = self.apply(step)
+            self.afterstates(rs[1:], found, move + (step, ))
+            self.undo(step, hit)
+
+    def steps(self, r):
+        """
+        All single submoves with die r, same rules as Game.find_moves
+        """
+        cols = self.cols
+        # pieces on the bar have to come in first
+        if self.bar:
+            return [(Game.ON, r - 1)] if cols[r - 1] >= -1 else []
+        steps = []
+        offboarding = self.can_offboard()
+        for i in range(Game.NUMCOLS):
+            if cols[i] > 0:
+                if i + r < Game.NUMCOLS and cols[i + r] >= -1:
+                    steps.append((i, i + r))
+                if offboarding and self.remove_piece(i, r):
+                    steps.append((i, Game.OFF))
+        return steps
+
+    def apply(self, step):
+        """
+        Play a submove on the mirror, returns whether a blot was hit
+        """
+        s, e = step
+        if s == Game.ON:
+            self.bar -= 1
+        else:
+            self.cols[s] -= 1
+        if e == Game.OFF:
+            self.off += 1
+            return False
+        # like find_moves the hit piece just leaves the board
+        hit = self.cols[e] == -1
+        if hit:
+            self.cols[e] = 0
+        self.cols[e] += 1
+        return hit
+
+    def undo(self, step, hit):
+        s, e = step
+        if e == Game.OFF:
+            self.off -= 1
+        else:
+            self.cols[e] -= 1
+            if hit:
+                self.cols[e] = -1
+        if s == Game.ON:
+            self.bar += 1
+        else:
+            self.cols[s] += 1
+
+    def can_offboard(self):
+        home = self.cols[Game.NUMCOLS - self.die:]
+        return sum(n for n in home if n > 0) + self.off == self.num
+
+    def remove_piece(self, start, r):
+        """
+        Same checks as Game.remove_piece on the mirror
+        """
+        if start < Game.NUMCOLS - self.die or self.cols[start] <= 0:
+            return False
+        if start + r == Game.NUMCOLS:
+            return True
+        if start + r > Game.NUMCOLS:
+            for i in range(start - 1, Game.NUMCOLS - self.die - 1, -1):
+                if self.cols[i] * self.first > 0:
+                    return False
+            return True
+        return False
+
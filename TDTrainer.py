@@ -0,0 +1,228 @@
+import os
+import random
+import numpy as np
+from Player import RandomPlayer, ModelPlayer
+from CythonBackgammon import Game
+from NumpyModel import read_checkpoint, latest_checkpoint, dense_layers, write_checkpoint, update_checkpoint_state, save_npz
+from Telemetry import NullTelemetry
+
+# TD(lambda)-Training ohne TensorFlow
+#
+# Gewichte und Eligibility Traces liegen als float32 NumPy-Arrays vor, Vorwärtsrechnung, Gradient,
+# Abklingen der Traces und Gewichtsupdate passieren in einem Schritt je Halbzug (step).
+# Dieselbe Rechnung wie TDGammonModel.create_training_op:
+#   e = lambda * e + dV/dw,  w += alpha * (V_next - V) * e
+# Wie dort werden die Traces nie zurückgesetzt, auch nicht zwischen den Partien.
+# Die Checkpoints haben dasselbe Format und dieselben Variablennamen wie die von TDGammonModel
+# (dense/kernel, ..., trace, trace_1, ..., global_step), beide können also beim jeweils anderen
+# weitertrainiert werden. Über get_output/get_outputs/get_name spielt der Trainer selbst als Modell.
+
+class TDTrainer:
+
+    def __init__(self, input_size=198, hidden_size=40, output_size=1, name='TD-Gammon', lamda=0.7, alpha=0.1, restore=False, seed=None):
+        self.name = name
+        #Speicherort wie bei NeuralNetModel
+        self.checkpoint_path = os.environ.get('CHECKPOINT_PATH', 'checkpoints/' + name + '/')
+        self.lamda = np.float32(lamda)
+        self.alpha = np.float32(alpha)
+        self.output_size = output_size
+        self.global_step = 0
+        #Zuletzt geschriebener Checkpoint, wird beim nächsten Speichern gelöscht (wie Saver(max_to_keep=1))
+        self.last_checkpoint = None
+        #Initialisierung wie tf.layers.dense: Glorot-uniform für die Gewichte, Bias 0
+        rng = np.random.default_rng(seed)
+        self.variables = []
+        for fan_in, fan_out in ((input_size, hidden_size), (hidden_size, output_size)):
+            limit = np.sqrt(6. / (fan_in + fan_out))
+            self.variables.append(rng.uniform(-limit, limit, (fan_in, fan_out)).astype(np.float32))
+            self.variables.append(np.zeros(fan_out, dtype=np.float32))
+        #Eine Trace je Variable, in derselben Reihenfolge (kernel, bias, kernel, bias)
+        self.traces = self.new_traces()
+        if restore:
+            self.restore()
+
+    #Traces mit 0, passend zu den Variablen
+    def new_traces(self):
+        return [np.zeros_like(v) for v in self.variables]
+
+    #(kernel, bias) je Schicht, z.B. für NumpyModel, QuantizedModel oder Accumulator
+    @property
+    def layers(self):
+        return [(self.variables[0], self.variables[1]), (self.variables[2], self.variables[3])]
+
+    def get_name(self):
+        return self.name
+
+    """
+        Checkpoints im Format von TDGammonModel
+    """
+
+    #Lädt den neusten Checkpoint, Traces und global_step nur falls vorhanden (z.B. nicht bei TFGammonModel)
+    def restore(self):
+        prefix = latest_checkpoint(self.checkpoint_path)
+        if not prefix:
+            return
+        print("Restoring checkpoint: {0}".format(prefix))
+        tensors = read_checkpoint(prefix)
+        for i, (kernel, bias) in enumerate(dense_layers(tensors)):
+            self.variables[2*i][...] = kernel
+            self.variables[2*i + 1][...] = bias
+        for i, trace in enumerate(self.traces):
+            name = 'trace' if i == 0 else 'trace_' + str(i)
+            if name in tensors:
+                trace[...] = tensors[name]
+        if 'global_step' in tensors:
+            self.global_step = int(tensors['global_step'])
+
+    #Variablen, Traces und global_step als {Name: Array} mit den Namen von TDGammonModel
+    def checkpoint_tensors(self):
+        tensors = {'dense/kernel': self.variables[0], 'dense/bias': self.variables[1],
+                   'dense_1/kernel': self.variables[2], 'dense_1/bias': self.variables[3],
+                   'global_step': np.array(self.global_step, dtype=np.int64)}
+        for i, trace in enumerate(self.traces):
+            tensors['trace' if i == 0 else 'trace_' + str(i)] = trace
+        return tensors
+
+    #Speichert als checkpoint.ckpt-<global_step>, der vorherige Checkpoint wird gelöscht
+    def save(self):
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+        prefix = self.checkpoint_path + 'checkpoint.ckpt-' + str(self.global_step)
+        write_checkpoint(prefix, self.checkpoint_tensors())
+        update_checkpoint_state(self.checkpoint_path, prefix)
+        if self.last_checkpoint and self.last_checkpoint != prefix:
+            for suffix in ('.index', '.data-00000-of-00001'):
+                if os.path.exists(self.last_checkpoint + suffix):
+                    os.remove(self.last_checkpoint + suffix)
+        self.last_checkpoint = prefix
+
+    def export_npz(self, path):
+        save_npz(path, self.layers, self.name, self.global_step)
+
+    """
+        Vorwärtsrechnung und Training
+    """
+
+    #Outputs für (N,198) Features, Ergebnis (N,output_size) float32
+    def get_outputs(self, X):
+        w1, b1, w2, b2 = self.variables
+        h = np.asarray(X, dtype=np.float32) @ w1
+        h += b1
+        h = 1. / (1. + np.exp(-h))
+        v = h @ w2
+        v += b2
+        return 1. / (1. + np.exp(-v))
+
+    def get_output(self, x):
+        return self.get_outputs(x)
+
+    #Ein TD(lambda)-Schritt für die Features x (1,198) mit dem Zielwert v_next (1,output_size)
+    #traces: eigene Traces (wie new_traces()) statt self.traces, z.B. eine je Partie
+    #Gibt delta = sum(V_next - V) zurück
+    def step(self, x, v_next, traces=None):
+        if traces is None:
+            traces = self.traces
+        w1, b1, w2, b2 = self.variables
+        e_w1, e_b1, e_w2, e_b2 = traces
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        #Vorwärts
+        h = x @ w1
+        h += b1
+        h = 1. / (1. + np.exp(-h))
+        v = h @ w2
+        v += b2
+        v = 1. / (1. + np.exp(-v))
+        delta = np.float32(np.sum(np.asarray(v_next, dtype=np.float32) - v))
+        #Gradient von sum(V) nach den Pre-Aktivierungen beider Schichten
+        g2 = v * (1. - v)
+        g1 = (w2 @ g2) * h * (1. - h)
+        #Traces abklingen lassen und Gradient addieren, bei W1 nur die Zeilen der Features != 0
+        for e in traces:
+            e *= self.lamda
+        nonzero = np.flatnonzero(x)
+        e_w1[nonzero] += x[nonzero, None] * g1
+        e_b1 += g1
+        e_w2 += np.outer(h, g2)
+        e_b2 += g2
+        #Gewichte in Richtung der Traces verschieben
+        scale = self.alpha * delta
+        for w, e in zip(self.variables, traces):
+            w += scale * e
+        self.global_step += 1
+        return delta
+
+    #Testet das Modell gegen den angegebenen enemyPlayer (wie NeuralNetModel.test)
+    def test(self, enemyPlayer=RandomPlayer('white'), games=100, debug=False, recorder=None):
+        players = [ModelPlayer('black', self), enemyPlayer]
+
+        winners = {'black':0, 'white':0}
+        for i in range(games):
+            game = Game(recorder=recorder)
+
+            winner = game.play(players, debug=debug)
+            winners[winner] += 1
+
+            winners_total = sum(winners.values())
+            print("[Game %d] %s (%s) vs %s (%s) %d:%d of %d games (%.2f%%)" % (i, \
+                players[0].get_name(), players[0].player, \
+                players[1].get_name(), players[1].player, \
+                winners['black'], winners['white'], winners_total, \
+                (winners['black'] / winners_total) * 100.0))
+
+    #Selbsttraining wie NeuralNetModel.train, mit einem step je Halbzug statt zwei sess.run
+    #checkpointer: optionaler Checkpointing.AsyncCheckpointer, speichert und testet dann im Hintergrund
+    #telemetry: optionales Telemetry.Telemetry, misst die Abschnitte jeder Partie
+    def train(self, games, validation_interval, test_games=100, recorder=None, checkpointer=None, telemetry=None):
+        if telemetry is None:
+            telemetry = NullTelemetry()
+        model = telemetry.model(self)
+        players = [ModelPlayer('black', model), ModelPlayer('white', model)]
+
+        for i in range(games):
+            #Immer wieder zwischendurch testen und den Fortschritt speichern
+            if i != 0 and i % validation_interval == 0:
+                self.checkpoint(test_games, checkpointer)
+
+            game = Game(recorder=recorder)
+            player_num = random.randint(0, 1)
+            telemetry.begin_game()
+
+            #Features kopieren, der Puffer im Spiel ändert sich mit jedem Zug
+            x = game.extractFeatures(players[player_num].player).copy()
+
+            game_step = 0
+            while not game.get_winner():
+                telemetry.next_step(game, players[player_num], player_num)
+                player_num = (player_num + 1) % 2
+
+                #Zielwert ist die Bewertung der nächsten Stellung (mit den Gewichten vor dem Update)
+                with telemetry.phase('features'):
+                    x_next = game.extractFeatures(players[player_num].player)
+                v_next = model.get_output(x_next)
+                with telemetry.phase('update'):
+                    self.step(x, v_next)
+
+                x = x_next.copy()
+                game_step += 1
+
+            #Belohnung: 1 wenn Weiß gewonnen hat, sonst 0
+            winner = 0 if game.get_winner() == game.players[0] else 1
+            with telemetry.phase('update'):
+                self.step(x, np.array([[winner]], dtype=np.float32))
+            telemetry.end_game(winner=players[winner].player)
+
+            print("Game %d/%d (Winner: %s) in %d turns" % (i, games, players[winner].player, game_step))
+        #Am Ende noch mal speichern und testen
+        self.checkpoint(test_games, checkpointer, final=True)
+
+    #Speichern und testen, mit checkpointer im Hintergrund
+    #final: am Ende des Trainings wartet der checkpointer, bis der Checkpoint geschrieben ist
+    def checkpoint(self, test_games=100, checkpointer=None, final=False):
+        if checkpointer is not None:
+            checkpointer.checkpoint(self, test_games)
+            if final:
+                checkpointer.flush()
+            return
+        self.save()
+        if not final:
+            print("Progress saved!")
+        self.test(games = test_games)
@@ -0,0 +1,317 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# Zeitmessung für Training und Spiele
+#
+# Telemetry misst je Partie, wie viel Zeit in welchen Abschnitten steckt, und schreibt je Partie
+# und alle summary_interval Partien eine Zeile in eine JSONL-Datei, die bei max_bytes rotiert wird.
+# Mit port gibt es zusätzlich /metrics im Textformat von Prometheus auf localhost.
+#
+# Abschnitte (gemessen wird jeweils die Zeit ohne die darin geschachtelten Abschnitte):
+#   movegen    Würfeln und Zuggenerator
+#   features   Entscheidung des Spielers ohne Bewertung, also Kodierung der Kandidaten und Auswahl,
+#              beim Training auch die Features der nächsten Stellung
+#   inference  Aufrufe des Modells (nur über telemetry.model(model) bzw. in den train-Methoden)
+#   execute    Ausführen des gewählten Zugs
+#   update     Gewichtsupdates
+#
+#   telemetry = Telemetry('telemetry.jsonl', port=9100)
+#   model.train(games=1000, validation_interval=100, telemetry=telemetry)
+#   PlayerTest.test([ModelPlayer('black', telemetry.model(model)), RandomPlayer('white')], telemetry=telemetry)
+
+PHASES = ('movegen', 'features', 'inference', 'execute', 'update')
+#Obergrenzen der Klassen im Histogramm der Kandidaten je Entscheidung, darüber +Inf
+CANDIDATE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+#Zähler einer Partie oder aller Partien
+def empty_counts():
+    return {'games': 0, 'plies': 0, 'decisions': 0, 'positions': 0, 'seconds': 0.,
+            'phases': dict.fromkeys(PHASES, 0.), 'candidates': [0] * (len(CANDIDATE_BUCKETS) + 1),
+            'candidates_sum': 0}
+
+def bucket_labels():
+    return [str(b) for b in CANDIDATE_BUCKETS] + ['+Inf']
+
+class Telemetry:
+
+    #path: JSONL-Datei (None = nicht schreiben), rotiert bei max_bytes mit backups alten Dateien
+    #port: Port für /metrics auf localhost (None = kein Server)
+    def __init__(self, path=None, max_bytes=10 * 2**20, backups=5, summary_interval=100, port=None):
+        self.summary_interval = summary_interval
+        self.handler = None
+        if path is not None:
+            self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            self.handler.setFormatter(logging.Formatter('%(message)s'))
+        #Die Summen liest auch der HTTP-Thread
+        self.lock = threading.Lock()
+        self.totals = empty_counts()
+        self.started = time.time()
+        #Offene Abschnitte als [Name, Startzeit]
+        self.stack = []
+        self.server = None
+        if port is not None:
+            self.serve(port)
+        self.begin_game()
+
+    """
+        Messen
+    """
+
+    #Misst die Zeit im Abschnitt name, ohne geschachtelte Abschnitte
+    @contextlib.contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        stack = self.stack
+        phases = self.current['phases']
+        if stack:
+            outer = stack[-1]
+            phases[outer[0]] += now - outer[1]
+        entry = [name, now]
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            phases[name] += now - entry[1]
+            stack.pop()
+            if stack:
+                stack[-1][1] = now
+
+    #Eine Entscheidung mit n Kandidaten
+    def candidates(self, n):
+        current = self.current
+        current['decisions'] += 1
+        current['candidates_sum'] += n
+        for i, bound in enumerate(CANDIDATE_BUCKETS):
+            if n <= bound:
+                current['candidates'][i] += 1
+                return
+        current['candidates'][-1] += 1
+
+    #n vom Modell bewertete Stellungen
+    def positions(self, n):
+        self.current['positions'] += n
+
+    #Modell, dessen Aufrufe als inference gezählt werden
+    def model(self, model):
+        return TimedModel(model, self)
+
+    #Wie Game.next_step, mit Messung der Abschnitte
+    def next_step(self, game, player, player_num):
+        with self.phase('movegen'):
+            game.turns += 1
+            roll = game.rng.roll()
+            moves = game.get_moves(roll, game.players[player_num])
+        move = None
+        if moves:
+            self.candidates(len(moves))
+            with self.phase('features'):
+                move = player.get_action(moves, game)
+        if game.recorder is not None:
+            game.recorder.record(game, roll, move, player_num)
+        if move:
+            with self.phase('execute'):
+                game.execute_moves(move, game.players[player_num])
+        self.current['plies'] += 1
+
+    #Wie Game.play, spielt eine ganze Partie als eigenen Eintrag
+    def play(self, game, players, seed=None):
+        if seed is not None:
+            game.rng.seed(seed)
+        self.begin_game()
+        player_num = game.rng.below(2)
+        while not game.get_winner():
+            self.next_step(game, players[player_num], player_num)
+            player_num = (player_num + 1) % 2
+        winner = game.get_winner()
+        self.end_game(winner=winner)
+        return winner
+
+    """
+        Partien abschließen und schreiben
+    """
+
+    def begin_game(self):
+        self.current = empty_counts()
+        self.current['games'] = 1
+        self.stack = []
+        self.game_start = time.perf_counter()
+
+    #Schließt die Partie ab, extra kommt mit in den Eintrag (z.B. winner)
+    def end_game(self, **extra):
+        current = self.current
+        current['seconds'] = time.perf_counter() - self.game_start
+        with self.lock:
+            totals = self.totals
+            for key in ('games', 'plies', 'decisions', 'positions', 'seconds', 'candidates_sum'):
+                totals[key] += current[key]
+            for name, seconds in current['phases'].items():
+                totals['phases'][name] += seconds
+            for i, count in enumerate(current['candidates']):
+                totals['candidates'][i] += count
+            games = totals['games']
+        record = self.record('game', current)
+        record['game'] = games
+        record.update(extra)
+        self.write(record)
+        if self.summary_interval and games % self.summary_interval == 0:
+            self.write(self.summary())
+        self.begin_game()
+        return record
+
+    #JSON-Eintrag zu den Zählern counts
+    def record(self, kind, counts):
+        seconds = max(counts['seconds'], 1e-9)
+        phases = {name: round(value, 6) for name, value in counts['phases'].items()}
+        return {'type': kind,
+                'time': time.time(),
+                'games': counts['games'],
+                'seconds': round(counts['seconds'], 6),
+                'plies': counts['plies'],
+                'decisions': counts['decisions'],
+                'positions': counts['positions'],
+                'positions_per_second': counts['positions'] / seconds,
+                'plies_per_second': counts['plies'] / seconds,
+                'phases': phases,
+                'other': round(counts['seconds'] - sum(counts['phases'].values()), 6),
+                'candidates': dict(zip(bucket_labels(), counts['candidates'])),
+                'mean_candidates': counts['candidates_sum'] / max(counts['decisions'], 1)}
+
+    #Zusammenfassung aller Partien, mit Anteil der Abschnitte an der Zeit
+    def summary(self):
+        with self.lock:
+            totals = {key: (dict(value) if isinstance(value, dict) else list(value) if isinstance(value, list) else value)
+                      for key, value in self.totals.items()}
+        record = self.record('summary', totals)
+        seconds = max(totals['seconds'], 1e-9)
+        record['shares'] = {name: value / seconds for name, value in totals['phases'].items()}
+        record['plies_per_game'] = totals['plies'] / max(totals['games'], 1)
+        record['wall_seconds'] = time.time() - self.started
+        return record
+
+    def write(self, record):
+        if self.handler is not None:
+            self.handler.handle(logging.makeLogRecord({'msg': json.dumps(record)}))
+
+    """
+        Prometheus
+    """
+
+    #Summen im Textformat von Prometheus (Version 0.0.4)
+    def metrics(self):
+        with self.lock:
+            totals = self.totals
+            lines = []
+            def metric(name, kind, help, samples):
+                lines.append('# HELP tdgammon_%s %s' % (name, help))
+                lines.append('# TYPE tdgammon_%s %s' % (name, kind))
+                for suffix, labels, value in samples:
+                    lines.append('tdgammon_%s%s%s %s' % (name, suffix, labels, repr(value)))
+            metric('games_total', 'counter', 'Finished games.', [('', '', totals['games'])])
+            metric('plies_total', 'counter', 'Plies played.', [('', '', totals['plies'])])
+            metric('positions_total', 'counter', 'Positions evaluated by the model.', [('', '', totals['positions'])])
+            metric('game_seconds_total', 'counter', 'Time spent in games.', [('', '', totals['seconds'])])
+            metric('phase_seconds_total', 'counter', 'Time spent per phase, excluding nested phases.',
+                   [('', '{phase="%s"}' % name, value) for name, value in totals['phases'].items()])
+            cumulative = 0
+            samples = []
+            for label, count in zip(bucket_labels(), totals['candidates']):
+                cumulative += count
+                samples.append(('_bucket', '{le="%s"}' % label, cumulative))
+            samples.append(('_sum', '', totals['candidates_sum']))
+            samples.append(('_count', '', totals['decisions']))
+            metric('candidates', 'histogram', 'Legal moves per decision.', samples)
+            metric('positions_per_second', 'gauge', 'Evaluated positions per second of game time.',
+                   [('', '', totals['positions'] / max(totals['seconds'], 1e-9))])
+        return '\n'.join(lines) + '\n'
+
+    #Startet einen HTTP-Server für /metrics in einem Hintergrund-Thread
+    def serve(self, port, host='127.0.0.1'):
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.metrics().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            #Keine Ausgabe je Anfrage
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    #Schreibt die Zusammenfassung und beendet Server und Datei
+    def close(self):
+        self.write(self.summary())
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.handler is not None:
+            self.handler.close()
+            self.handler = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+#Modell, dessen Aufrufe als inference gemessen werden, sonst wie model
+class TimedModel:
+
+    def __init__(self, model, telemetry):
+        self.model = model
+        self.telemetry = telemetry
+
+    def get_outputs(self, X):
+        with self.telemetry.phase('inference'):
+            outputs = self.model.get_outputs(X)
+        self.telemetry.positions(len(X))
+        return outputs
+
+    def get_output(self, x):
+        with self.telemetry.phase('inference'):
+            output = self.model.get_output(x)
+        self.telemetry.positions(len(x))
+        return output
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+#Ohne Messung, für die train-Methoden wenn kein Telemetry übergeben wird
+class NullTelemetry:
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def model(self, model):
+        return model
+
+    def next_step(self, game, player, player_num):
+        game.next_step(player, player_num)
+
+    def positions(self, n):
+        pass
+
+    def begin_game(self):
+        pass
+
+    def end_game(self, **extra):
+        pass
@@ -1,5 +1,5 @@
-from distutils.core import setup
+from setuptools import setup
 from Cython.Build import cythonize
 
-setup(name='Player',
-      ext_modules=cythonize("Player.pyx"))
\ No newline at end of file
+setup(name='CythonBackgammon',
+      ext_modules=cythonize("CythonBackgammon.pyx"))
\ No newline at end of file